@@ -0,0 +1,186 @@
+"""Request/response hot path benchmarks against an in-process FakeKeePassXC.
+
+    python -m benchmarks.bench_protocol [--quick] [--output results.json]
+
+Measures the handshake (Connection() up to change-public-keys, then closed), latency and throughput of get_logins
+across entry counts and of get_database_groups across group tree shapes, and splits the client CPU time per call
+into serialization, crypto, framing, parsing and validation. Results are written as JSON to track them across versions.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from importlib import metadata
+from typing import Any
+
+from nacl.public import Box
+
+from keepassxc_protocol import Connection
+from keepassxc_protocol.fake_server import FakeKeePassXC
+from keepassxc_protocol.framing import JSONMessageFramer
+from keepassxc_protocol.kpx_protocol import BaseConnection
+
+
+class PhaseTimer:
+    """Exclusive CPU time of the calling thread spent in wrapped functions, by phase.
+
+    Only the thread that created the timer is measured, the in-process server runs in other threads.
+    """
+
+    def __init__(self) -> None:
+        self.totals: defaultdict[str, float] = defaultdict(float)
+        self._thread = threading.get_ident()
+        self._stack: list[float] = []
+        self._originals: list[tuple[type, str, Callable]] = []
+
+    def wrap(self, owner: type, name: str, phase: str) -> None:
+        original = owner.__dict__[name]
+        function = original.__func__ if isinstance(original, staticmethod) else original
+
+        def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+            if threading.get_ident() != self._thread:
+                return function(*args, **kwargs)
+            start = time.thread_time()
+            self._stack.append(0.0)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.thread_time() - start
+                self.totals[phase] += elapsed - self._stack.pop()
+                if self._stack:
+                    self._stack[-1] += elapsed
+
+        setattr(owner, name, staticmethod(wrapper) if isinstance(original, staticmethod) else wrapper)
+        self._originals.append((owner, name, original))
+
+    def restore(self) -> None:
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals.clear()
+
+    def reset(self) -> None:
+        self.totals.clear()
+
+
+def phase_timer() -> PhaseTimer:
+    timer = PhaseTimer()
+    timer.wrap(BaseConnection, "_encode_request", "serialization")
+    timer.wrap(Box, "encrypt", "crypto")
+    timer.wrap(Box, "decrypt", "crypto")
+    timer.wrap(JSONMessageFramer, "next_message", "framing")
+    timer.wrap(BaseConnection, "_parse_envelope", "parsing")
+    timer.wrap(BaseConnection, "_open_envelope", "parsing")
+    timer.wrap(BaseConnection, "_validate_response", "validation")
+    return timer
+
+
+def summarize(latencies: list[float]) -> dict[str, float]:
+    latencies = sorted(latencies)
+    return {
+        "calls": len(latencies),
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "throughput_per_s": len(latencies) / sum(latencies),
+    }
+
+
+def measure(call: Callable[[], object], iterations: int, timer: PhaseTimer | None = None) -> dict[str, Any]:
+    call()  # warm up
+    if timer is not None:
+        timer.reset()
+
+    latencies = []
+    cpu_start = time.thread_time()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    cpu = time.thread_time() - cpu_start
+
+    result = summarize(latencies)
+    result["cpu_per_call_ms"] = cpu / iterations * 1000
+    if timer is not None:
+        result["cpu_phases_per_call_ms"] = {phase: total / iterations * 1000 for phase, total in timer.totals.items()}
+    return result
+
+
+def bench_handshake(iterations: int) -> dict[str, Any]:
+    with FakeKeePassXC() as server:
+        def handshake() -> None:
+            # Closed right away, so that open connections do not pile up and slow down the later sections
+            with Connection(socket_path=server.socket_path):
+                pass
+        return measure(handshake, iterations)
+
+
+def bench_get_logins(entry_counts: list[int], iterations: int, timer: PhaseTimer) -> dict[str, Any]:
+    results = {}
+    for count in entry_counts:
+        with FakeKeePassXC(logins={"bench.test": FakeKeePassXC.make_logins(count)}) as server, \
+                Connection(socket_path=server.socket_path) as con:
+            con.associate()
+            # Fewer calls for big responses, at least 5
+            calls = max(5, iterations * 100 // max(count, 100))
+            results[str(count)] = measure(lambda con=con: con.get_logins("https://bench.test"), calls, timer)
+    return results
+
+
+def bench_get_database_groups(shapes: list[tuple[int, int]], iterations: int, timer: PhaseTimer) -> dict[str, Any]:
+    results = {}
+    for depth, width in shapes:
+        groups = FakeKeePassXC.make_groups(depth=depth, width=width)
+        with FakeKeePassXC(groups=groups) as server, Connection(socket_path=server.socket_path) as con:
+            group_count = sum(width ** level for level in range(1, depth + 1))
+            calls = max(5, iterations * 100 // max(group_count, 100))
+            result = measure(con.get_database_groups, calls, timer)
+            result["groups"] = group_count
+            results[f"depth={depth},width={width}"] = result
+    return results
+
+
+def package_version() -> str | None:
+    try:
+        return metadata.version("keepassxc-protocol")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for smoke tests")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    iterations = 20 if args.quick else 200
+    entry_counts = [1, 100, 10_000]
+    group_shapes = [(1, 1), (10, 1), (100, 1), (3, 10)]
+
+    timer = phase_timer()
+    try:
+        results = {
+            "version": package_version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "handshake": bench_handshake(iterations),
+            "get_logins": bench_get_logins(entry_counts, iterations, timer),
+            "get_database_groups": bench_get_database_groups(group_shapes, iterations, timer),
+        }
+    finally:
+        timer.restore()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
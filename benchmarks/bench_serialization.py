@@ -0,0 +1,86 @@
+"""Per-request CPU time of request serialization: pydantic models vs the plain dict fast path.
+
+    python -m benchmarks.bench_serialization [--associates N] [--iterations N]
+"""
+import argparse
+import base64
+import json
+import time
+from collections.abc import Callable
+
+import nacl.utils
+from nacl.public import Box, PrivateKey
+
+from keepassxc_protocol import classes_requests as req
+from keepassxc_protocol.async_protocol import AsyncConnectionSession
+from keepassxc_protocol.connection_session import Associate, Associates
+from keepassxc_protocol.kpx_protocol import BaseConnection
+
+
+def make_connection(associates_count: int) -> BaseConnection:
+    private_key = PrivateKey.generate()
+    associates = Associates()
+    for i in range(associates_count):
+        db_hash = f"{i:064x}"
+        associates.add(db_hash, Associate(db_hash=db_hash, id=f"id{i}", key=PrivateKey.generate().public_key))
+
+    connection = BaseConnection()
+    # A session without a socket, nothing is sent
+    connection.session = AsyncConnectionSession(
+        private_key=private_key,
+        nonce=nacl.utils.random(24),
+        client_id=base64.b64encode(nacl.utils.random(24)).decode("utf-8"),
+        box=Box(private_key, PrivateKey.generate().public_key),
+        associates=associates,
+    )
+    return connection
+
+
+def cpu_time_per_call(function: Callable[[], object], iterations: int) -> float:
+    """Best of 5 runs, in microseconds"""
+    results = []
+    for _ in range(5):
+        start = time.process_time_ns()
+        for _ in range(iterations):
+            function()
+        results.append((time.process_time_ns() - start) / iterations / 1000)
+    return min(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--associates", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    connection = make_connection(args.associates)
+    session = connection.session
+    db_hash = f"{0:064x}"
+
+    cases: dict[str, Callable[[], req.BaseMessage]] = {
+        "get-databasehash": lambda: req.GetDatabasehashMessage(session=session),
+        "test-associate": lambda: req.TestAssociateMessage(session=session, id="id0", key="key"),
+        "get-logins": lambda: req.GetLoginsMessage(session=session, url="https://example.test",
+                                                   associates=session.associates, db_hash=db_hash),
+    }
+
+    results = {}
+    for action, build in cases.items():
+        # noinspection PyProtectedMember
+        results[action] = {
+            "pydantic_us": cpu_time_per_call(
+                lambda build=build: req.EncryptedRequest(session=session, unencrypted_message=build()).to_bytes(),
+                args.iterations),
+            "fast_path_us": cpu_time_per_call(
+                lambda build=build: connection._encode_request(build()), args.iterations),
+        }
+
+    print(f"{'action':<20}{'pydantic, us':>15}{'fast path, us':>15}{'speedup':>10}")
+    for action, result in results.items():
+        speedup = result["pydantic_us"] / result["fast_path_us"]
+        print(f"{action:<20}{result['pydantic_us']:>15.1f}{result['fast_path_us']:>15.1f}{speedup:>9.1f}x")
+    print(json.dumps({"associates": args.associates, "results": results}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Per-request CPU time of the session state: nonce handling and request construction.
+
+    python -m benchmarks.bench_session [--associates N] [--iterations N]
+
+The nonce is compared against a pydantic model with validate_assignment, which is how ConnectionSession held it
+before SessionCore. Request construction is one message built, encoded and the nonce advanced, like Connection
+does for every request.
+"""
+import argparse
+import base64
+import json
+from collections.abc import Callable
+
+import nacl.utils
+from pydantic import BaseModel, ConfigDict
+
+from benchmarks.bench_serialization import cpu_time_per_call, make_connection
+from keepassxc_protocol import classes_requests as req
+from keepassxc_protocol.connection_session import SessionCore
+
+
+class PydanticNonce(BaseModel):
+    """Reference: the nonce as a validated pydantic field"""
+    model_config = ConfigDict(
+        validate_assignment=True,
+    )
+
+    nonce: bytes
+
+    @property
+    def nonce_utf8(self) -> str:
+        return base64.b64encode(self.nonce).decode("utf-8")
+
+    def increase_nonce(self) -> None:
+        self.nonce = (int.from_bytes(self.nonce, "big") + 1).to_bytes(24, "big")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--associates", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    connection = make_connection(args.associates)
+    session = connection.session
+    core = session.core
+    db_hash = f"{0:064x}"
+    reference = PydanticNonce(nonce=nacl.utils.random(24))
+
+    def nonce(state: PydanticNonce | SessionCore) -> Callable[[], object]:
+        # What a request uses: increment, the bytes for encryption and base64 for the envelope and response nonce
+        def step() -> None:
+            state.increase_nonce()
+            _ = state.nonce
+            _ = state.nonce_utf8
+            _ = state.nonce_utf8
+        return step
+
+    def request(build: Callable[[], req.BaseMessage]) -> Callable[[], object]:
+        def step() -> None:
+            connection._encode_request(build())
+            core.increase_nonce()
+            _ = core.nonce_utf8
+        return step
+
+    cases: dict[str, Callable[[], object]] = {
+        "nonce, pydantic field": nonce(reference),
+        "nonce, SessionCore": nonce(core),
+        "nonce, ConnectionSession": nonce(session),
+        "request get-databasehash": request(lambda: req.GetDatabasehashMessage(session=session)),
+        "request test-associate": request(lambda: req.TestAssociateMessage(session=session, id="id0", key="key")),
+        "request get-logins": request(lambda: req.GetLoginsMessage(session=session, url="https://example.test",
+                                                                   associates=session.associates,
+                                                                   db_hash=db_hash)),
+    }
+
+    results = {name: cpu_time_per_call(case, args.iterations) for name, case in cases.items()}
+
+    print(f"{'case':<30}{'us':>10}")
+    for name, us in results.items():
+        print(f"{name:<30}{us:>10.2f}")
+    print(json.dumps({"associates": args.associates, "results_us": results}))
+
+
+if __name__ == "__main__":
+    main()
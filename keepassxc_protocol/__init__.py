@@ -1,12 +1,57 @@
-import os
+from typing import TYPE_CHECKING, Any
 
-from loguru import logger
+if TYPE_CHECKING:
+    from .agent import AgentClient
+    from .async_protocol import AsyncConnection
+    from .cache import LoginsCache, TotpCache
+    from .classes import set_debug
+    from .classes_responses import Login
+    from .connection_session import Associate, Associates
+    from .group_tree import GroupsDiff, GroupTree
+    from .kpx_protocol import Connection
+    from .metrics import HistogramCollector, MetricsSink, RequestMetrics
+    from .pool import ConnectionPool
+    from .reconnect import ReconnectPolicy
+    from .session_cache import SessionCache
 
-if "true" not in str(os.environ.get("KPX_PROTOCOL__DEBUG")):
-    logger.disable("keepassxc_protocol")
+# Imported on first access, so that e.g. a short-lived script using Connection does not load asyncio
+_LAZY_IMPORTS = {
+    'AgentClient': 'agent',
+    'Associate': 'connection_session',
+    'Associates': 'connection_session',
+    'AsyncConnection': 'async_protocol',
+    'Connection': 'kpx_protocol',
+    'ConnectionPool': 'pool',
+    'GroupTree': 'group_tree',
+    'GroupsDiff': 'group_tree',
+    'HistogramCollector': 'metrics',
+    'Login': 'classes_responses',
+    'LoginsCache': 'cache',
+    'MetricsSink': 'metrics',
+    'ReconnectPolicy': 'reconnect',
+    'RequestMetrics': 'metrics',
+    'SessionCache': 'session_cache',
+    'TotpCache': 'cache',
+    'set_debug': 'classes',
+}
 
-from .classes_responses import Login
-from .connection_session import Associate, Associates
-from .kpx_protocol import Connection
 
-__all__ = ['Associate', 'Associates', 'Connection', 'Login']
\ No newline at end of file
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Same as `from .module_name import name`, unlike importlib it is reported by python -X importtime
+    value = getattr(__import__(module_name, globals(), fromlist=[name], level=1), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_LAZY_IMPORTS])
+
+
+__all__ = [
+    'AgentClient', 'Associate', 'Associates', 'AsyncConnection', 'Connection', 'ConnectionPool', 'GroupTree',
+    'GroupsDiff', 'HistogramCollector', 'Login', 'LoginsCache', 'MetricsSink', 'ReconnectPolicy', 'RequestMetrics',
+    'SessionCache', 'TotpCache', 'set_debug',
+]
\ No newline at end of file
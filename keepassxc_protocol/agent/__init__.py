@@ -0,0 +1,315 @@
+"""Local agent that serves many processes from a few KeePassXC connections.
+
+    python -m keepassxc_protocol.agent --associates associates.json
+
+Processes talk to the agent with AgentClient instead of each opening its own browser protocol connection.
+Identical get-logins requests that arrive while one is already being answered share its response, and responses
+are cached for all clients (see LoginsCache).
+
+The agent socket is only accessible by the current user, anyone who can connect to it can read the logins.
+Only Unix sockets are supported.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import tempfile
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any, Self
+
+from .. import classes_responses as resp
+from ..async_protocol import AsyncConnection, AsyncSingleFlight
+from ..cache import LoginsCache
+from ..classes import json_encoder, log
+from ..connection_session import Associates
+from ..errors import ResponseUnsuccesfulException
+from ..framing import JSONMessageFramer
+from ..kpx_protocol import BaseConnection
+from ..pipeline import DEFAULT_MAX_IN_FLIGHT
+from ..reconnect import ReconnectPolicy
+
+# Exceptions that are raised again by AgentClient with their type, any other one becomes a RuntimeError
+_ERROR_TYPES: dict[str, type[Exception]] = {
+    "ResponseUnsuccesfulException": ResponseUnsuccesfulException,
+    "ConnectionError": ConnectionError,
+    "KeyError": KeyError,
+    "ValueError": ValueError,
+}
+
+
+def get_agent_socket_path() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "keepassxc-protocol-agent.sock")
+    return os.path.join(tempfile.gettempdir(), f"keepassxc-protocol-agent-{os.getuid()}.sock")
+
+
+def _encode_error(error: BaseException) -> dict[str, Any]:
+    args = [arg if isinstance(arg, str | int | float | dict | list | None) else str(arg) for arg in error.args]
+    return {"type": type(error).__name__, "args": args}
+
+
+def _decode_error(error: dict[str, Any]) -> Exception:
+    error_type = _ERROR_TYPES.get(error["type"])
+    if error_type is None:
+        return RuntimeError(f"{error['type']}: {', '.join(map(str, error['args']))}")
+    return error_type(*error["args"])
+
+
+class Agent:
+    """Serves get-logins and get-database-groups of one KeePassXC to local clients over a Unix socket.
+
+    await Agent(associates).serve_forever()
+    """
+
+    def __init__(self, associates: Associates, socket_path: str | None = None,
+                 keepassxc_socket_path: str | None = None, connections: int = 1, cache_ttl: float = 60.0,
+                 cache_max_entries: int = 1024, reconnect: ReconnectPolicy | None = None) -> None:
+        """
+        :param associates: associates of the KeePassXC databases
+        :param socket_path: where the agent listens, see get_agent_socket_path() for the default
+        :param keepassxc_socket_path: KeePassXC socket, found automatically by default
+        :param connections: number of KeePassXC connections requests are spread over
+        :param cache_ttl: seconds get-logins responses are cached for, see LoginsCache
+        :param cache_max_entries: see LoginsCache
+        :param reconnect: how to reconnect to KeePassXC, a default ReconnectPolicy if not given
+        """
+        if connections < 1:
+            raise ValueError("connections must be at least 1")
+        self.associates = associates
+        self.socket_path = socket_path or get_agent_socket_path()
+        self.keepassxc_socket_path = keepassxc_socket_path
+        self.connections = connections
+        self.reconnect = reconnect or ReconnectPolicy()
+        self.logins_cache = LoginsCache(ttl=cache_ttl, max_entries=cache_max_entries)
+
+        self._upstreams: list[AsyncConnection] = []
+        self._next_upstream = 0
+        # A client that disconnects does not cancel the request for the others
+        self._single_flight = AsyncSingleFlight()
+        self._server: asyncio.AbstractServer | None = None
+        self._methods: dict[str, Callable[..., Awaitable[Any]]] = {
+            "get_databasehash": self._get_databasehash,
+            "test_associate": self._test_associate,
+            "get_logins": self._get_logins,
+            "get_logins_many": self._get_logins_many,
+            "get_database_groups": self._get_database_groups,
+        }
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        await self.close()
+
+    @property
+    def coalesced(self) -> int:
+        """Requests answered with the response of an identical request in flight"""
+        return self._single_flight.coalesced
+
+    async def start(self) -> None:
+        """Connects to KeePassXC and starts listening"""
+        for _ in range(self.connections):
+            con = AsyncConnection(socket_path=self.keepassxc_socket_path, logins_cache=self.logins_cache,
+                                  reconnect=self.reconnect)
+            await con.connect()
+            await con.load_associates(self.associates)
+            self._upstreams.append(con)
+
+        self._remove_stale_socket()
+        os.makedirs(os.path.dirname(self.socket_path) or ".", mode=0o700, exist_ok=True)
+        umask = os.umask(0o177)  # the socket is created with mode 0600
+        try:
+            self._server = await asyncio.start_unix_server(self._handle_client, self.socket_path)
+        finally:
+            os.umask(umask)
+        log.debug("Agent listening on {}", self.socket_path)
+
+    def _remove_stale_socket(self) -> None:
+        if not os.path.exists(self.socket_path):
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                os.unlink(self.socket_path)
+                return
+        raise RuntimeError(f"Another agent is listening on {self.socket_path}")
+
+    async def serve_forever(self) -> None:
+        async with self:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.socket_path)
+        for con in self._upstreams:
+            await con.close()
+        self._upstreams = []
+        self.logins_cache.wipe()
+
+    def _upstream(self) -> AsyncConnection:
+        # An idle connection if there is one, otherwise the next one in turn
+        for con in self._upstreams:
+            # noinspection PyProtectedMember
+            if not con._lock.locked():
+                return con
+        self._next_upstream = (self._next_upstream + 1) % len(self._upstreams)
+        return self._upstreams[self._next_upstream]
+
+    async def _get_databasehash(self) -> dict[str, Any]:
+        async def call() -> dict[str, Any]:
+            return (await self._upstream().get_databasehash()).model_dump(mode="json")
+
+        return await self._single_flight.do(("get_databasehash",), call)
+
+    async def _test_associate(self) -> dict[str, Any]:
+        async def call() -> dict[str, Any]:
+            return (await self._upstream().test_associate()).model_dump(mode="json")
+
+        return await self._single_flight.do(("test_associate",), call)
+
+    async def _get_logins(self, url: str) -> dict[str, Any]:
+        url = BaseConnection._normalize_url(url)
+
+        async def call() -> dict[str, Any]:
+            return (await self._upstream().get_logins(url)).model_dump(mode="json")
+
+        return await self._single_flight.do(("get_logins", url), call)
+
+    async def _get_logins_many(self, urls: list[str]) -> dict[str, dict[str, Any]]:
+        urls = list(dict.fromkeys(urls))
+        results = await asyncio.gather(*(self._get_logins(url) for url in urls), return_exceptions=True)
+        return {
+            url: {"error": _encode_error(result)} if isinstance(result, BaseException) else {"result": result}
+            for url, result in zip(urls, results, strict=True)
+        }
+
+    async def _get_database_groups(self) -> dict[str, Any]:
+        async def call() -> dict[str, Any]:
+            return (await self._upstream().get_database_groups()).model_dump(mode="json")
+
+        return await self._single_flight.do(("get_database_groups",), call)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        framer = JSONMessageFramer()
+        tasks: set[asyncio.Task] = set()
+        try:
+            while data := await reader.read(65536):
+                framer.feed(data)
+                while (message := framer.next_message()) is not None:
+                    # Requests of one client are answered concurrently, replies carry the request id
+                    task = asyncio.create_task(self._answer(json.loads(message), writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except (OSError, ValueError) as e:
+            log.debug("Agent client failed: {!r}", e)
+        finally:
+            writer.close()
+
+    async def _answer(self, request: dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        reply: dict[str, Any] = {"id": request.get("id")}
+        try:
+            method = self._methods.get(request.get("method"))
+            if method is None:
+                raise ValueError(f"Unknown method: {request.get('method')!r}")
+            reply["result"] = await method(**request.get("params", {}))
+        except Exception as e:
+            reply["error"] = _encode_error(e)
+
+        if writer.is_closing():
+            return
+        writer.write(json_encoder.encode(reply).encode("utf-8"))
+        try:
+            await writer.drain()
+        except OSError:
+            pass
+
+
+class AgentClient:
+    """Client of a running agent. It has the read methods of Connection: get_databasehash(), test_associate(),
+    get_logins(), get_logins_many() and get_database_groups(). The associates are those of the agent, so there is
+    no associate() or load_associates(). Like Connection, it must not be shared between threads.
+
+    with AgentClient() as con:
+        response = con.get_logins("https://example.test")
+    """
+
+    def __init__(self, socket_path: str | None = None) -> None:
+        """
+        :param socket_path: socket of the agent, see get_agent_socket_path() for the default
+        """
+        self.socket_path = socket_path or get_agent_socket_path()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(self.socket_path)
+        self._framer = JSONMessageFramer()
+        self._next_id = 0
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._socket.close()
+
+    def _receive(self) -> dict[str, Any]:
+        while (message := self._framer.next_message()) is None:
+            data = self._socket.recv(65536)
+            if not data:
+                raise ConnectionError("Connection closed by the agent")
+            self._framer.feed(data)
+        return json.loads(message)
+
+    def _call(self, method: str, **params: Any) -> Any:  # noqa: ANN401
+        self._next_id += 1
+        request_id = self._next_id
+        self._socket.sendall(json_encoder.encode({"id": request_id, "method": method, "params": params})
+                             .encode("utf-8"))
+
+        while (reply := self._receive()).get("id") != request_id:
+            log.debug("Unexpected agent reply: {}", reply)
+        if "error" in reply:
+            raise _decode_error(reply["error"])
+        return reply["result"]
+
+    def get_databasehash(self) -> resp.GetDatabasehashResponse:
+        return resp.GetDatabasehashResponse.model_validate(self._call("get_databasehash"))
+
+    def test_associate(self) -> resp.TestAssociateResponse:
+        return resp.TestAssociateResponse.model_validate(self._call("test_associate"))
+
+    def get_logins(self, url: str, lazy: bool = False) -> resp.GetLoginsResponse:
+        """See Connection.get_logins()"""
+        response_type = resp.LazyGetLoginsResponse if lazy else resp.GetLoginsResponse
+        return response_type.model_validate(self._call("get_logins", url=url))
+
+    def get_logins_many(self, urls: Iterable[str], max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                        lazy: bool = False) -> dict[str, resp.GetLoginsResponse | ResponseUnsuccesfulException]:
+        """See Connection.get_logins_many(). The agent decides how many requests are sent at once,
+        `max_in_flight` is accepted for compatibility.
+        """
+        urls = list(urls)
+        response_type = resp.LazyGetLoginsResponse if lazy else resp.GetLoginsResponse
+        replies = self._call("get_logins_many", urls=urls)
+
+        results: dict[str, resp.GetLoginsResponse | ResponseUnsuccesfulException] = {}
+        for url in urls:
+            reply = replies[url]
+            if "error" not in reply:
+                results[url] = response_type.model_validate(reply["result"])
+                continue
+            error = _decode_error(reply["error"])
+            if not isinstance(error, ResponseUnsuccesfulException):
+                raise error
+            results[url] = error
+        return results
+
+    def get_database_groups(self) -> resp.GetDatabaseGroupsResponse:
+        return resp.GetDatabaseGroupsResponse.model_validate(self._call("get_database_groups"))
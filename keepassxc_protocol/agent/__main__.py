@@ -0,0 +1,62 @@
+import argparse
+import asyncio
+import os
+import signal
+
+from ..connection_session import Associates
+from ..kpx_protocol import Connection
+from . import Agent, get_agent_socket_path
+from . import __doc__ as agent_doc
+
+
+def _load_or_create_associates(path: str, keepassxc_socket_path: str | None) -> Associates:
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return Associates.model_validate_json(f.read())
+
+    con = Connection(socket_path=keepassxc_socket_path)
+    con.associate()  # confirmed by the user in KeePassXC
+    associates = con.dump_associates()
+    con.close()
+
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(associates.model_dump_json())
+    return associates
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m keepassxc_protocol.agent", description=agent_doc,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--associates", required=True,
+                        help="associates JSON file, created by associating with KeePassXC if it does not exist")
+    parser.add_argument("--socket", help="where to listen, default: %(default)s", default=get_agent_socket_path())
+    parser.add_argument("--keepassxc-socket", help="KeePassXC socket, found automatically by default")
+    parser.add_argument("--connections", type=int, default=1, help="KeePassXC connections, default: %(default)s")
+    parser.add_argument("--cache-ttl", type=float, default=60.0,
+                        help="seconds get-logins responses are cached for, default: %(default)s")
+    args = parser.parse_args()
+
+    agent = Agent(
+        _load_or_create_associates(args.associates, args.keepassxc_socket),
+        socket_path=args.socket,
+        keepassxc_socket_path=args.keepassxc_socket,
+        connections=args.connections,
+        cache_ttl=args.cache_ttl,
+    )
+
+    async def run() -> None:
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, task.cancel)
+        try:
+            await agent.serve_forever()
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
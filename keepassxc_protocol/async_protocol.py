@@ -0,0 +1,493 @@
+import asyncio
+import contextlib
+import platform
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Hashable, Iterable
+from typing import Any, Self, TypeVar
+
+from nacl.public import PrivateKey
+from pydantic import PrivateAttr
+
+from . import classes_requests as req
+from . import classes_responses as resp
+from .cache import DatabaseHashCache, LoginsCache, TotpCache
+from .classes import log
+from .connection_session import Associates, ConnectionSession, get_socket_path
+from .errors import ResponseUnsuccesfulException
+from .framing import JSONMessageFramer
+from .group_tree import GroupsDiff, GroupTree
+from .kpx_protocol import BaseConnection
+from .metrics import PHASE_DECRYPT, PHASE_ENCODE, PHASE_SEND, PHASE_VALIDATE, PHASE_WAIT, MetricsSink, RequestMetrics
+from .reconnect import ReconnectPolicy
+from .session_cache import SessionCache
+
+_R = TypeVar("_R", bound=resp.BaseResponse)
+_T = TypeVar("_T")
+
+
+class AsyncSingleFlight:
+    """SingleFlight for asyncio tasks. A waiting task that is cancelled does not cancel the call for the others."""
+
+    def __init__(self) -> None:
+        self.coalesced = 0  # calls answered with the result of an identical call in flight
+        self._futures: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[_T]]) -> _T:
+        future = self._futures.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = self._futures[key] = asyncio.ensure_future(call())
+
+            def done(f: asyncio.Future[Any]) -> None:
+                del self._futures[key]
+                if not f.cancelled():
+                    f.exception()  # retrieved, even if every waiting task has gone
+
+            future.add_done_callback(done)
+        return await asyncio.shield(future)
+
+
+class AsyncConnectionSession(ConnectionSession):
+    """ConnectionSession over asyncio streams. The connection is opened by `connect()`, not on creation."""
+    _reader: asyncio.StreamReader | None = PrivateAttr(None)
+    _writer: asyncio.StreamWriter | None = PrivateAttr(None)
+
+    async def connect(self) -> None:
+        path = self.socket_path or get_socket_path()
+        log.debug("Connecting to {}", path)
+
+        if platform.system() == "Windows":
+            loop = asyncio.get_running_loop()
+            reader = asyncio.StreamReader()
+            protocol = asyncio.StreamReaderProtocol(reader)
+            # Only available on the ProactorEventLoop, which is the default one on Windows
+            transport, _ = await loop.create_pipe_connection(lambda: protocol, fr'\\.\pipe\{path}')
+            writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        else:
+            reader, writer = await asyncio.open_unix_connection(path)
+
+        self._reader, self._writer = reader, writer
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            writer, self._reader, self._writer = self._writer, None, None
+            writer.close()
+            await writer.wait_closed()
+
+    async def reconnect(self) -> None:
+        """See ConnectionSession.reconnect()"""
+        with contextlib.suppress(OSError):
+            await self.close()
+        self.box = None
+        self._framer = JSONMessageFramer()
+        await self.connect()
+
+    async def sendall(self, data: bytes) -> None:
+        self._writer.write(data)
+        await self._writer.drain()
+
+    async def receive_bytes(self) -> bytes:
+        """Returns the next complete message, or empty bytes if the connection has been closed"""
+        while (message := self._framer.next_message()) is None:
+            data = await self._reader.read(65536)
+            if not data:
+                return b""
+            self._framer.feed(data)
+        return message
+
+    async def receive(self) -> str:
+        """Returns the next complete message, or an empty string if the connection has been closed"""
+        return (await self.receive_bytes()).decode("utf-8")
+
+
+class AsyncConnection(BaseConnection):
+    """asyncio counterpart of Connection.
+
+    async with AsyncConnection() as con:
+        await con.load_associates_json(associates_json)
+        response = await con.get_logins("https://example.test")
+    """
+
+    def __init__(self, socket_path: str | None = None, db_hash_ttl: float | None = None,
+                 logins_cache: LoginsCache | None = None, reconnect: ReconnectPolicy | None = None,
+                 session_cache: SessionCache | None = None, metrics: MetricsSink | None = None,
+                 totp_cache: TotpCache | None = None) -> None:
+        self.session_cache = session_cache
+        self.metrics = metrics
+        saved = self._load_saved_session()
+        self.session = AsyncConnectionSession(
+            **self._new_session_params(saved),
+            socket_path=socket_path,
+        )
+        self._lock = asyncio.Lock()
+        self._db_hash_cache = DatabaseHashCache(ttl=db_hash_ttl)
+        self.logins_cache = logins_cache
+        self.totp_cache = totp_cache if totp_cache is not None else TotpCache()
+        self._watch_totp_cache = totp_cache is not None
+        self.reconnect_policy = reconnect
+        self._restore_session(saved)
+        self._subscribers = []
+        # Set once subscribe() or notifications() is used or a response is cached, the connection is then only read
+        # by the reader task and responses are taken from the queue
+        self._reader_task: asyncio.Task | None = None
+        self._reader_start: asyncio.Task | None = None  # scheduled by subscribe(), waits for the request in flight
+        self._responses: asyncio.Queue[tuple[dict, int] | BaseException] | None = None
+        self._single_flight = AsyncSingleFlight()
+        # Requests written to the connection whose response has not been read yet. More than one when the tasks of
+        # earlier requests were cancelled after sending.
+        self._unanswered = 0
+
+    async def __aenter__(self) -> Self:
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        await self.close()
+
+    async def connect(self) -> None:
+        """Opens the connection and exchanges public keys"""
+        self._unanswered = 0
+        await self.session.connect()
+        response = await self.change_public_keys()
+        self._set_server_public_key(response)
+
+    async def close(self) -> None:
+        start, self._reader_start = self._reader_start, None
+        if start is not None:
+            start.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await start
+        await self._stop_reader()
+        self._responses = None
+        await self.session.close()
+
+    def subscribe(self, callback: Callable[[str], None]) -> Callable[[], None]:
+        """See Connection.subscribe(). The callback runs in a task of the running event loop.
+
+        The reader task starts once the request in flight, if any, has its response.
+        """
+        unsubscribe = self._add_subscriber(callback)
+        if self._responses is None and self._reader_start is None:
+            self._reader_start = asyncio.get_running_loop().create_task(self._watch_notifications())
+        return unsubscribe
+
+    async def notifications(self) -> AsyncIterator[str]:
+        """Yields the action of every notification from now on, "database-locked" or "database-unlocked".
+
+        async for action in con.notifications():
+            if action == "database-locked":
+                ...
+        """
+        queue: asyncio.Queue[str] = asyncio.Queue()
+        unsubscribe = self._add_subscriber(queue.put_nowait)
+        try:
+            await self._watch_notifications()
+            while True:
+                yield await queue.get()
+        finally:
+            unsubscribe()
+
+    async def _watch_notifications(self) -> None:
+        """See Connection._watch_notifications()"""
+        if self._responses is None:
+            # Not while another task reads the connection for its response
+            async with self._lock:
+                if self._responses is None:
+                    self._start_reader()
+
+    def _start_reader(self) -> None:
+        self._responses = asyncio.Queue()
+        self._reader_task = asyncio.get_running_loop().create_task(self._read_loop(self._responses))
+
+    async def _stop_reader(self) -> None:
+        task, self._reader_task = self._reader_task, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    async def _read_loop(self, responses: asyncio.Queue[tuple[dict, int] | BaseException]) -> None:
+        """Hands responses to _exchange() and handles notifications as soon as they arrive"""
+        try:
+            while True:
+                raw_response = await self.session.receive_bytes()
+                if not raw_response:
+                    raise ConnectionError("Connection closed by KeePassXC")
+                envelope = self._parse_envelope(raw_response)
+                if self._is_notification(envelope):
+                    self._on_notification(envelope)
+                else:
+                    responses.put_nowait((envelope, len(raw_response)))
+        except Exception as e:
+            log.debug("Reader stopped: {!r}", e)
+            # Kept in the queue, every later request fails with it until the connection is reopened
+            responses.put_nowait(e)
+
+    async def _receive_response(self) -> tuple[dict, int]:
+        """Response to the oldest request that has not been answered and its size in bytes"""
+        try:
+            response = await self._next_response()
+        except ValueError:
+            self._unanswered -= 1  # read, but not a valid message
+            raise
+        self._unanswered -= 1
+        return response
+
+    async def _drop_abandoned_responses(self) -> None:
+        """Reads the responses to requests whose task was cancelled after sending.
+
+        KeePassXC answers in order, so they come before the response to the next request, whether they carry a nonce
+        or not (error replies do not). They are read before the next request is sent, since KeePassXC may take
+        requests it reads at once for one message.
+        """
+        while self._unanswered:
+            envelope, _ = await self._receive_response()
+            log.debug("Dropping a response to an abandoned request: {}", envelope.get("action"))
+
+    async def _next_response(self) -> tuple[dict, int]:
+        """Next message other than a notification and its size in bytes"""
+        if self._responses is not None:
+            response = await self._responses.get()
+            if isinstance(response, BaseException):
+                self._responses.put_nowait(response)
+                raise ConnectionError("Connection to KeePassXC lost") from response
+            return response
+
+        while True:
+            raw_response = await self.session.receive_bytes()
+            if not raw_response:
+                raise ConnectionError("Connection closed by KeePassXC")
+            envelope = self._parse_envelope(raw_response)
+            if not self._is_notification(envelope):
+                return envelope, len(raw_response)
+            self._on_notification(envelope)
+
+    async def _exchange(self, message: req.BaseRequest | req.BaseMessage,
+                        metrics: RequestMetrics | None = None) -> dict:
+        try:
+            request = self._encode_request(message)
+            if metrics is not None:
+                metrics.mark(PHASE_ENCODE)
+                metrics.bytes_sent = len(request)
+            # Before the first await: a task cancelled while sending has used the nonce all the same
+            self.session.core.increase_nonce()
+            self._unanswered += 1
+            await self.session.sendall(request)
+            if metrics is not None:
+                metrics.mark(PHASE_SEND)
+
+            envelope, size = await self._receive_response()
+            if metrics is not None:
+                metrics.mark(PHASE_WAIT)
+                metrics.bytes_received = size
+            data = self._open_envelope(envelope)
+            if metrics is not None:
+                metrics.mark(PHASE_DECRYPT)
+            return data
+        except Exception as e:
+            if metrics is not None:
+                metrics.finish(e)
+            raise
+
+    async def _request(self, message: req.BaseRequest | req.BaseMessage, response_type: type[_R]) -> _R:
+        # One request and one response at a time, the nonce is shared by the whole session.
+        # Tasks waiting for the lock while a reconnect is running use the new connection afterwards.
+        async with self._lock:
+            try:
+                await self._drop_abandoned_responses()
+                metrics = self._start_metrics(message.action)
+                data = await self._exchange(message, metrics)
+            except OSError:
+                if self.reconnect_policy is None:
+                    raise
+                log.debug("Connection to KeePassXC lost, reconnecting")
+                await self._reconnect()
+                metrics = self._start_metrics(message.action, retries=1)
+                data = await self._exchange(message, metrics)
+
+        try:
+            response = self._validate_response(data, response_type)
+        except ResponseUnsuccesfulException as e:
+            if metrics is not None:
+                metrics.finish(e)
+            raise
+        if metrics is not None:
+            metrics.mark(PHASE_VALIDATE)
+            metrics.finish()
+        return response
+
+    async def _reconnect(self) -> None:
+        # Called with the lock held
+        policy = self.reconnect_policy or ReconnectPolicy(attempts=1)
+        error: OSError | None = None
+        for delay in policy.delays():
+            await asyncio.sleep(delay)
+            try:
+                await self._stop_reader()
+                await self.session.reconnect()
+                self._unanswered = 0
+                if self._responses is not None:
+                    self._start_reader()
+                data = await self._exchange(req.ChangePublicKeysRequest(session=self.session))
+                self._set_server_public_key(self._validate_response(data, resp.ChangePublicKeysResponse))
+                break
+            except OSError as e:
+                log.debug("Reconnecting failed: {!r}", e)
+                error = e
+        else:
+            raise ConnectionError(f"Could not reconnect to KeePassXC in {policy.attempts} attempts") from error
+
+        self._on_reconnected()
+
+    async def reconnect(self) -> None:
+        """Reopens the connection, keeping the keys and associates"""
+        async with self._lock:
+            await self._reconnect()
+
+    async def change_public_keys(self) -> resp.ChangePublicKeysResponse:
+        message = req.ChangePublicKeysRequest(session=self.session)
+        return await self._request(message, resp.ChangePublicKeysResponse)
+
+    async def get_databasehash(self) -> resp.GetDatabasehashResponse:
+        message = req.GetDatabasehashMessage(session=self.session)
+        response = await self._request(message, resp.GetDatabasehashResponse)
+        self._db_hash_cache.set(response.hash)
+        return response
+
+    async def _current_db_hash(self) -> str:
+        db_hash = self._db_hash_cache.get()
+        if db_hash is None:
+            db_hash = (await self._single_flight.do(("get-databasehash",), self.get_databasehash)).hash
+        return db_hash
+
+    async def _with_db_hash(self, request: Callable[[str], Awaitable[_T]]) -> _T:
+        """Runs the request with the cached hash, and once more with a fresh one if the cached hash was stale"""
+        db_hash = self._db_hash_cache.get()
+        if db_hash is not None:
+            try:
+                return await request(db_hash)
+            except (ResponseUnsuccesfulException, KeyError) as e:
+                if not self._is_stale_db_hash_error(e):
+                    raise
+                log.debug("Request failed with cached DB hash {}, retrying with a fresh one", db_hash)
+                self._db_hash_cache.invalidate()
+                self._forget_verification()
+
+        return await request(await self._current_db_hash())
+
+    async def associate(self) -> resp.AssociateResponse:
+        id_public_key = PrivateKey.generate().public_key
+
+        message = req.AssociateMessage(session=self.session, id_public_key=id_public_key)
+        response = await self._request(message, resp.AssociateResponse)
+
+        self._db_hash_cache.set(response.hash)
+        self._add_associate(response.hash, response.id, id_public_key)
+
+        await self.test_associate()
+        return response
+
+    async def load_associates_json(self, associates_json: str) -> None:
+        """Loads associates from JSON string"""
+        await self._load_associates(Associates.model_validate_json(associates_json))
+
+    async def load_associates(self, associates: Associates) -> None:
+        """Loads associates from Associates object"""
+        await self._load_associates(associates.model_copy(deep=True))
+
+    async def _load_associates(self, associates: Associates) -> None:
+        verified = self._is_verified(associates)
+        self.session.associates = associates
+        if not verified:
+            await self.test_associate()
+
+    async def test_associate(self, trigger_unlock: bool = False) -> resp.TestAssociateResponse:
+        async def request(db_hash: str) -> resp.TestAssociateResponse:
+            message = self._test_associate_message(db_hash)
+            return await self._request(message, resp.TestAssociateResponse)
+
+        response = await self._with_db_hash(request)
+        self._db_hash_cache.set(response.hash)
+        self._on_verified(response.hash)
+        return response
+
+    async def get_logins(self, url: str, lazy: bool = False) -> resp.GetLoginsResponse:
+        """See Connection.get_logins().
+
+        Concurrent calls for the same URL share one request and get the same response, which must not be modified.
+        """
+        url = self._normalize_url(url)
+        key = ("get-logins", url, self._db_hash_cache.get(), lazy)
+        return await self._single_flight.do(key, lambda: self._get_logins(url, lazy))
+
+    async def _get_logins(self, url: str, lazy: bool) -> resp.GetLoginsResponse:
+        response_type = resp.LazyGetLoginsResponse if lazy else resp.GetLoginsResponse
+
+        if self.logins_cache is not None:
+            response = self.logins_cache.get(url, await self._current_db_hash())
+            if response is not None:
+                return response
+
+        async def request(db_hash: str) -> resp.GetLoginsResponse:
+            message = self._get_logins_message(url, db_hash)
+            return await self._request(message, response_type)
+
+        response = await self._with_db_hash(request)
+        self._db_hash_cache.set(response.hash)
+        if self.logins_cache is not None:
+            await self._watch_notifications()
+            self.logins_cache.set(url, response.hash, response)
+        return response
+
+    async def get_logins_all_databases(self, url: str) -> resp.AllDatabasesLogins:
+        """See Connection.get_logins_all_databases()"""
+        url = self._normalize_url(url)
+        messages = self._get_logins_messages_by_database(url)
+        active_hash, *results = await asyncio.gather(
+            self._current_db_hash(),
+            *(self._request(message, resp.GetLoginsResponse) for message in messages.values()),
+            return_exceptions=True)
+        for result in [active_hash, *results]:
+            if isinstance(result, BaseException) and not isinstance(result, ResponseUnsuccesfulException):
+                raise result
+        if isinstance(active_hash, ResponseUnsuccesfulException):
+            active_hash = None
+        return self._merge_logins(dict(zip(messages, results, strict=True)), active_hash)
+
+    async def get_totp(self, uuid: str) -> resp.GetTotpResponse:
+        """See Connection.get_totp(). Concurrent calls for the same entry share one request."""
+        response = self.totp_cache.get(uuid)
+        if response is None:
+            response = await self._single_flight.do(("get-totp", uuid), lambda: self._get_totp(uuid))
+        return response
+
+    async def _get_totp(self, uuid: str) -> resp.GetTotpResponse:
+        requested_at = time.time()
+        response = await self._request(self._get_totp_message(uuid), resp.GetTotpResponse)
+        if self._watch_totp_cache:
+            await self._watch_notifications()
+        self.totp_cache.set(uuid, response, requested_at)
+        return response
+
+    async def get_totp_many(self,
+                            uuids: Iterable[str]) -> dict[str, resp.GetTotpResponse | ResponseUnsuccesfulException]:
+        """See Connection.get_totp_many(), the requests are made concurrently"""
+        unique = list(dict.fromkeys(uuids))
+        results = await asyncio.gather(*(self.get_totp(uuid) for uuid in unique), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, ResponseUnsuccesfulException):
+                raise result
+        return dict(zip(unique, results, strict=True))
+
+    async def get_database_groups(self) -> resp.GetDatabaseGroupsResponse:
+        message = req.GetDatabaseGroupsMessage(session=self.session)
+        return await self._request(message, resp.GetDatabaseGroupsResponse)
+
+    async def refresh_database_groups(self, tree: GroupTree) -> GroupsDiff:
+        """Gets the groups into `tree` and returns what changed since its last refresh.
+
+        Only the changed subtrees are validated again, the current groups are in `tree.response`.
+        """
+        message = req.GetDatabaseGroupsMessage(session=self.session)
+        return tree.update(await self._request(message, resp.RawGetDatabaseGroupsResponse))
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+
+from . import classes_responses as resp
+
+
+class DatabaseHashCache:
+    """Hash of the active database, kept until it is invalidated or, if a ttl is set, expires"""
+
+    def __init__(self, ttl: float | None = None) -> None:
+        self.ttl = ttl
+        self._db_hash: str | None = None
+        self._expires_at: float | None = None
+
+    def get(self) -> str | None:
+        if self._expires_at is not None and time.monotonic() >= self._expires_at:
+            self.invalidate()
+        return self._db_hash
+
+    def set(self, db_hash: str) -> None:
+        self._db_hash = db_hash
+        self._expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+
+    def invalidate(self) -> None:
+        self._db_hash = None
+        self._expires_at = None
+
+
+class LoginsCache:
+    """Bounded in-memory cache of get-logins responses keyed by URL and database hash.
+
+    Entries expire after `ttl` seconds and the least recently used entry is evicted once `max_entries` is reached.
+    Cached responses are shared between callers and must not be modified. Nothing is written to disk, `wipe()`
+    drops every cached secret.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1024) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str], tuple[float, resp.GetLoginsResponse]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str, db_hash: str) -> resp.GetLoginsResponse | None:
+        key = (url, db_hash)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, url: str, db_hash: str, response: resp.GetLoginsResponse) -> None:
+        key = (url, db_hash)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, url: str | None = None) -> None:
+        """Drops the entries of one URL, or all entries"""
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == url]:
+                    del self._entries[key]
+
+    def wipe(self) -> None:
+        """Drops all entries and resets the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class TotpCache:
+    """Current TOTP codes by entry uuid, each kept until the end of the time step it was generated in.
+
+    KeePassXC does not tell the period of an entry, `period` seconds is assumed for all of them (30, the default of
+    KeePassXC and RFC 6238). Steps are aligned to the wall clock like the codes themselves. Cached responses are
+    shared between callers and must not be modified.
+    """
+
+    def __init__(self, period: float = 30.0) -> None:
+        if period <= 0:
+            raise ValueError("period must be positive")
+        self.period = period
+        self._entries: dict[str, tuple[float, resp.GetTotpResponse]] = {}
+        self._latest_expiry = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, uuid: str) -> resp.GetTotpResponse | None:
+        with self._lock:
+            entry = self._entries.get(uuid)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[uuid]
+                return None
+            return entry[1]
+
+    def set(self, uuid: str, response: resp.GetTotpResponse, requested_at: float) -> None:
+        """Caches the code until the end of the step `requested_at` (wall clock) is in.
+
+        A response that arrives after that step has ended is not cached, the code may be from either step.
+        """
+        expires_at = (requested_at // self.period + 1) * self.period
+        if not response.totp or time.time() >= expires_at:
+            return
+        with self._lock:
+            if expires_at > self._latest_expiry:
+                # A new step has started, codes of earlier steps are of no use any more
+                self._latest_expiry = expires_at
+                for key in [key for key, (expires, _) in self._entries.items() if expires < expires_at]:
+                    del self._entries[key]
+            self._entries[uuid] = (expires_at, response)
+
+    def invalidate(self, uuid: str | None = None) -> None:
+        """Drops the code of one entry, or all codes"""
+        with self._lock:
+            if uuid is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(uuid, None)
+
+    def wipe(self) -> None:
+        """Drops all codes"""
+        self.invalidate()
@@ -1,12 +1,68 @@
+import json
 import os
+import sys
+from collections.abc import Callable
+from typing import Any
 
 from pydantic import BaseModel, ConfigDict
 
-debug = True if os.environ.get("KPX_PROTOCOL_DEBUG") else False
+
+def _debug_from_environment() -> bool:
+    # KPX_PROTOCOL__DEBUG is the documented name, KPX_PROTOCOL_DEBUG is accepted as well
+    values = (os.environ.get("KPX_PROTOCOL__DEBUG"), os.environ.get("KPX_PROTOCOL_DEBUG"))
+    return any(str(value).strip().lower() in ("1", "true", "yes", "on") for value in values if value)
+
+
+debug = _debug_from_environment()
+
+# Compact JSON like pydantic's model_dump_json. json.dumps() creates a new encoder on every call with arguments.
+json_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def set_debug(enabled: bool) -> None:
+    """Enables or disables the debug logging of the package.
+
+    Payloads are only serialized for the log while it is enabled.
+    """
+    global debug
+    debug = enabled
+    if enabled:
+        from loguru import logger
+        logger.enable("keepassxc_protocol")
+    elif "loguru" in sys.modules:
+        from loguru import logger
+        logger.disable("keepassxc_protocol")
+
+
+def _drop(*args: Any, **kwargs: Any) -> None:  # noqa: ANN401
+    pass
+
+
+class _Logger:
+    """loguru's logger, imported once debug logging is enabled. Until then messages are dropped, like loguru
+    does for the disabled package, without importing it.
+    """
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if not debug:
+            # log.opt(lazy=True).debug(...) is dropped as well
+            return self._configured if name in ("opt", "bind", "patch") else _drop
+        from loguru import logger
+        return getattr(logger, name)
+
+    def _configured(self, *args: Any, **kwargs: Any) -> "_Logger":  # noqa: ANN401
+        return self
+
+
+log = _Logger()
+
+if debug:
+    set_debug(True)
 
 
 class KPXProtocol(BaseModel):
     model_config = ConfigDict(
+        defer_build=True,  # schemas are built on first use, most messages are never used by a process
         validate_assignment=True,
         arbitrary_types_allowed=True,
     )
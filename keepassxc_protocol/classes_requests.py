@@ -1,12 +1,19 @@
 import base64
+import json
+from typing import Any
 
 from nacl.public import PublicKey
 from pydantic import Field, PrivateAttr, computed_field
 
 from . import classes_responses as responses
-from .classes import KPXProtocol
+from .classes import KPXProtocol, json_encoder
 from .connection_session import Associates, ConnectionSession
 
+# Every value is an action name or a base64 string, none of them needs escaping
+_ENCRYPTED_REQUEST_TEMPLATE = '{"action":"%s","nonce":"%s","clientID":"%s","triggerUnlock":"%s","message":"%s"}'
+# The url and keys are inserted as JSON
+_GET_LOGINS_TEMPLATE = '{"action":"get-logins","url":%s,"keys":%s}'
+
 
 class _BaseMessage(KPXProtocol):
     _action: str = PrivateAttr("none")
@@ -17,6 +24,19 @@ class _BaseMessage(KPXProtocol):
     def action(self) -> str:
         return self._action
 
+    @property
+    def _action_fast(self) -> str:
+        # Private attributes are resolved through __getattr__, which is slow on the hot path
+        return self.__pydantic_private__["_action"]
+
+    def to_payload(self) -> dict[str, Any]:
+        """Same dict as model_dump(), built directly from the attributes without pydantic serialization"""
+        return {"action": self._action_fast}
+
+    def to_payload_json(self) -> str:
+        """to_payload() encoded as JSON"""
+        return json_encoder.encode(self.to_payload())
+
 
 class BaseMessage(_BaseMessage):
     pass
@@ -46,6 +66,15 @@ class BaseRequest(_BaseMessage):
     def to_bytes(self) -> bytes:
         return self.model_dump_json().encode("utf-8")
 
+    def to_payload(self) -> dict[str, Any]:
+        core = self.session.core
+        return {
+            "action": self._action_fast,
+            "nonce": core.nonce_utf8,
+            "clientID": core.client_id,
+            "triggerUnlock": "true" if self.trigger_unlock else "false",
+        }
+
 
 class EncryptedRequest(BaseRequest):
     """
@@ -70,6 +99,23 @@ class EncryptedRequest(BaseRequest):
                                      nonce=self.session.nonce).ciphertext)
         return encrypted.decode("utf-8")
 
+    def to_payload(self) -> dict[str, Any]:
+        return json.loads(self.build_bytes(self.session, self.unencrypted_message, self.trigger_unlock))
+
+    @staticmethod
+    def build_bytes(session: ConnectionSession, unencrypted_message: BaseMessage,
+                    trigger_unlock: bool = False) -> bytes:
+        """Serialized EncryptedRequest, built without creating the model"""
+        core = session.core
+        encrypted = core.box.encrypt(unencrypted_message.to_payload_json().encode("utf-8"), nonce=core.nonce).ciphertext
+        return (_ENCRYPTED_REQUEST_TEMPLATE % (
+            unencrypted_message._action_fast,
+            core.nonce_utf8,
+            core.client_id,
+            "true" if trigger_unlock else "false",
+            base64.b64encode(encrypted).decode("utf-8"),
+        )).encode("utf-8")
+
 
 # noinspection PyPep8Naming
 class ChangePublicKeysRequest(BaseRequest):
@@ -88,6 +134,11 @@ class ChangePublicKeysRequest(BaseRequest):
     def publicKey(self) -> str:
         return self.session.public_key_utf8
 
+    def to_payload(self) -> dict[str, Any]:
+        payload = super().to_payload()
+        payload["publicKey"] = self.session.public_key_utf8
+        return payload
+
 
 class GetDatabasehashMessage(BaseMessage):
     """
@@ -121,6 +172,9 @@ class AssociateMessage(BaseMessage):
         # noinspection PyProtectedMember
         return base64.b64encode(self.id_public_key._public_key).decode("utf-8")
 
+    def to_payload(self) -> dict[str, Any]:
+        return {"action": self._action_fast, "key": self.session.public_key_utf8, "idKey": self.idKey}
+
 
 class TestAssociateMessage(BaseMessage):
     """
@@ -135,6 +189,9 @@ class TestAssociateMessage(BaseMessage):
     id: str
     key: str
 
+    def to_payload(self) -> dict[str, Any]:
+        return {"action": self._action_fast, "id": self.id, "key": self.key}
+
 
 class GetLoginsMessage(BaseMessage):
     """
@@ -157,14 +214,36 @@ class GetLoginsMessage(BaseMessage):
     url: str
     associates: Associates = Field(exclude=True)
     db_hash: str = Field(exclude=True)
+    _keys: list[dict[str, str]] | None = PrivateAttr(None)
+    _keys_json: str | None = PrivateAttr(None)
+
+    @staticmethod
+    def build_keys(associates: Associates, db_hash: str) -> list[dict[str, str]]:
+        return associates.keys_payload(db_hash)
+
+    def use_keys(self, keys: list[dict[str, str]]) -> None:
+        """Uses keys built once by build_keys() for many messages"""
+        self._keys = keys
+        self._keys_json = None
 
     @computed_field()
     def keys(self) -> list[dict[str, str]]:
-        cada = self.associates.get_by_hash(self.db_hash)  # current active db associate
+        if self._keys is None:
+            self._keys = self.build_keys(self.associates, self.db_hash)
+        return self._keys
 
-        others = [a for a in self.associates.list if a.db_hash != cada.db_hash]
+    def to_payload(self) -> dict[str, Any]:
+        return {"action": self._action_fast, "url": self.url, "keys": self.keys}
 
-        return [{"id": a.id, "key": a.key_utf8} for a in [cada, *others]]
+    def to_payload_json(self) -> str:
+        # The keys are the bulk of the request and the same for every URL, their JSON is cached by Associates
+        private = self.__pydantic_private__
+        keys_json = private["_keys_json"]
+        if keys_json is None:
+            keys = private["_keys"]
+            keys_json = self.associates.keys_payload_json(self.db_hash) if keys is None else json_encoder.encode(keys)
+            private["_keys_json"] = keys_json
+        return _GET_LOGINS_TEMPLATE % (json_encoder.encode(self.url), keys_json)
 
 
 class GetDatabaseGroupsMessage(BaseMessage):
@@ -177,6 +256,16 @@ class GetDatabaseGroupsMessage(BaseMessage):
     _response = responses.GetDatabaseGroupsResponse
 
 
-# class GetTotpRequset(BaseRequest):
-#     _action: str = PrivateAttr("get-totp")
-#     uuid: str
+class GetTotpMessage(BaseMessage):
+    """
+{
+    "action": "get-totp",
+    "uuid": "<entry UUID>"
+}
+    """
+    _action: str = PrivateAttr("get-totp")
+    _response = responses.GetTotpResponse
+    uuid: str
+
+    def to_payload(self) -> dict[str, Any]:
+        return {"action": self._action_fast, "uuid": self.uuid}
@@ -1,8 +1,12 @@
-from typing import Literal
+from collections.abc import Iterator, Sequence
+from functools import cached_property
+from typing import Any, Literal, overload
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_serializer, field_validator
+from pydantic_core.core_schema import FieldSerializationInfo
 
 from .classes import KPXProtocol
+from .errors import ResponseUnsuccesfulException
 
 
 class BaseResponse(KPXProtocol):
@@ -40,6 +44,10 @@ class TestAssociateResponse(BaseResponse):
 
 
 class Login(BaseModel):
+    model_config = ConfigDict(
+        defer_build=True,
+    )
+
     group: str | None = None
     login: str
     name: str
@@ -64,15 +72,167 @@ class GetLoginsResponse(BaseResponse):
         return int(v)
 
 
+class DatabaseLogin(Login):
+    """Login with the hash of the database it was found in"""
+    db_hash: str
+
+
+class AllDatabasesLogins(BaseModel):
+    """Logins for one URL from every associated database, see Connection.get_logins_all_databases()"""
+    model_config = ConfigDict(
+        defer_build=True,
+        arbitrary_types_allowed=True,
+    )
+
+    entries: list[DatabaseLogin] = Field(default_factory=list)  # each uuid once, active database first
+    errors: dict[str, ResponseUnsuccesfulException] = Field(default_factory=dict)  # failed databases by hash
+
+
+class LazyLogins(Sequence[Login]):
+    """Entries of a get-logins response, each one validated into a Login on first access.
+
+    A malformed entry raises ValidationError when it is accessed instead of when the response is received.
+    """
+    __slots__ = ("_logins", "_raw")
+
+    def __init__(self, raw: list[dict[str, Any]]) -> None:
+        self._raw = raw
+        self._logins: list[Login | None] = [None] * len(raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    @overload
+    def __getitem__(self, index: int) -> Login: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Login]: ...
+
+    def __getitem__(self, index: int | slice) -> Login | list[Login]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        login = self._logins[index]
+        if login is None:
+            login = self._logins[index] = Login.model_validate(self._raw[index])
+        return login
+
+    def __repr__(self) -> str:
+        return f"LazyLogins({len(self)} entries)"
+
+
+class LazyGetLoginsResponse(GetLoginsResponse):
+    """GetLoginsResponse whose entries are validated on access, see LazyLogins"""
+    entries: LazyLogins
+
+    # noinspection PyNestedDecorators
+    @field_validator("entries", mode="before")
+    @classmethod
+    def validate_entries(cls, v: list[dict[str, Any]] | LazyLogins) -> LazyLogins:
+        if isinstance(v, LazyLogins):
+            return v
+        return LazyLogins(v)
+
+    @field_serializer("entries")
+    def serialize_entries(self, value: LazyLogins, _info: FieldSerializationInfo) -> list[dict[str, Any]]:
+        return [login.model_dump() for login in value]
+
+
 class Group(BaseModel):
+    model_config = ConfigDict(
+        defer_build=True,
+    )
+
     name: str
     uuid: str
     children: list['Group'] = Field(default_factory=list)
 
 
+def _build_group_tree(raw_groups: list[Any]) -> list[Group]:
+    """Validates a group tree level by level. Validating the nested models in one go fails at a depth of
+    about 250, when pydantic's recursion guard is hit.
+    """
+    roots: list[Group] = []
+    stack: list[tuple[list[Any], list[Group]]] = [(raw_groups, roots)]
+    while stack:
+        raw_list, target = stack.pop()
+        for raw in raw_list:
+            children = raw.get("children", []) if isinstance(raw, dict) else None
+            if not isinstance(children, list):
+                # Group objects, or malformed data that fails validation here
+                target.append(Group.model_validate(raw))
+                continue
+            group = Group.model_validate({**raw, "children": []})
+            target.append(group)
+            if children:
+                stack.append((children, group.children))
+    return roots
+
+
+class GroupIndex:
+    """Lookups in a group tree, built once and without recursion.
+
+    A path is the names of the groups from the root down, joined with "/", e.g. "main/group0/group01".
+    If siblings have the same name, their path finds the first one.
+    """
+    __slots__ = ("_by_path", "_by_uuid", "_groups", "_parents", "_paths")
+
+    def __init__(self, groups: list[Group]) -> None:
+        self._groups: list[Group] = []  # depth-first, parents before their children
+        self._by_path: dict[str, Group] = {}
+        self._by_uuid: dict[str, Group] = {}
+        self._parents: dict[str, Group | None] = {}
+        self._paths: dict[str, str] = {}
+
+        stack: list[tuple[Group, Group | None, str]] = [(group, None, "") for group in reversed(groups)]
+        while stack:
+            group, parent, parent_path = stack.pop()
+            path = f"{parent_path}/{group.name}" if parent is not None else group.name
+            self._groups.append(group)
+            self._by_path.setdefault(path, group)
+            self._by_uuid[group.uuid] = group
+            self._parents[group.uuid] = parent
+            self._paths[group.uuid] = path
+            stack.extend((child, group, path) for child in reversed(group.children))
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def __iter__(self) -> Iterator[Group]:
+        return iter(self._groups)
+
+    def find_by_path(self, path: str) -> Group | None:
+        return self._by_path.get(path.strip("/"))
+
+    def find_by_uuid(self, uuid: str) -> Group | None:
+        return self._by_uuid.get(uuid)
+
+    def parent(self, group: Group) -> Group | None:
+        """Parent of the group, None for a top-level group"""
+        return self._parents[group.uuid]
+
+    def path(self, group: Group) -> str:
+        return self._paths[group.uuid]
+
+
 class Groups(BaseModel):
+    model_config = ConfigDict(
+        defer_build=True,
+    )
+
     groups: list[Group] = Field(default_factory=list)
 
+    # noinspection PyNestedDecorators
+    @field_validator("groups", mode="before")
+    @classmethod
+    def validate_groups(cls, v: Any) -> Any:  # noqa: ANN401
+        return _build_group_tree(v) if isinstance(v, list) else v
+
+    @cached_property
+    def index(self) -> GroupIndex:
+        """Built on first access, the tree must not be modified afterwards"""
+        return GroupIndex(self.groups)
+
 
 class GetDatabaseGroupsResponse(BaseResponse):
     nonce: str
@@ -82,9 +242,30 @@ class GetDatabaseGroupsResponse(BaseResponse):
     defaultGroupAlwaysAllow: bool = None
     groups: Groups = Field(default_factory=dict)
 
+    def find_by_path(self, path: str) -> Group | None:
+        """See GroupIndex"""
+        return self.groups.index.find_by_path(path)
+
+    def find_by_uuid(self, uuid: str) -> Group | None:
+        return self.groups.index.find_by_uuid(uuid)
+
+    def flatten(self) -> list[Group]:
+        """All groups, parents before their children"""
+        return list(self.groups.index)
+
 
-# class GetTotpResponse(BaseResponse):
-#     totp: str
-#     version: str
-#     success: Literal["true"]
-#     nonce: str
\ No newline at end of file
+class RawGetDatabaseGroupsResponse(BaseResponse):
+    """GetDatabaseGroupsResponse with the group tree left unvalidated, see GroupTree"""
+    nonce: str
+    success: Literal["true"]
+    version: str
+    defaultGroup: str | None = None
+    defaultGroupAlwaysAllow: bool = None
+    groups: dict[str, Any] = Field(default_factory=dict)
+
+
+class GetTotpResponse(BaseResponse):
+    totp: str  # empty if the entry has no TOTP
+    version: str
+    success: Literal["true"]
+    nonce: str
\ No newline at end of file
@@ -1,24 +1,51 @@
 import base64
+import contextlib
 import os
 import platform
 import socket
 from functools import cached_property
-from typing import Any
+from typing import Any, Self
 
-from loguru import logger as log
 from nacl.public import Box, PrivateKey, PublicKey
-from pydantic import BaseModel, ConfigDict, Field, field_serializer, field_validator
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, field_serializer, field_validator
 from pydantic_core.core_schema import FieldSerializationInfo
 
+from keepassxc_protocol.classes import json_encoder, log
+from keepassxc_protocol.framing import JSONMessageFramer
 from keepassxc_protocol.winpipe import WinNamedPipe
 
 if platform.system() == "Windows":
     import getpass
 
+NONCE_SIZE = 24
+_NONCE_MASK = (1 << (8 * NONCE_SIZE)) - 1
+
+Socket = WinNamedPipe | socket.socket
+
+
+def get_socket_path() -> str:
+    server_name = "org.keepassxc.KeePassXC.BrowserServer"
+    system = platform.system()
+    if system == "Linux" and "XDG_RUNTIME_DIR" in os.environ:
+        flatpak_socket_path = os.path.join(
+            os.environ["XDG_RUNTIME_DIR"], "app/org.keepassxc.KeePassXC", server_name
+        )
+        if os.path.exists(flatpak_socket_path):
+            return flatpak_socket_path
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], server_name)
+    elif system == "Darwin" and "TMPDIR" in os.environ:
+        return os.path.join(os.getenv("TMPDIR"), server_name)
+    elif system == "Windows":
+        path_win = "org.keepassxc.KeePassXC.BrowserServer_" + getpass.getuser()
+        return path_win
+    else:
+        return os.path.join("/tmp", server_name)
+
 
 class Associate(BaseModel):
+    """Immutable, so it is shared instead of copied by Associates"""
     model_config = ConfigDict(
-        validate_assignment=True,
+        frozen=True,
         arbitrary_types_allowed=True,
     )
 
@@ -26,7 +53,7 @@ class Associate(BaseModel):
     id: str
     key: PublicKey
 
-    @property
+    @cached_property
     def key_utf8(self) -> str:
         # noinspection PyProtectedMember
         return base64.b64encode(self.key._public_key).decode("utf-8")
@@ -46,15 +73,17 @@ class Associate(BaseModel):
 
 
 class Associates(BaseModel):
+    """Associates by database hash"""
     model_config = ConfigDict(
         validate_assignment=True,
     )
 
     entries: dict[str, Associate] = Field(default_factory=dict)
+    # keys_payload() and its JSON by db hash, with the associates they were built from
+    _keys: dict[str, tuple[tuple[Associate, ...], list[dict[str, str]], str]] = PrivateAttr(default_factory=dict)
 
     def get_by_hash(self, db_hash: str) -> Associate:
-        associate = self.entries[db_hash]
-        return associate.model_copy(deep=True)
+        return self.entries[db_hash]
 
     def delete_by_hash(self, db_hash: str) -> None:
         del self.entries[db_hash]
@@ -62,26 +91,167 @@ class Associates(BaseModel):
     def delete_all(self) -> None:
         self.entries = {}
 
+    def keys_payload(self, db_hash: str) -> list[dict[str, str]]:
+        """`keys` of a get-logins request while `db_hash` is active: its associate first, then all others.
+
+        Built once per database hash until the associates change, however they are changed. The list is shared,
+        do not modify it.
+        """
+        return self._cached_keys(db_hash)[1]
+
+    def keys_payload_json(self, db_hash: str) -> str:
+        """keys_payload() as JSON, encoded once like the list"""
+        return self._cached_keys(db_hash)[2]
+
+    def _cached_keys(self, db_hash: str) -> tuple[tuple[Associate, ...], list[dict[str, str]], str]:
+        # Associates are immutable, comparing them by identity finds every change of `entries`
+        associates = tuple(self.entries.values())
+        # Private attributes are resolved through __getattr__, which is slow on the hot path
+        cache = self.__pydantic_private__["_keys"]
+        cached = cache.get(db_hash)
+        if cached is not None and len(cached[0]) == len(associates) \
+                and all(a is b for a, b in zip(cached[0], associates, strict=True)):
+            return cached
+
+        active = self.entries[db_hash]
+        others = [a for a in associates if a.db_hash != active.db_hash]
+        keys = [{"id": a.id, "key": a.key_utf8} for a in [active, *others]]
+        cached = cache[db_hash] = (associates, keys, json_encoder.encode(keys))
+        return cached
+
     @property
     def list(self) -> list[Associate]:
-        return [a.model_copy(deep=True) for a in self.entries.values()]
+        return list(self.entries.values())
 
     def add(self, db_hash: str, associate: Associate) -> None:
-        self.entries[db_hash] = associate.model_copy(deep=True)
+        self.entries[db_hash] = associate
+
+
+class SessionCore:
+    """State of a session read or changed by every request: socket, box, client id and nonce.
+
+    Plain attributes instead of pydantic fields, so incrementing the nonce is not validated. The nonce is kept as
+    a counter, its bytes and base64 forms are built once per value.
+    """
+    __slots__ = ("_nonce", "_nonce_bytes", "_nonce_utf8", "box", "client_id", "socket")
+
+    def __init__(self, socket_: Socket | None, nonce: bytes, client_id: str, box: Box | None = None) -> None:
+        self.socket = socket_
+        self.client_id = client_id
+        self.box = box
+        self.nonce = nonce
+
+    @property
+    def nonce(self) -> bytes:
+        if self._nonce_bytes is None:
+            self._nonce_bytes = self._nonce.to_bytes(NONCE_SIZE, "big")
+        return self._nonce_bytes
+
+    @nonce.setter
+    def nonce(self, value: bytes) -> None:
+        if len(value) != NONCE_SIZE:
+            raise ValueError(f"nonce must be {NONCE_SIZE} bytes")
+        self._nonce = int.from_bytes(value, "big")
+        self._nonce_bytes = bytes(value)
+        self._nonce_utf8: str | None = None
+
+    @property
+    def nonce_utf8(self) -> str:
+        if self._nonce_utf8 is None:
+            self._nonce_utf8 = base64.b64encode(self.nonce).decode("utf-8")
+        return self._nonce_utf8
+
+    def increase_nonce(self) -> None:
+        # Wraps around like sodium_increment()
+        self._nonce = (self._nonce + 1) & _NONCE_MASK
+        self._nonce_bytes = None
+        self._nonce_utf8 = None
+
+    def copy(self) -> "SessionCore":
+        """Same socket, box and client id, the nonce of the copy is increased on its own"""
+        return SessionCore(self.socket, self.nonce, self.client_id, self.box)
 
 
 class ConnectionSession(BaseModel):
+    """Keys, associates and connection of a client.
+
+    The socket, box, client id and nonce live in `core`, a SessionCore, and are available here as properties.
+    The hot path uses `core` directly. They are not fields, so model_dump() does not include them. A copy made
+    with model_copy() or copy.copy() gets its own core.
+    """
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
         validate_assignment=True,
     )
 
     private_key: PrivateKey
-    nonce: bytes
-    client_id: str
-    box: Box | None = None
     associates: Associates = Associates()
-    socket: WinNamedPipe | socket.socket
+    socket_path: str | None = None
+    _core: SessionCore = PrivateAttr()
+    _framer: JSONMessageFramer = PrivateAttr(default_factory=JSONMessageFramer)
+
+    def __init__(self, *, nonce: bytes, client_id: str, socket: Socket | None = None,
+                 box: Box | None = None, **data: Any) -> None:  # noqa: ANN401
+        """A session without a socket is not connected on creation, see AsyncConnectionSession"""
+        super().__init__(**data)
+        self._core = SessionCore(socket, nonce, client_id, box)
+        if socket is not None:
+            self._connect()
+
+    def __copy__(self) -> Self:
+        copied = super().__copy__()
+        copied.__pydantic_private__["_core"] = self.core.copy()
+        return copied
+
+    def __deepcopy__(self, memo: dict[int, Any] | None = None) -> Self:
+        # The socket and box cannot be deep copied, the copy shares them like a shallow one
+        memo = {} if memo is None else memo
+        memo[id(self.core)] = self.core.copy()
+        return super().__deepcopy__(memo)
+
+    @property
+    def core(self) -> SessionCore:
+        # Private attributes are resolved through __getattr__, which is slow on the hot path
+        return self.__pydantic_private__["_core"]
+
+    @property
+    def socket(self) -> Socket | None:
+        return self.core.socket
+
+    @socket.setter
+    def socket(self, value: Socket | None) -> None:
+        self.core.socket = value
+
+    @property
+    def box(self) -> Box | None:
+        return self.core.box
+
+    @box.setter
+    def box(self, value: Box | None) -> None:
+        self.core.box = value
+
+    @property
+    def client_id(self) -> str:
+        return self.core.client_id
+
+    @client_id.setter
+    def client_id(self, value: str) -> None:
+        self.core.client_id = value
+
+    @property
+    def nonce(self) -> bytes:
+        return self.core.nonce
+
+    @nonce.setter
+    def nonce(self, value: bytes) -> None:
+        self.core.nonce = value
+
+    @property
+    def nonce_utf8(self) -> str:
+        return self.core.nonce_utf8
+
+    def increase_nonce(self) -> None:
+        self.core.increase_nonce()
 
     @staticmethod
     def _decode(data: PublicKey | bytes) -> str:
@@ -93,57 +263,47 @@ class ConnectionSession(BaseModel):
         return base64.b64encode(data_).decode("utf-8")
 
     def _connect(self) -> None:
-        def get_socket_path() -> str:
-            server_name = "org.keepassxc.KeePassXC.BrowserServer"
-            system = platform.system()
-            if system == "Linux" and "XDG_RUNTIME_DIR" in os.environ:
-                flatpak_socket_path = os.path.join(
-                    os.environ["XDG_RUNTIME_DIR"], "app/org.keepassxc.KeePassXC", server_name
-                )
-                if os.path.exists(flatpak_socket_path):
-                    return flatpak_socket_path
-                return os.path.join(os.environ["XDG_RUNTIME_DIR"], server_name)
-            elif system == "Darwin" and "TMPDIR" in os.environ:
-                return os.path.join(os.getenv("TMPDIR"), server_name)
-            elif system == "Windows":
-                path_win = "org.keepassxc.KeePassXC.BrowserServer_" + getpass.getuser()
-                return path_win
-            else:
-                return os.path.join("/tmp", server_name)
-
-        path = get_socket_path()
-        log.debug(f"Connecting to {path}")
+        path = self.socket_path or get_socket_path()
+        log.debug("Connecting to {}", path)
         self.socket.connect(path)
 
-    def model_post_init(self, context: Any, /) -> None:  # noqa: ANN401
-        self._connect()
-
     @cached_property
     def public_key(self) -> PublicKey:
         return self.private_key.public_key
 
-    @property
+    @cached_property
     def public_key_utf8(self) -> str:
         return self._decode(self.public_key)
 
-    @property
-    def nonce_utf8(self) -> str:
-        return self._decode(self.nonce)
+    def close(self) -> None:
+        if isinstance(self.socket, socket.socket):
+            # Wakes up a thread blocked in recv(), close() alone does not
+            with contextlib.suppress(OSError):
+                self.socket.shutdown(socket.SHUT_RDWR)
+        self.socket.close()
 
-    def increase_nonce(self) -> None:
-        self.nonce = (int.from_bytes(self.nonce, "big") + 1).to_bytes(24, "big")
+    def reconnect(self, socket_: Socket) -> None:
+        """Connects a new socket in place of the current one. The keys, client id and associates are kept,
+        the server public key has to be exchanged again.
+        """
+        self.close()
+        self.socket = socket_
+        self.box = None
+        self._framer = JSONMessageFramer()
+        self._connect()
 
     def sendall(self, data: bytes) -> None:
-        self.socket.sendall(data)
+        self.core.socket.sendall(data)
+
+    def receive_bytes(self) -> bytes:
+        """Returns the next complete message, or empty bytes if the connection has been closed"""
+        while (message := self._framer.next_message()) is None:
+            data = self.core.socket.recv(65536)
+            if not data:
+                return b""
+            self._framer.feed(data)
+        return message
 
     def receive(self) -> str:
-        data = []
-        while True:
-            new_data = self.socket.recv(4096)
-            if new_data:
-                data.append(new_data.decode('utf-8'))
-            else:
-                break
-            if len(new_data) < 4096:
-                break
-        return "".join(data)
\ No newline at end of file
+        """Returns the next complete message, or an empty string if the connection has been closed"""
+        return self.receive_bytes().decode("utf-8")
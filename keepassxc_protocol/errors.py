@@ -1,2 +1,8 @@
 class ResponseUnsuccesfulException(Exception):
-    pass
\ No newline at end of file
+    @property
+    def error_code(self) -> str | None:
+        """errorCode of the KeePassXC error reply, if the exception was raised for one"""
+        data = self.args[0] if self.args else None
+        if isinstance(data, dict):
+            return data.get("errorCode")
+        return None
\ No newline at end of file
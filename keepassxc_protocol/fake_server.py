@@ -0,0 +1,395 @@
+"""Local stand-in for the KeePassXC browser integration server, for tests and benchmarks.
+
+with FakeKeePassXC(logins={"example.test": FakeKeePassXC.make_logins(100)}) as server:
+    con = Connection(socket_path=server.socket_path)
+    con.associate()  # accepted without a dialog
+    con.get_logins("https://example.test")
+
+Only Unix sockets are supported.
+"""
+import base64
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from typing import Any, Self
+from urllib.parse import urlsplit
+
+from nacl.exceptions import CryptoError
+from nacl.public import Box, PrivateKey, PublicKey
+
+from .framing import JSONMessageFramer
+
+# https://github.com/keepassxreboot/keepassxc/blob/develop/src/browser/BrowserMessageBuilder.h
+ERROR_DATABASE_NOT_OPENED = 1
+ERROR_CLIENT_PUBLIC_KEY_NOT_RECEIVED = 3
+ERROR_CANNOT_DECRYPT_MESSAGE = 4
+ERROR_ASSOCIATION_FAILED = 8
+ERROR_INCORRECT_ACTION = 12
+ERROR_EMPTY_MESSAGE_RECEIVED = 13
+ERROR_NO_URL_PROVIDED = 14
+ERROR_NO_LOGINS_FOUND = 15
+
+_ERROR_MESSAGES = {
+    ERROR_DATABASE_NOT_OPENED: "Database not opened",
+    ERROR_CLIENT_PUBLIC_KEY_NOT_RECEIVED: "Client public key not received",
+    ERROR_CANNOT_DECRYPT_MESSAGE: "Cannot decrypt message",
+    ERROR_ASSOCIATION_FAILED: "Association failed",
+    ERROR_INCORRECT_ACTION: "Incorrect action",
+    ERROR_EMPTY_MESSAGE_RECEIVED: "Empty message received",
+    ERROR_NO_URL_PROVIDED: "No URL provided",
+    ERROR_NO_LOGINS_FOUND: "No logins found",
+}
+
+
+def _increase_nonce(nonce: bytes) -> bytes:
+    return (int.from_bytes(nonce, "big") + 1).to_bytes(len(nonce), "big")
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("utf-8")
+
+
+class _Client:
+    """One connected socket. Replies are written by a separate thread so that latency does not block reading."""
+
+    def __init__(self, server: "FakeKeePassXC", sock: socket.socket) -> None:
+        self.server = server
+        self.socket = sock
+        self.private_key = PrivateKey.generate()
+        self.box: Box | None = None
+        self._outgoing: list[tuple[float, bytes]] = []
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def start(self) -> None:
+        threading.Thread(target=self._read_loop, daemon=True).start()
+        threading.Thread(target=self._write_loop, daemon=True).start()
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+    def send(self, message: dict[str, Any], delay: float = 0.0) -> None:
+        with self._condition:
+            self._outgoing.append((time.monotonic() + delay, json.dumps(message).encode("utf-8")))
+            self._condition.notify()
+
+    def _write_loop(self) -> None:
+        server = self.server
+        while True:
+            with self._condition:
+                while not self._outgoing and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                due, data = self._outgoing.pop(0)
+
+            if (wait := due - time.monotonic()) > 0:
+                time.sleep(wait)
+            try:
+                if server.chunk_size:
+                    for i in range(0, len(data), server.chunk_size):
+                        self.socket.sendall(data[i:i + server.chunk_size])
+                        if server.chunk_delay:
+                            time.sleep(server.chunk_delay)
+                else:
+                    self.socket.sendall(data)
+            except OSError:
+                return
+
+    def _read_loop(self) -> None:
+        framer = JSONMessageFramer()
+        try:
+            while data := self.socket.recv(65536):
+                framer.feed(data)
+                messages = []
+                while (message := framer.next_message()) is not None:
+                    messages.append(message)
+                if len(messages) > 1 and self.server.one_message_per_read:
+                    # KeePassXC parses everything it has read as one JSON document, which fails for several
+                    # noinspection PyProtectedMember
+                    self.send(self.server._error("", ERROR_EMPTY_MESSAGE_RECEIVED), delay=self.server.latency)
+                    continue
+                for message in messages:
+                    reply = self.server.handle(self, json.loads(message))
+                    if reply is not None:
+                        self.send(reply, delay=self.server.latency)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.close()  # also stops the writer thread
+            self.server.disconnected(self)
+
+
+class FakeDatabase:
+    """Another open database, searched by get-logins like KeePassXC with "Search in all opened databases" enabled.
+
+    :param associates: accepted associations, id -> base64 identification public key
+    :param logins: entries returned by get-logins, by host name
+    """
+
+    def __init__(self, associates: dict[str, str] | None = None,
+                 logins: dict[str, list[dict[str, Any]]] | None = None) -> None:
+        self.associates = dict(associates or {})
+        self.logins = dict(logins or {})
+
+
+class FakeKeePassXC:
+    """Answers the browser protocol like an unlocked KeePassXC with one open database that accepts every
+    association request.
+
+    :param socket_path: where to listen, a new temporary path by default
+    :param db_hash: hash of the open database
+    :param associates: accepted associations, id -> base64 identification public key
+    :param logins: entries returned by get-logins, by host name
+    :param groups: group tree returned by get-database-groups
+    :param other_databases: further open databases, by hash
+    :param latency: seconds before each reply is written. Replies are delayed independently of each other,
+        like the round trip of a real connection, so pipelined requests overlap.
+    :param chunk_size: write replies in chunks of this many bytes
+    :param chunk_delay: seconds between the chunks
+    :param one_message_per_read: like KeePassXC, answer requests that arrive in the same read with one error
+        instead of each. Disable it to test pipelining with `max_in_flight` above 1, which KeePassXC does not
+        support reliably.
+    """
+
+    def __init__(self, socket_path: str | None = None, *,
+                 db_hash: str = "0123456789abcdef" * 4,
+                 associates: dict[str, str] | None = None,
+                 logins: dict[str, list[dict[str, Any]]] | None = None,
+                 groups: list[dict[str, Any]] | None = None,
+                 other_databases: dict[str, "FakeDatabase"] | None = None,
+                 latency: float = 0.0,
+                 chunk_size: int | None = None,
+                 chunk_delay: float = 0.0,
+                 one_message_per_read: bool = True,
+                 version: str = "2.7.10") -> None:
+        if socket_path is None:
+            socket_path = os.path.join(tempfile.mkdtemp(prefix="kpx-"), "org.keepassxc.KeePassXC.BrowserServer")
+        self.socket_path = socket_path
+        self.db_hash = db_hash
+        self.associates = dict(associates or {})
+        self.logins = dict(logins or {})
+        self.groups = groups if groups is not None else []
+        self.other_databases = dict(other_databases or {})
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.one_message_per_read = one_message_per_read
+        self.version = version
+        self.locked = False
+        self.requests: Counter[str] = Counter()  # handled requests by action
+
+        self._server_socket: socket.socket | None = None
+        self._clients: list[_Client] = []
+        self._lock = threading.Lock()
+        self._associate_counter = 0
+        self._handlers: dict[str, Callable[[dict[str, Any]], dict[str, Any] | int]] = {
+            "get-databasehash": self._get_databasehash,
+            "associate": self._associate,
+            "test-associate": self._test_associate,
+            "get-logins": self._get_logins,
+            "get-database-groups": self._get_database_groups,
+            "get-totp": self._get_totp,
+        }
+
+    def __enter__(self) -> Self:
+        self.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+    @property
+    def client_count(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+    def start(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server_socket.bind(self.socket_path)
+        self._server_socket.listen(128)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def stop(self) -> None:
+        if self._server_socket is not None:
+            self._server_socket.close()
+            self._server_socket = None
+        self.disconnect_all()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def disconnect_all(self) -> None:
+        """Closes every client connection, as if KeePassXC had been restarted"""
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            client.close()
+
+    def lock(self) -> None:
+        """Locks the database and notifies every client"""
+        self.locked = True
+        self.broadcast({"action": "database-locked"})
+
+    def unlock(self) -> None:
+        """Unlocks the database and notifies every client"""
+        self.locked = False
+        self.broadcast({"action": "database-unlocked"})
+
+    def broadcast(self, message: dict[str, Any]) -> None:
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.send(message)
+
+    @staticmethod
+    def make_logins(count: int, prefix: str = "entry") -> list[dict[str, Any]]:
+        return [
+            {
+                "group": "group",
+                "login": f"{prefix}{i}_login",
+                "name": f"{prefix}{i}",
+                "password": f"{prefix}{i}_password",
+                "uuid": f"{i:032x}",
+                "stringFields": [],
+                "totp": "",
+            }
+            for i in range(count)
+        ]
+
+    @staticmethod
+    def make_groups(depth: int, width: int = 1, prefix: str = "group") -> list[dict[str, Any]]:
+        """Group tree with `width` children per group, `depth` levels deep"""
+        counter = 0
+
+        def level(remaining: int, name: str) -> list[dict[str, Any]]:
+            nonlocal counter
+            groups = []
+            for i in range(width):
+                counter += 1
+                groups.append({
+                    "name": f"{name}{i}",
+                    "uuid": f"{counter:032x}",
+                    "children": level(remaining - 1, f"{name}{i}") if remaining > 1 else [],
+                })
+            return groups
+
+        return level(depth, prefix) if depth > 0 else []
+
+    def _accept_loop(self) -> None:
+        server_socket = self._server_socket
+        while True:
+            try:
+                sock, _ = server_socket.accept()
+            except OSError:
+                return
+            client = _Client(self, sock)
+            with self._lock:
+                self._clients.append(client)
+            client.start()
+
+    def disconnected(self, client: _Client) -> None:
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    @staticmethod
+    def _error(action: str, code: int) -> dict[str, Any]:
+        return {"action": action, "errorCode": str(code), "error": _ERROR_MESSAGES[code]}
+
+    def handle(self, client: _Client, request: dict[str, Any]) -> dict[str, Any] | None:
+        action = request.get("action", "")
+        nonce = base64.b64decode(request.get("nonce", ""))
+        response_nonce = _increase_nonce(nonce)
+
+        if action == "change-public-keys":
+            self.requests[action] += 1
+            client.box = Box(client.private_key, PublicKey(base64.b64decode(request["publicKey"])))
+            return {
+                "action": action,
+                "version": self.version,
+                "publicKey": _b64(client.private_key.public_key.encode()),
+                "nonce": _b64(response_nonce),
+                "success": "true",
+            }
+
+        if client.box is None:
+            return self._error(action, ERROR_CLIENT_PUBLIC_KEY_NOT_RECEIVED)
+        try:
+            message = json.loads(client.box.decrypt(base64.b64decode(request["message"]), nonce))
+        except (CryptoError, KeyError, ValueError):
+            return self._error(action, ERROR_CANNOT_DECRYPT_MESSAGE)
+
+        action = message.get("action", action)
+        self.requests[action] += 1
+        handler = self._handlers.get(action)
+        if handler is None:
+            return self._error(action, ERROR_INCORRECT_ACTION)
+        if self.locked:
+            return self._error(action, ERROR_DATABASE_NOT_OPENED)
+
+        reply = handler(message)
+        if isinstance(reply, int):
+            return self._error(action, reply)
+
+        reply = {"action": action, "version": self.version, "nonce": _b64(response_nonce), "success": "true",
+                 **reply}
+        encrypted = client.box.encrypt(json.dumps(reply).encode("utf-8"), response_nonce).ciphertext
+        return {"action": action, "message": _b64(encrypted), "nonce": _b64(response_nonce)}
+
+    def _is_associated(self, keys: list[dict[str, str]]) -> bool:
+        return any(self.associates.get(key.get("id")) == key.get("key") for key in keys)
+
+    def _get_databasehash(self, message: dict[str, Any]) -> dict[str, Any]:
+        return {"hash": self.db_hash}
+
+    def _associate(self, message: dict[str, Any]) -> dict[str, Any]:
+        with self._lock:
+            self._associate_counter += 1
+            associate_id = f"fake-associate-{self._associate_counter}"
+        self.associates[associate_id] = message["idKey"]
+        return {"hash": self.db_hash, "id": associate_id}
+
+    def _test_associate(self, message: dict[str, Any]) -> dict[str, Any] | int:
+        if not self._is_associated([message]):
+            return ERROR_ASSOCIATION_FAILED
+        return {"hash": self.db_hash, "id": message["id"]}
+
+    def _get_logins(self, message: dict[str, Any]) -> dict[str, Any] | int:
+        if not message.get("url"):
+            return ERROR_NO_URL_PROVIDED
+        keys = message.get("keys", [])
+        databases = [database for database in [self, *self.other_databases.values()]
+                     if any(database.associates.get(key.get("id")) == key.get("key") for key in keys)]
+        if not databases:
+            return ERROR_ASSOCIATION_FAILED
+        host = urlsplit(message["url"]).hostname or ""
+        entries = [entry for database in databases for entry in database.logins.get(host, [])]
+        if not entries:
+            return ERROR_NO_LOGINS_FOUND
+        return {"hash": self.db_hash, "count": len(entries), "entries": entries}
+
+    def _get_database_groups(self, message: dict[str, Any]) -> dict[str, Any]:
+        return {"defaultGroup": "", "defaultGroupAlwaysAllow": False, "groups": {"groups": self.groups}}
+
+    def _get_totp(self, message: dict[str, Any]) -> dict[str, Any]:
+        # Like KeePassXC, an unknown entry or one without TOTP gets an empty code
+        for database in [self, *self.other_databases.values()]:
+            for entries in database.logins.values():
+                for entry in entries:
+                    if entry["uuid"] == message.get("uuid"):
+                        return {"totp": entry.get("totp") or ""}
+        return {"totp": ""}
@@ -0,0 +1,81 @@
+import re
+
+# Everything up to the next brace outside of a string literal. Stops at the opening quote of a string that is
+# cut off by the end of the buffer.
+_SKIP = re.compile(rb'(?:[^{}"]++|"[^"\\]*+(?:\\.[^"\\]*+)*+")*+', re.DOTALL)
+# The rest of a string literal, up to its closing quote or an escape cut off by the end of the buffer
+_STRING_REST = re.compile(rb'[^"\\]*+(?:\\.[^"\\]*+)*+', re.DOTALL)
+_WHITESPACE = b" \t\r\n"
+
+
+class JSONMessageFramer:
+    """Splits a byte stream of concatenated JSON objects into single messages.
+
+    KeePassXC writes bare JSON objects without a length prefix, so the message boundary is found by tracking
+    the brace depth outside of strings. The scan position and depth are kept between reads, so a message split
+    across many reads is not rescanned from its start, and it is copied out only once it is complete.
+    """
+
+    def __init__(self, max_message_size: int = 64 * 1024 * 1024) -> None:
+        self.max_message_size = max_message_size
+        self._buffer = bytearray()
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+
+    def __len__(self) -> int:
+        """Number of buffered bytes"""
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> None:
+        self._buffer += data
+
+    def _strip_leading_whitespace(self) -> None:
+        buffer = self._buffer
+        start = 0
+        while start < len(buffer) and buffer[start] in _WHITESPACE:
+            start += 1
+        if start:
+            del buffer[:start]
+        if buffer and buffer[0] != ord("{"):
+            raise ValueError(f"Unexpected data between messages: {bytes(buffer[:32])!r}")
+
+    def next_message(self) -> bytes | None:
+        """Returns the next complete message, or None if more data is needed"""
+        if self._depth == 0:
+            self._strip_leading_whitespace()
+
+        buffer = self._buffer
+        position = self._position
+        end = len(buffer)
+
+        while position < end:
+            if self._in_string:
+                position = _STRING_REST.match(buffer, position).end()
+                if position == end or buffer[position] != ord('"'):
+                    break
+                self._in_string = False
+                position += 1
+
+            if (position := _SKIP.match(buffer, position).end()) == end:
+                break
+            char = buffer[position]
+            if char == ord('"'):
+                # The closing quote has not arrived yet. Continue inside the string on the next read instead of
+                # rescanning it, the encrypted message is one long string.
+                self._in_string = True
+            elif char == ord("{"):
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    message = bytes(buffer[:position + 1])
+                    del buffer[:position + 1]
+                    self._position = 0
+                    return message
+            position += 1
+
+        self._position = position
+        if len(buffer) > self.max_message_size:
+            raise ValueError(f"Message exceeds {self.max_message_size} bytes")
+        return None
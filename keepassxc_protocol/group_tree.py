@@ -0,0 +1,126 @@
+import hashlib
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from . import classes_responses as resp
+from .classes import json_encoder
+
+
+class GroupsDiff(BaseModel):
+    """Changes between two group trees. Renamed and moved groups are (old, new) pairs."""
+    model_config = ConfigDict(
+        defer_build=True,
+    )
+
+    added: list[resp.Group] = Field(default_factory=list)
+    removed: list[resp.Group] = Field(default_factory=list)
+    renamed: list[tuple[resp.Group, resp.Group]] = Field(default_factory=list)
+    moved: list[tuple[resp.Group, resp.Group]] = Field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.renamed or self.moved)
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _subtree_hashes(raw_groups: list[Any]) -> tuple[dict[str, bytes], dict[str, tuple[str, str | None]]]:
+    """Hash of every subtree by the uuid of its root, and the name and parent uuid of every group.
+
+    Computed without recursion, children before their parents.
+    """
+    hashes: dict[str, bytes] = {}
+    nodes: dict[str, tuple[str, str | None]] = {}
+    # (group, parent uuid, whether its children have been hashed)
+    stack: list[tuple[Any, str | None, bool]] = [(raw, None, False) for raw in raw_groups]
+    while stack:
+        raw, parent_uuid, children_done = stack.pop()
+        if not isinstance(raw, dict) or not isinstance(raw.get("uuid"), str) \
+                or not isinstance(raw.get("children", []), list):
+            resp.Group.model_validate(raw)  # raises for the malformed group
+        children = raw.get("children", [])
+        if not children_done:
+            stack.append((raw, parent_uuid, True))
+            stack.extend((child, raw.get("uuid"), False) for child in children)
+            continue
+
+        uuid, name = raw.get("uuid"), raw.get("name")
+        nodes[uuid] = (name, parent_uuid)
+        hashes[uuid] = _digest(json_encoder.encode([name, uuid]).encode("utf-8")
+                               + b"".join(hashes[child.get("uuid")] for child in children))
+    return hashes, nodes
+
+
+class GroupTree:
+    """Group tree kept between get-database-groups requests, see Connection.refresh_database_groups().
+
+    A refresh whose groups are unchanged is detected by one hash of the payload. Otherwise only the subtrees that
+    changed are validated into new Group objects, unchanged subtrees keep their objects.
+    """
+
+    def __init__(self) -> None:
+        self.response: resp.GetDatabaseGroupsResponse | None = None
+        self._payload_hash: bytes | None = None
+        self._hashes: dict[str, bytes] = {}
+        self._nodes: dict[str, tuple[str, str | None]] = {}
+
+    def update(self, response: resp.RawGetDatabaseGroupsResponse) -> GroupsDiff:
+        """Takes the groups of a new response and returns what changed since the previous one"""
+        fields = response.model_dump(exclude={"groups"})
+        raw_groups = response.groups.get("groups", [])
+        payload_hash = _digest(json_encoder.encode(raw_groups).encode("utf-8"))
+
+        if self.response is not None and payload_hash == self._payload_hash:
+            self.response = self.response.model_copy(update=fields)
+            return GroupsDiff()
+
+        hashes, nodes = _subtree_hashes(raw_groups)
+        previous = self.response
+        groups = resp.Groups(groups=self._materialize(raw_groups, hashes))
+        self.response = resp.GetDatabaseGroupsResponse(**fields, groups=groups)
+
+        diff = self._diff(previous, nodes)
+        self._payload_hash, self._hashes, self._nodes = payload_hash, hashes, nodes
+        return diff
+
+    def _materialize(self, raw_groups: list[Any], hashes: dict[str, bytes]) -> list[resp.Group]:
+        index = self.response.groups.index if self.response is not None else None
+        roots: list[resp.Group] = []
+        stack: list[tuple[list[Any], list[resp.Group]]] = [(raw_groups, roots)]
+        while stack:
+            raw_list, target = stack.pop()
+            for raw in raw_list:
+                uuid = raw.get("uuid")
+                if index is not None and self._hashes.get(uuid) == hashes[uuid]:
+                    # Unchanged subtree, possibly under another parent
+                    target.append(index.find_by_uuid(uuid))
+                    continue
+                group = resp.Group.model_validate({**raw, "children": []})
+                target.append(group)
+                if raw.get("children"):
+                    stack.append((raw["children"], group.children))
+        return roots
+
+    def _diff(self, previous: resp.GetDatabaseGroupsResponse | None,
+              nodes: dict[str, tuple[str, str | None]]) -> GroupsDiff:
+        new_index = self.response.groups.index
+        if previous is None:
+            return GroupsDiff(added=list(new_index))
+
+        old_index = previous.groups.index
+        diff = GroupsDiff(
+            added=[group for group in new_index if group.uuid not in self._nodes],
+            removed=[group for group in old_index if group.uuid not in nodes],
+        )
+        for uuid, (name, parent_uuid) in nodes.items():
+            old = self._nodes.get(uuid)
+            if old is None or old == (name, parent_uuid):
+                continue
+            pair = (old_index.find_by_uuid(uuid), new_index.find_by_uuid(uuid))
+            if old[0] != name:
+                diff.renamed.append(pair)
+            if old[1] != parent_uuid:
+                diff.moved.append(pair)
+        return diff
@@ -1,107 +1,588 @@
 # Refer to https://github.com/keepassxreboot/keepassxc-browser/blob/develop/keepassxc-protocol.md
 import base64
+import contextlib
 import json
-import os
 import platform
 import socket
-from collections.abc import Buffer
-from typing import Any, TypeVar
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable
+from typing import Any, Self, TypeVar
 
 import nacl.utils
-from loguru import logger
 from nacl.public import Box, PrivateKey, PublicKey
 from pydantic import ValidationError
 
+from . import classes
 from . import classes_requests as req
 from . import classes_responses as resp
+from .cache import DatabaseHashCache, LoginsCache, TotpCache
+from .classes import json_encoder, log
 from .connection_session import Associate, Associates, ConnectionSession
 from .errors import ResponseUnsuccesfulException
+from .group_tree import GroupsDiff, GroupTree
+from .metrics import PHASE_DECRYPT, PHASE_ENCODE, PHASE_SEND, PHASE_VALIDATE, PHASE_WAIT, MetricsSink, RequestMetrics
+from .pipeline import DEFAULT_MAX_IN_FLIGHT, InflightRequests, PendingResponse, Pipeline
+from .reconnect import ReconnectPolicy
+from .session_cache import SavedSession, SessionCache
 from .winpipe import WinNamedPipe
 
-log = logger
-
 if platform.system() == "Windows":
     import win32file
 
 _R = TypeVar("_R", bound=resp.BaseResponse)
-
-
-class Connection:
-    def __init__(self) -> None:
-
-        if platform.system() == "Windows":
-            socket_ = WinNamedPipe(win32file.GENERIC_READ | win32file.GENERIC_WRITE, win32file.OPEN_EXISTING)
+_T = TypeVar("_T")
+
+# Unsolicited, unencrypted messages KeePassXC broadcasts to every connected client
+NOTIFICATION_ACTIONS = ("database-locked", "database-unlocked")
+ASSOCIATION_FAILED_ERROR_CODE = "8"
+NO_LOGINS_FOUND_ERROR_CODE = "15"
+
+# A WinNamedPipe is opened for synchronous I/O, which Windows serializes per handle: a reader thread blocked in
+# ReadFile() would block every WriteFile() of the requests. On Windows the requests read the pipe themselves.
+_READER_THREAD_SUPPORTED = platform.system() != "Windows"
+
+
+def _new_socket() -> WinNamedPipe | socket.socket:
+    if platform.system() == "Windows":
+        return WinNamedPipe(win32file.GENERIC_READ | win32file.GENERIC_WRITE, win32file.OPEN_EXISTING)
+    return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+
+class BaseConnection:
+    """I/O independent part of the protocol shared by Connection and AsyncConnection"""
+    session: ConnectionSession
+    _db_hash_cache: DatabaseHashCache
+    logins_cache: LoginsCache | None
+    totp_cache: TotpCache
+    _watch_totp_cache: bool  # only a cache passed by the caller starts the reader, see Connection.close()
+    reconnect_policy: ReconnectPolicy | None
+    session_cache: SessionCache | None
+    metrics: MetricsSink | None
+    _verified_db_hash: str | None = None  # associates verified by a saved session, test-associate is skipped
+    _subscribers: list[Callable[[str], None]]
+
+    @staticmethod
+    def _new_session_params(saved: SavedSession | None = None) -> dict[str, Any]:
+        if saved is not None:
+            private_key, client_id = saved.private_key, saved.client_id
         else:
-            socket_ = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-
-        self.session = ConnectionSession(
-            private_key=PrivateKey.generate(),
-            nonce=nacl.utils.random(24),
-            client_id=base64.b64encode(nacl.utils.random(24)).decode("utf-8"),
-            box=None,
-            socket=socket_
-        )
-
-        response = self.change_public_keys()
+            private_key, client_id = PrivateKey.generate(), base64.b64encode(nacl.utils.random(24)).decode("utf-8")
+        return {
+            "private_key": private_key,
+            "nonce": nacl.utils.random(24),
+            "client_id": client_id,
+            "box": None,
+        }
+
+    def _load_saved_session(self) -> SavedSession | None:
+        return self.session_cache.load() if self.session_cache is not None else None
+
+    def _restore_session(self, saved: SavedSession | None) -> None:
+        """Uses the associates of the saved session, and trusts their verification if it is recent enough"""
+        if saved is None:
+            return
+        self.session.associates = saved.associates
+        self._verified_db_hash = self.session_cache.verified_db_hash(saved)
+        if self._verified_db_hash is not None:
+            log.debug("Using associates verified for DB hash {} by the saved session", self._verified_db_hash)
+            self._db_hash_cache.set(self._verified_db_hash)
+
+    def _is_verified(self, associates: Associates) -> bool:
+        """Whether `associates` contain the associate verified by the saved session, unchanged"""
+        db_hash = self._verified_db_hash
+        return db_hash is not None and db_hash in associates.entries \
+            and associates.entries[db_hash] == self.session.associates.entries.get(db_hash)
+
+    def _on_verified(self, db_hash: str) -> None:
+        if self.session_cache is not None:
+            self._verified_db_hash = db_hash
+            self.session_cache.save(self.session, db_hash)
+
+    def _forget_verification(self) -> None:
+        if self._verified_db_hash is not None:
+            log.debug("Dropping the verification of the saved session")
+            self._verified_db_hash = None
+            self.session_cache.save(self.session)
+
+    def _start_metrics(self, action: str, retries: int = 0) -> RequestMetrics | None:
+        return None if self.metrics is None else RequestMetrics(action, self.metrics, retries)
+
+    def _set_server_public_key(self, response: resp.ChangePublicKeysResponse) -> None:
         self.session.box = Box(self.session.private_key, PublicKey(base64.b64decode(response.publicKey)))
-        log.debug(f"Session: {self.session}")
+        log.opt(lazy=True).debug("Session: {}", lambda: self.session)
 
+    def _encode_request(self, message: req.BaseRequest | req.BaseMessage) -> bytes:
+        # Requests are serialized without the pydantic serializer, which is only used for the debug log
+        if isinstance(message, req.BaseRequest):
+            request = json_encoder.encode(message.to_payload()).encode("utf-8")
+        else:
+            if classes.debug:
+                log.debug("Unencrypted message:\n{}\n", message.model_dump_json(indent=2))
+            request = req.EncryptedRequest.build_bytes(self.session, message)
+
+        if classes.debug:
+            log.debug("Sending request:\n{}\n", json.dumps(json.loads(request), indent=2))
+        return request
+
+    @staticmethod
+    def _parse_envelope(raw_response: str | bytes) -> dict:
+        json_data = json.loads(raw_response)
+        if classes.debug:
+            log.debug("Response data:\n{}", json.dumps(json_data, indent=2))
+        return json_data
+
+    def _open_envelope(self, json_data: dict) -> dict:
+        def decrypt(raw_data: dict) -> dict:
+            server_nonce = base64.b64decode(raw_data["nonce"])
+            decrypted = self.session.core.box.decrypt(base64.b64decode(raw_data["message"]), server_nonce)
+            unencrypted_message = json.loads(decrypted)
+
+            return unencrypted_message
+
+        if "error" in json_data:
+            raise ResponseUnsuccesfulException(json_data)
+
+        if "message" in json_data:
+            response = decrypt(json_data)
+            if classes.debug:
+                log.debug("Response unencrypted message:\n{}", json.dumps(response, indent=2))
+        else:
+            response = json_data
 
-    def _request(self, message: req.BaseRequest | req.BaseMessage, response_type: type[_R]) -> _R:
-
-        def get_response() -> dict:
-            def decrypt(raw_data: dict) -> dict:
-                server_nonce = base64.b64decode(raw_data["nonce"])
-                decrypted = self.session.box.decrypt(base64.b64decode(raw_data["message"]), server_nonce)
-                unencrypted_message = json.loads(decrypted)
+        if classes.debug:
+            log.debug("Response:\n{}", json.dumps(response, indent=2))
 
-                return unencrypted_message
+        return response
 
-            json_data = json.loads(
-                self.session.receive()
-            )
+    def _decode_response(self, raw_response: str) -> dict:
+        return self._open_envelope(self._parse_envelope(raw_response))
+
+    @staticmethod
+    def _is_notification(json_data: dict) -> bool:
+        return json_data.get("action") in NOTIFICATION_ACTIONS and "nonce" not in json_data
+
+    def _on_notification(self, json_data: dict) -> None:
+        action = json_data["action"]
+        log.debug("Notification: {}", action)
+        self._db_hash_cache.invalidate()
+        if self.logins_cache is not None:
+            self.logins_cache.invalidate()
+        self.totp_cache.invalidate()
+
+        for callback in list(self._subscribers):
+            try:
+                callback(action)
+            except Exception as e:
+                log.error("Notification callback {!r} failed: {!r}", callback, e)
+
+    def _add_subscriber(self, callback: Callable[[str], None]) -> Callable[[], None]:
+        self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            with contextlib.suppress(ValueError):
+                self._subscribers.remove(callback)
+        return unsubscribe
+
+    def _on_reconnected(self) -> None:
+        # A restarted KeePassXC may have another database open
+        self._db_hash_cache.invalidate()
+        log.debug("Reconnected to KeePassXC")
+
+    def _is_stale_db_hash_error(self, error: Exception) -> bool:
+        """Whether the error may come from using a cached hash after the active database has changed"""
+        if isinstance(error, KeyError):
+            return True
+        return isinstance(error, ResponseUnsuccesfulException) \
+            and error.error_code == ASSOCIATION_FAILED_ERROR_CODE
+
+    @staticmethod
+    def _validate_response(data: dict, response_type: type[_R]) -> _R:
+        try:
+            return response_type.model_validate(data)
+        except ValidationError as e:
+            data_ = json.dumps(data, indent=2)
+            raise ResponseUnsuccesfulException(f"{data_}\n{e!s}") from Exception
 
-            log.debug(f"Response data:\n{json.dumps(json_data, indent=2)}")
+    @staticmethod
+    def _normalize_url(url: str) -> str:
+        # noinspection HttpUrlsUsage
+        if url.startswith("https://") is False \
+                and url.startswith("http://") is False:
+            url = f"https://{url}"
+        return url
 
-            if "error" in json_data:
-                raise ResponseUnsuccesfulException(json_data)
+    def _add_associate(self, db_hash: str, associate_id: str, id_public_key: PublicKey) -> None:
+        self.session.associates.add(
+            db_hash=db_hash, associate=Associate(db_hash=db_hash, id=associate_id, key=id_public_key))
 
-            if "message" in json_data:
-                response = decrypt(json_data)
-                log.debug(f"Response unencrypted message:\n{json.dumps(response, indent=2)}")
-            else:
-                response = json_data
+    def _test_associate_message(self, db_hash: str) -> req.TestAssociateMessage:
+        associate = self.session.associates.get_by_hash(db_hash)
 
-            return response
+        log.debug("DB hash: {}", db_hash)
+        log.debug("Associate: {}", associate)
 
-        def encrypt_message(unencrypted_message: req.BaseMessage) -> req.EncryptedRequest:
-            log.debug(f"Unencrypted message:\n{unencrypted_message.model_dump_json(indent=2)}\n")
-            return req.EncryptedRequest(session=self.session, unencrypted_message=unencrypted_message)
+        return req.TestAssociateMessage(
+            session=self.session,
+            id=associate.id,
+            key=associate.key_utf8,
+        )
 
-        def send(request: req.BaseRequest) -> dict:
-            log.debug(f"Sending request:\n{request.model_dump_json(indent=2)}\n")
+    def _get_logins_message(self, url: str, db_hash: str,
+                            keys: list[dict[str, str]] | None = None) -> req.GetLoginsMessage:
+        message = req.GetLoginsMessage(
+            session=self.session,
+            url=url,
+            associates=self.session.associates,
+            db_hash=db_hash,
+        )
+        if keys is not None:
+            message.use_keys(keys)
+        return message
+
+    def _get_totp_message(self, uuid: str) -> req.GetTotpMessage:
+        return req.GetTotpMessage(session=self.session, uuid=uuid)
+
+    def _get_logins_messages_by_database(self, url: str) -> dict[str, req.GetLoginsMessage]:
+        """One get-logins message per associate, each with only its own key"""
+        return {
+            associate.db_hash: self._get_logins_message(url, associate.db_hash,
+                                                        keys=[{"id": associate.id, "key": associate.key_utf8}])
+            for associate in self.session.associates.list
+        }
+
+    @staticmethod
+    def _merge_logins(results: dict[str, resp.GetLoginsResponse | ResponseUnsuccesfulException],
+                      active_hash: str | None) -> resp.AllDatabasesLogins:
+        merged = resp.AllDatabasesLogins()
+        seen: set[str] = set()
+        for db_hash, result in sorted(results.items(), key=lambda item: item[0] != active_hash):
+            if isinstance(result, ResponseUnsuccesfulException):
+                if result.error_code != NO_LOGINS_FOUND_ERROR_CODE:
+                    merged.errors[db_hash] = result
+                continue
+            for login in result.entries:
+                if login.uuid not in seen:
+                    seen.add(login.uuid)
+                    merged.entries.append(resp.DatabaseLogin.model_construct(**dict(login), db_hash=db_hash))
+        return merged
 
-            request = request.to_bytes()
-            self.session.sendall(request)
-            self.session.increase_nonce()
+    def dump_associate_json(self) -> str:
+        """Dumps associates to JSON string"""
+        return self.session.associates.model_dump_json()
 
-            response = get_response()
+    def dump_associates(self) -> Associates:
+        """Domps associates to Associates object"""
+        return self.session.associates.model_copy(deep=True)
 
-            log.debug(f"Response:\n{json.dumps(response, indent=2)}")
 
-            return response
+class Connection(BaseConnection):
+    def __init__(self, socket_path: str | None = None, db_hash_ttl: float | None = None,
+                 logins_cache: LoginsCache | None = None, reconnect: ReconnectPolicy | None = None,
+                 session_cache: SessionCache | None = None, metrics: MetricsSink | None = None,
+                 totp_cache: TotpCache | None = None, response_timeout: float | None = None) -> None:
+        """
+        :param socket_path: KeePassXC socket (named pipe on Windows), found automatically by default
+        :param db_hash_ttl: seconds the active database hash is cached for. By default it is kept until KeePassXC
+            reports that a database was locked or unlocked, or a request fails because of it.
+        :param logins_cache: cache for get_logins responses, emptied when a database is locked or unlocked.
+            Once a response is cached, a background thread reads the notifications, except on Windows where they
+            are read with the next response.
+        :param reconnect: reopen the connection when the socket breaks and retry the failed request.
+            The keys and associates are kept, only the public keys are exchanged again.
+        :param session_cache: reuse the keys and the associates verified by an earlier process, see SessionCache
+        :param metrics: receives the phase timings, sizes, retries and error of every request,
+            e.g. a HistogramCollector
+        :param totp_cache: cache for get_totp codes, a TotpCache for 30 second codes by default. A cache passed
+            here is emptied by the background thread like `logins_cache`. The default one is emptied when a
+            notification is read with a later response, its codes expire with their time step anyway.
+        :param response_timeout: seconds to wait for a response before the requests waiting for one fail with
+            TimeoutError. Responses are then read by a background thread. Unlimited by default, since associate()
+            waits for the user to confirm the association in KeePassXC. Not supported on Windows.
+        """
+        if response_timeout is not None and not _READER_THREAD_SUPPORTED:
+            raise ValueError("response_timeout is not supported on Windows")
+
+        self.session_cache = session_cache
+        self.metrics = metrics
+        saved = self._load_saved_session()
+        self.session = ConnectionSession(
+            **self._new_session_params(saved),
+            socket=_new_socket(),
+            socket_path=socket_path,
+        )
+        self._inflight = InflightRequests()
+        self._db_hash_cache = DatabaseHashCache(ttl=db_hash_ttl)
+        self.logins_cache = logins_cache
+        self.totp_cache = totp_cache if totp_cache is not None else TotpCache()
+        self._watch_totp_cache = totp_cache is not None
+        self.reconnect_policy = reconnect
+        self._restore_session(saved)
+        self._generation = 0  # incremented on every reconnect
+        self._reconnect_lock = threading.Lock()
+        self._subscribers = []
+        # Set once subscribe() is called or a response is cached, the socket is then only read by that thread
+        self._reader_thread: threading.Thread | None = None
+        self._reader_error: BaseException | None = None
+        self._condition = threading.Condition()  # guards _inflight while the reader thread runs
+        self.response_timeout = response_timeout
+        if response_timeout is not None:
+            self._start_reader()
 
-        if isinstance(message, req.BaseRequest):
-            data = send(message)
-        else:
-            encrypted_message = encrypt_message(message)
-            data = send(encrypted_message)
+        response = self.change_public_keys()
+        self._set_server_public_key(response)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the connection and stops the background thread reading it.
+
+        The thread is started by subscribe(), response_timeout or the first response put in a cache passed to the
+        constructor, and keeps the connection open until close() is called or the `with` block is left:
+
+        with Connection(logins_cache=LoginsCache()) as con:
+            ...
+        """
+        self._reader_thread = None
+        self.session.close()
+
+    def subscribe(self, callback: Callable[[str], None]) -> Callable[[], None]:
+        """Calls `callback` with the action of every notification, "database-locked" or "database-unlocked".
+
+        Starts a background thread that keeps reading the connection, so notifications are handled as soon as
+        they arrive instead of with the next response. The callback runs on that thread and must not make
+        requests on this connection. Returns a function that removes the callback.
+
+        On Windows no thread is started, the callback runs when a request reads the notification with its response.
+        """
+        unsubscribe = self._add_subscriber(callback)
+        if self._reader_thread is None and _READER_THREAD_SUPPORTED:
+            self._start_reader()
+        return unsubscribe
+
+    def _watch_notifications(self) -> None:
+        """Starts the reader before a response is cached, so that the caches are emptied as soon as a database is
+        locked or unlocked, also while they answer every call and nothing else reads the connection. Not on Windows,
+        see _READER_THREAD_SUPPORTED.
+        """
+        if self._reader_thread is None and _READER_THREAD_SUPPORTED:
+            self._start_reader()
+
+    def _start_reader(self) -> None:
+        with self._condition:
+            self._reader_error = None
+            self._reader_thread = threading.Thread(target=self._read_loop, name="keepassxc-protocol-reader",
+                                                   daemon=True)
+            self._reader_thread.start()
+
+    def _read_loop(self) -> None:
+        thread = threading.current_thread()
+        # A reader replaced by a reconnect or stopped by close() exits without touching the connection
+        while self._reader_thread is thread:
+            try:
+                envelope, size = self._next_envelope()
+                if self._reader_thread is not thread:
+                    return
+                if self._is_notification(envelope):
+                    self._on_notification(envelope)
+                    continue
+                with self._condition:
+                    self._handle_envelope(envelope, size)
+                    self._condition.notify_all()
+            except Exception as e:
+                # Whatever stops the reader fails the waiting requests, they would wait for it forever
+                with self._condition:
+                    if self._reader_thread is thread:
+                        log.debug("Reader stopped: {!r}", e)
+                        self._reader_error = e
+                        self._inflight.fail_all(e)
+                        self._condition.notify_all()
+                return
+
+    def _check_reader(self) -> None:
+        if self._reader_error is not None:
+            raise ConnectionError("Connection to KeePassXC lost") from self._reader_error
+
+    def _send(self, message: req.BaseRequest | req.BaseMessage, pending: PendingResponse) -> None:
+        metrics = pending.metrics = self._start_metrics(pending.action, pending.retries)
+        request = self._encode_request(message)
+        if metrics is not None:
+            metrics.mark(PHASE_ENCODE)
+            metrics.bytes_sent = len(request)
+        core = self.session.core
+        core.increase_nonce()
+        pending.nonce = core.nonce_utf8
+
+        # Registered before sending, the reader thread may receive the response before sendall() returns
+        with self._condition:
+            self._check_reader()
+            self._inflight.add(pending)
+        self.session.sendall(request)
+        if metrics is not None:
+            metrics.mark(PHASE_SEND)
+
+    def _next_envelope(self) -> tuple[dict, int]:
+        """Next message and its size in bytes"""
+        raw_response = self.session.receive_bytes()
+        if not raw_response:
+            raise ConnectionError("Connection closed by KeePassXC")
+        return self._parse_envelope(raw_response), len(raw_response)
+
+    def _dispatch(self) -> None:
+        """Receives one message and resolves the request it answers"""
+        try:
+            envelope, size = self._next_envelope()
+        except (OSError, ValueError) as e:
+            self._inflight.fail_all(e)
+            raise
+        self._handle_envelope(envelope, size)
+
+    def _handle_envelope(self, envelope: dict, size: int) -> None:
+        if self._is_notification(envelope):
+            self._on_notification(envelope)
+            return
+
+        pending = self._inflight.pop(envelope)
+        if pending is None:
+            return
+
+        metrics = pending.metrics
+        if metrics is not None:
+            metrics.mark(PHASE_WAIT)
+            metrics.bytes_received = size
+        try:
+            data = self._open_envelope(envelope)
+            if metrics is not None:
+                metrics.mark(PHASE_DECRYPT)
+            response = self._validate_response(data, pending.response_type)
+            if metrics is not None:
+                metrics.mark(PHASE_VALIDATE)
+            pending.set_result(response)
+        except Exception as e:
+            # Also a message that cannot be decrypted or decoded, it fails only the request it answers
+            pending.set_exception(e)
+
+    def _wait(self, done: Callable[[], bool]) -> None:
+        """Handles received messages until `done()`, or waits for the reader thread to handle them"""
+        if self._reader_thread is None:
+            while not done():
+                self._dispatch()
+            return
+
+        deadline = None if self.response_timeout is None else time.monotonic() + self.response_timeout
+        with self._condition:
+            while not done():
+                self._check_reader()
+                if deadline is None:
+                    self._condition.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # Responses that arrive later are dropped, also error replies that carry no nonce
+                    error = TimeoutError(f"No response from KeePassXC in {self.response_timeout} seconds")
+                    self._inflight.abandon_all(error)
+                    raise error
+                self._condition.wait(remaining)
+
+    def _request_once(self, message: req.BaseRequest | req.BaseMessage, response_type: type[_R],
+                      retries: int = 0) -> _R:
+        pending = PendingResponse(message.action, response_type)
+        pending.retries = retries
+        self._send(message, pending)
+        self._wait(pending.done)
+        return pending.result()
 
+    def _request(self, message: req.BaseRequest | req.BaseMessage, response_type: type[_R]) -> _R:
+        generation = self._generation
         try:
-            return response_type.model_validate(data)
-        except ValidationError as e:
-            data_ = json.dumps(data, indent=2)
-            raise ResponseUnsuccesfulException(f"{data_}\n{e!s}") from Exception
+            return self._request_once(message, response_type)
+        except TimeoutError:
+            raise  # KeePassXC is still connected, sending the request again would not help
+        except OSError:
+            if self.reconnect_policy is None:
+                raise
+            log.debug("Connection to KeePassXC lost, reconnecting")
+
+        self._reconnect(generation)
+        return self._request_once(message, response_type, retries=1)
+
+    def _reconnect(self, generation: int) -> None:
+        """Reopens the connection unless another caller already did since `generation`"""
+        with self._reconnect_lock:
+            if self._generation != generation:
+                return
+
+            self._inflight.fail_all(ConnectionError("Connection to KeePassXC lost"))
+            policy = self.reconnect_policy or ReconnectPolicy(attempts=1)
+            error: OSError | None = None
+            for delay in policy.delays():
+                time.sleep(delay)
+                try:
+                    self.session.reconnect(_new_socket())
+                    if self._reader_thread is not None:
+                        self._start_reader()
+                    self._set_server_public_key(
+                        self._request_once(req.ChangePublicKeysRequest(session=self.session),
+                                           resp.ChangePublicKeysResponse))
+                    break
+                except OSError as e:
+                    log.debug("Reconnecting failed: {!r}", e)
+                    error = e
+            else:
+                raise ConnectionError(f"Could not reconnect to KeePassXC in {policy.attempts} attempts") from error
+
+            self._generation += 1
+            self._on_reconnected()
+
+    def reconnect(self) -> None:
+        """Reopens the connection, keeping the keys and associates"""
+        self._reconnect(self._generation)
+
+    def _request_pipelined(self, requests: list[tuple[req.BaseRequest | req.BaseMessage, PendingResponse]],
+                           max_in_flight: int) -> None:
+        """Writes requests back-to-back without waiting for each response.
+
+        At most `max_in_flight` requests are unanswered at any time, so neither side blocks on a full socket buffer.
+        """
+        queue = deque(requests)
+        reconnected = False
+
+        def can_send_or_done() -> bool:
+            return not self._inflight or (bool(queue) and len(self._inflight) < max_in_flight)
+
+        while queue or self._inflight:
+            generation = self._generation
+            try:
+                while queue and len(self._inflight) < max_in_flight:
+                    self._send(*queue.popleft())
+                self._wait(can_send_or_done)
+                self._check_reader()  # requests failed by the reader thread are sent again
+            except TimeoutError:
+                raise
+            except OSError:
+                if self.reconnect_policy is None or reconnected:
+                    raise
+                reconnected = True
+                self._reconnect(generation)
+                # Send everything again that has not been answered
+                for _, pending in requests:
+                    if pending.done() and isinstance(pending.exception(), OSError):
+                        pending.reset()
+                queue = deque((message, pending) for message, pending in requests if not pending.done())
+
+    def pipeline(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT) -> Pipeline:
+        """Collects requests and sends them pipelined when the context exits or `execute()` is called.
+
+        with con.pipeline() as pipe:
+            pending = [pipe.get_logins(url) for url in urls]
+        responses = [p.result() for p in pending]
+        """
+        return Pipeline(self, max_in_flight=max_in_flight)
 
     def change_public_keys(self) -> resp.ChangePublicKeysResponse:
         message = req.ChangePublicKeysRequest(session=self.session)
@@ -109,7 +590,30 @@ class Connection:
 
     def get_databasehash(self) -> resp.GetDatabasehashResponse:
         message = req.GetDatabasehashMessage(session=self.session)
-        return self._request(message, resp.GetDatabasehashResponse)
+        response = self._request(message, resp.GetDatabasehashResponse)
+        self._db_hash_cache.set(response.hash)
+        return response
+
+    def _current_db_hash(self) -> str:
+        db_hash = self._db_hash_cache.get()
+        if db_hash is None:
+            db_hash = self.get_databasehash().hash
+        return db_hash
+
+    def _with_db_hash(self, request: Callable[[str], _T]) -> _T:
+        """Runs the request with the cached hash, and once more with a fresh one if the cached hash was stale"""
+        db_hash = self._db_hash_cache.get()
+        if db_hash is not None:
+            try:
+                return request(db_hash)
+            except (ResponseUnsuccesfulException, KeyError) as e:
+                if not self._is_stale_db_hash_error(e):
+                    raise
+                log.debug("Request failed with cached DB hash {}, retrying with a fresh one", db_hash)
+                self._db_hash_cache.invalidate()
+                self._forget_verification()
+
+        return request(self._current_db_hash())
 
     def associate(self) -> resp.AssociateResponse:
         id_public_key = PrivateKey.generate().public_key
@@ -117,68 +621,166 @@ class Connection:
         message = req.AssociateMessage(session=self.session, id_public_key=id_public_key)
         response = self._request(message, resp.AssociateResponse)
 
-        db_hash = self.get_databasehash().hash
-
-        self.session.associates.add(
-            db_hash=db_hash, associate=Associate(db_hash=db_hash, id=response.id, key=id_public_key))
+        self._db_hash_cache.set(response.hash)
+        self._add_associate(response.hash, response.id, id_public_key)
 
         self.test_associate()
         return response
 
     def load_associates_json(self, associates_json: str) -> None:
         """Loads associates from JSON string"""
-        self.session.associates = Associates.model_validate_json(associates_json)
-        self.test_associate()
+        self._load_associates(Associates.model_validate_json(associates_json))
 
     def load_associates(self, associates: Associates) -> None:
         """Loads associates from Associates object"""
-        self.session.associates = associates.model_copy(deep=True)
-        self.test_associate()
-
-    def dump_associate_json(self) -> str:
-        """Dumps associates to JSON string"""
-        return self.session.associates.model_dump_json()
+        self._load_associates(associates.model_copy(deep=True))
 
-    def dump_associates(self) -> Associates:
-        """Domps associates to Associates object"""
-        return self.session.associates.model_copy(deep=True)
+    def _load_associates(self, associates: Associates) -> None:
+        verified = self._is_verified(associates)
+        self.session.associates = associates
+        if not verified:
+            self.test_associate()
 
     def test_associate(self, trigger_unlock: bool = False) -> resp.TestAssociateResponse:
-        db_hash = self.get_databasehash().hash
-        associate = self.session.associates.get_by_hash(db_hash)
-
-        log.debug(f"DB hash: {db_hash}")
-        log.debug(f"Associate: {associate}")
+        def request(db_hash: str) -> resp.TestAssociateResponse:
+            message = self._test_associate_message(db_hash)
+            return self._request(message, resp.TestAssociateResponse)
 
-        message = req.TestAssociateMessage(
-            session=self.session,
-            id=associate.id,
-            key=associate.key_utf8,
-        )
-        return self._request(message, resp.TestAssociateResponse)
-
-
-    def get_logins(self, url: str) -> resp.GetLoginsResponse:
-        # noinspection HttpUrlsUsage
-        if url.startswith("https://") is False \
-                and url.startswith("http://") is False:
-            url = f"https://{url}"
-
-        db_hash = self.get_databasehash().hash
+        response = self._with_db_hash(request)
+        self._db_hash_cache.set(response.hash)
+        self._on_verified(response.hash)
+        return response
 
-        message = req.GetLoginsMessage(
-            session=self.session,
-            url=url,
-            associates=self.session.associates,
-            db_hash=db_hash,
-        )
+    def get_logins(self, url: str, lazy: bool = False) -> resp.GetLoginsResponse:
+        """Gets the logins matching the URL.
+
+        :param lazy: validate the entries into Login objects only when they are accessed, which is much cheaper
+            when only a few of many matching entries are used. See LazyGetLoginsResponse.
+        """
+        url = self._normalize_url(url)
+        response_type = resp.LazyGetLoginsResponse if lazy else resp.GetLoginsResponse
+
+        if self.logins_cache is not None:
+            response = self.logins_cache.get(url, self._current_db_hash())
+            if response is not None:
+                return response
+
+        def request(db_hash: str) -> resp.GetLoginsResponse:
+            message = self._get_logins_message(url, db_hash)
+            return self._request(message, response_type)
+
+        response = self._with_db_hash(request)
+        self._db_hash_cache.set(response.hash)
+        if self.logins_cache is not None:
+            self._watch_notifications()
+            self.logins_cache.set(url, response.hash, response)
+        return response
 
-        return self._request(message, resp.GetLoginsResponse)
+    def get_logins_many(self, urls: Iterable[str], max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                        lazy: bool = False) -> dict[str, resp.GetLoginsResponse | ResponseUnsuccesfulException]:
+        """Gets logins for many URLs with pipelined requests.
+
+        Every URL is requested once, however often and in whichever form (with or without scheme) it is given.
+        Returns a dict keyed by the given URLs. A URL whose request failed maps to the exception instead of
+        failing the whole batch.
+        """
+        normalized = {url: self._normalize_url(url) for url in urls}
+        results: dict[str, resp.GetLoginsResponse | ResponseUnsuccesfulException] = {}
+
+        db_hash = self._current_db_hash()
+        pending: dict[str, PendingResponse[resp.GetLoginsResponse]] = {}
+        with self.pipeline(max_in_flight=max_in_flight) as pipe:
+            for url in dict.fromkeys(normalized.values()):
+                cached = self.logins_cache.get(url, db_hash) if self.logins_cache is not None else None
+                if cached is not None:
+                    results[url] = cached
+                else:
+                    pending[url] = pipe.get_logins(url, lazy=lazy)
+
+        for url, pending_response in pending.items():
+            exception = pending_response.exception()
+            if exception is not None:
+                results[url] = exception
+                continue
+
+            response = pending_response.result()
+            results[url] = response
+            self._db_hash_cache.set(response.hash)
+            if self.logins_cache is not None:
+                self._watch_notifications()
+                self.logins_cache.set(url, response.hash, response)
+
+        return {url: results[normalized_url] for url, normalized_url in normalized.items()}
+
+    def get_logins_all_databases(self, url: str, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT) -> resp.AllDatabasesLogins:
+        """Gets the logins matching the URL from every associated database, with one pipelined request per associate.
+
+        Entries found in several databases are returned once, from the active database if they are in it.
+        Databases without matching entries are left out, other failures are in `errors`. KeePassXC only searches
+        databases that are open, and other than the active one only with "Search in all opened databases" enabled.
+        """
+        url = self._normalize_url(url)
+        active_hash = self._db_hash_cache.get()
+        with self.pipeline(max_in_flight=max_in_flight) as pipe:
+            # The active database is only needed for the order of the entries, it is asked in the same batch
+            pending_hash = pipe.get_databasehash() if active_hash is None else None
+            pending = {db_hash: pipe.add(message, resp.GetLoginsResponse)
+                       for db_hash, message in self._get_logins_messages_by_database(url).items()}
+
+        if pending_hash is not None and pending_hash.exception() is None:
+            active_hash = pending_hash.result().hash
+            self._db_hash_cache.set(active_hash)
+        return self._merge_logins({db_hash: p.exception() or p.result() for db_hash, p in pending.items()},
+                                  active_hash)
 
     def get_database_groups(self) -> resp.GetDatabaseGroupsResponse:
         message = req.GetDatabaseGroupsMessage(session=self.session)
         return self._request(message, resp.GetDatabaseGroupsResponse)
 
-    # def get_totp(self, uuid: str) -> resp.GetTotpResponse:
-    #     message = req.GetTotpRequset(session=self.session, uuid=uuid)
-    #     return self._request(message, resp.GetTotpResponse)
+    def refresh_database_groups(self, tree: GroupTree) -> GroupsDiff:
+        """Gets the groups into `tree` and returns what changed since its last refresh.
+
+        Only the changed subtrees are validated again, the current groups are in `tree.response`.
+        """
+        message = req.GetDatabaseGroupsMessage(session=self.session)
+        return tree.update(self._request(message, resp.RawGetDatabaseGroupsResponse))
+
+    def get_totp(self, uuid: str) -> resp.GetTotpResponse:
+        """Gets the current TOTP code of the entry, cached until the end of its time step, see TotpCache"""
+        response = self.totp_cache.get(uuid)
+        if response is None:
+            requested_at = time.time()
+            response = self._request(self._get_totp_message(uuid), resp.GetTotpResponse)
+            if self._watch_totp_cache:
+                self._watch_notifications()
+            self.totp_cache.set(uuid, response, requested_at)
+        return response
+
+    def get_totp_many(self, uuids: Iterable[str], max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                      ) -> dict[str, resp.GetTotpResponse | ResponseUnsuccesfulException]:
+        """Gets the current TOTP codes of many entries with pipelined requests, each uuid once.
+
+        Codes still valid are taken from the cache. A uuid whose request failed maps to the exception instead of
+        failing the whole batch.
+        """
+        results: dict[str, resp.GetTotpResponse | ResponseUnsuccesfulException] = {}
+        pending: dict[str, PendingResponse[resp.GetTotpResponse]] = {}
+        requested_at = time.time()
+        with self.pipeline(max_in_flight=max_in_flight) as pipe:
+            for uuid in dict.fromkeys(uuids):
+                cached = self.totp_cache.get(uuid)
+                if cached is not None:
+                    results[uuid] = cached
+                else:
+                    pending[uuid] = pipe.get_totp(uuid)
+
+        for uuid, pending_response in pending.items():
+            exception = pending_response.exception()
+            if exception is not None:
+                results[uuid] = exception
+                continue
+            results[uuid] = response = pending_response.result()
+            if self._watch_totp_cache:
+                self._watch_notifications()
+            self.totp_cache.set(uuid, response, requested_at)
+        return results
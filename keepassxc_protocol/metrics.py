@@ -0,0 +1,185 @@
+import bisect
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Any
+
+# Phases of a request, in seconds
+PHASE_ENCODE = "encode"  # serialization and encryption
+PHASE_SEND = "send"
+PHASE_WAIT = "wait"  # from the request being sent until its response has been read and parsed
+PHASE_DECRYPT = "decrypt"
+PHASE_VALIDATE = "validate"  # model_validate of the response
+PHASE_TOTAL = "total"
+
+
+class RequestMetrics:
+    """Timings and sizes of one request, given to a MetricsSink when the request is done"""
+    __slots__ = (
+        "_mark",
+        "_sink",
+        "_started",
+        "action",
+        "bytes_received",
+        "bytes_sent",
+        "error",
+        "phases",
+        "retries",
+    )
+
+    def __init__(self, action: str, sink: "MetricsSink", retries: int = 0) -> None:
+        self.action = action
+        self.phases: dict[str, float] = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = retries  # times the request was sent again after the connection broke
+        self.error: str | None = None  # exception type name if the request failed
+        self._sink = sink
+        self._started = self._mark = time.perf_counter()
+
+    def mark(self, phase: str) -> None:
+        """Ends `phase`, which started when the previous one ended"""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._mark
+        self._mark = now
+
+    def finish(self, exception: BaseException | None = None) -> None:
+        self.phases[PHASE_TOTAL] = time.perf_counter() - self._started
+        if exception is not None:
+            self.error = type(exception).__name__
+        self._sink.record(self)
+
+    def __repr__(self) -> str:
+        phases = ", ".join(f"{phase}={seconds * 1000:.3f}ms" for phase, seconds in self.phases.items())
+        return (f"RequestMetrics({self.action!r}, {phases}, sent={self.bytes_sent}, received={self.bytes_received}, "
+                f"retries={self.retries}, error={self.error!r})")
+
+
+class MetricsSink(ABC):
+    """Receives the metrics of every request. Subclass it to export them, e.g. to a metrics library.
+
+    record() is called on the thread or task that completed the request and should return quickly.
+    """
+
+    @abstractmethod
+    def record(self, metrics: RequestMetrics) -> None:
+        pass
+
+
+class Histogram:
+    """Durations in logarithmic buckets, percentiles are accurate to about 10%"""
+    __slots__ = ("_buckets", "count", "max", "min", "sum")
+
+    # Upper bounds from 1 microsecond to about 100 seconds
+    BOUNDS: tuple[float, ...] = tuple(1e-6 * 2 ** (i / 8) for i in range(8 * 27 + 1))
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self._buckets = [0] * (len(self.BOUNDS) + 1)
+
+    def add(self, value: float) -> None:
+        self._buckets[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile (0 to 1), clamped to the observed range"""
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, count in enumerate(self._buckets):
+            seen += count
+            if seen >= rank:
+                bound = self.BOUNDS[index] if index < len(self.BOUNDS) else self.max
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+class ActionStats:
+    """Everything a HistogramCollector knows about one action"""
+    __slots__ = ("bytes_received", "bytes_sent", "count", "errors", "phases", "retries")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.errors: Counter[str] = Counter()
+        self.phases: dict[str, Histogram] = {}
+
+
+class HistogramCollector(MetricsSink):
+    """In-memory histograms of the phase timings by action, with error, retry and byte counters.
+
+    collector = HistogramCollector()
+    con = Connection(metrics=collector)
+    ...
+    collector.percentile("get-logins", "total", 0.99)
+    """
+
+    def __init__(self) -> None:
+        self.actions: dict[str, ActionStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, metrics: RequestMetrics) -> None:
+        with self._lock:
+            stats = self.actions.get(metrics.action)
+            if stats is None:
+                stats = self.actions[metrics.action] = ActionStats()
+            stats.count += 1
+            stats.retries += metrics.retries
+            stats.bytes_sent += metrics.bytes_sent
+            stats.bytes_received += metrics.bytes_received
+            if metrics.error is not None:
+                stats.errors[metrics.error] += 1
+            for phase, seconds in metrics.phases.items():
+                histogram = stats.phases.get(phase)
+                if histogram is None:
+                    histogram = stats.phases[phase] = Histogram()
+                histogram.add(seconds)
+
+    def percentile(self, action: str, phase: str, q: float) -> float:
+        with self._lock:
+            stats = self.actions.get(action)
+            histogram = stats.phases.get(phase) if stats is not None else None
+            return histogram.percentile(q) if histogram is not None else 0.0
+
+    def summary(self) -> dict[str, dict[str, Any]]:
+        """Counters and p50/p90/p99/max/mean of every phase in seconds, by action. Serializable to JSON."""
+        with self._lock:
+            return {
+                action: {
+                    "count": stats.count,
+                    "retries": stats.retries,
+                    "errors": dict(stats.errors),
+                    "bytes_sent": stats.bytes_sent,
+                    "bytes_received": stats.bytes_received,
+                    "phases": {
+                        phase: {
+                            "p50": histogram.percentile(0.5),
+                            "p90": histogram.percentile(0.9),
+                            "p99": histogram.percentile(0.99),
+                            "max": histogram.max,
+                            "mean": histogram.mean,
+                        }
+                        for phase, histogram in stats.phases.items()
+                    },
+                }
+                for action, stats in self.actions.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.actions = {}
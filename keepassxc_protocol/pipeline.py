@@ -0,0 +1,183 @@
+from types import TracebackType
+from typing import TYPE_CHECKING, Self
+
+from . import classes_requests as req
+from . import classes_responses as resp
+from .classes import log
+from .metrics import RequestMetrics
+
+if TYPE_CHECKING:
+    from .kpx_protocol import Connection
+
+
+# Requests written before the response to the first one is read. KeePassXC may parse everything it reads at once
+# as one message, so writing requests back-to-back is opt-in.
+DEFAULT_MAX_IN_FLIGHT = 1
+
+
+class PendingResponse[R: resp.BaseResponse]:
+    """Placeholder for the response of a request that has been sent but not answered yet"""
+
+    def __init__(self, action: str, response_type: type[R], nonce: str | None = None) -> None:
+        self.action = action
+        self.response_type = response_type
+        self.nonce = nonce  # nonce the server answers with: the request nonce incremented by one, set on sending
+        self._result: R | None = None
+        self._exception: BaseException | None = None
+        self._done = False
+        self.retries = 0  # times the request has been sent again after the connection broke
+        self.metrics: RequestMetrics | None = None  # of the current attempt, set on sending if metrics are enabled
+
+    def done(self) -> bool:
+        return self._done
+
+    def set_result(self, result: R) -> None:
+        self._result = result
+        self._done = True
+        if self.metrics is not None:
+            self.metrics.finish()
+
+    def set_exception(self, exception: BaseException) -> None:
+        self._exception = exception
+        self._done = True
+        if self.metrics is not None:
+            self.metrics.finish(exception)
+
+    def reset(self) -> None:
+        """Marks the request as unanswered again, before it is sent once more"""
+        self._result = None
+        self._exception = None
+        self._done = False
+        self.nonce = None
+        self.retries += 1
+        self.metrics = None
+
+    def exception(self) -> BaseException | None:
+        if not self._done:
+            raise RuntimeError(f"Response to {self.action!r} has not been received yet")
+        return self._exception
+
+    def result(self) -> R:
+        if self.exception() is not None:
+            raise self._exception
+        return self._result
+
+
+class InflightRequests:
+    """Requests waiting for a response, keyed by the nonce of the expected response.
+
+    Requests given up on after a timeout stay known until their response arrives, so that it is dropped instead of
+    being taken for the response to a later request.
+    """
+
+    def __init__(self) -> None:
+        self._pending: dict[str, PendingResponse] = {}
+        self._abandoned: dict[str, str] = {}  # nonce -> action of the requests given up on, in sending order
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, pending: PendingResponse) -> None:
+        self._pending[pending.nonce] = pending
+
+    def pop(self, envelope: dict) -> PendingResponse | None:
+        """Finds the request the received envelope answers, None for an abandoned or unknown request"""
+        nonce = envelope.get("nonce")
+        action = envelope.get("action")
+        if nonce is not None and nonce in self._pending:
+            # The server answers in order, the abandoned requests sent earlier will not be answered anymore
+            self._abandoned.clear()
+            return self._pending.pop(nonce)
+        if self._pop_abandoned(nonce, action):
+            log.debug("Dropping the response to an abandoned {} request", action)
+            return None
+
+        # Error replies do not carry a nonce. The server answers in order, so it belongs
+        # to the oldest request with the same action.
+        for key, pending in self._pending.items():
+            if pending.action == action:
+                del self._pending[key]
+                self._abandoned.clear()
+                return pending
+        log.debug("Unexpected message: {}", envelope)
+        return None
+
+    def _pop_abandoned(self, nonce: str | None, action: str | None) -> bool:
+        """Removes the abandoned request answered by the envelope and those sent before it"""
+        keys = list(self._abandoned)
+        for i, key in enumerate(keys):
+            if key == nonce or (nonce is None and self._abandoned[key] == action):
+                for answered in keys[:i + 1]:
+                    del self._abandoned[answered]
+                return True
+        return False
+
+    def abandon_all(self, exception: BaseException) -> None:
+        """Fails every request, their responses are dropped when they arrive"""
+        for nonce, pending in self._pending.items():
+            pending.set_exception(exception)
+            self._abandoned[nonce] = pending.action
+        self._pending.clear()
+
+    def fail_all(self, exception: BaseException) -> None:
+        """Fails every request of a connection that is lost, no responses will arrive"""
+        for pending in self._pending.values():
+            pending.set_exception(exception)
+        self._pending.clear()
+        self._abandoned.clear()
+
+
+class Pipeline:
+    """Requests queued for sending back-to-back, see Connection.pipeline()"""
+
+    def __init__(self, connection: "Connection", max_in_flight: int = DEFAULT_MAX_IN_FLIGHT) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self._connection = connection
+        self._max_in_flight = max_in_flight
+        self._queue: list[tuple[req.BaseRequest | req.BaseMessage, PendingResponse]] = []
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc_val: BaseException | None,
+                 exc_tb: TracebackType | None) -> None:
+        if exc_type is None:
+            self.execute()
+
+    def add[R: resp.BaseResponse](self, message: req.BaseRequest | req.BaseMessage,
+                                   response_type: type[R]) -> PendingResponse[R]:
+        pending = PendingResponse(message.action, response_type)
+        self._queue.append((message, pending))
+        return pending
+
+    def execute(self) -> list[PendingResponse]:
+        """Sends all queued requests and waits for every response. Failed requests hold their exception."""
+        queue, self._queue = self._queue, []
+        # noinspection PyProtectedMember
+        self._connection._request_pipelined(queue, self._max_in_flight)
+        return [pending for _, pending in queue]
+
+    def get_databasehash(self) -> PendingResponse[resp.GetDatabasehashResponse]:
+        message = req.GetDatabasehashMessage(session=self._connection.session)
+        return self.add(message, resp.GetDatabasehashResponse)
+
+    def get_logins(self, url: str, lazy: bool = False) -> PendingResponse[resp.GetLoginsResponse]:
+        # noinspection PyProtectedMember
+        url = self._connection._normalize_url(url)
+        # noinspection PyProtectedMember
+        db_hash = self._connection._current_db_hash()
+        # noinspection PyProtectedMember
+        message = self._connection._get_logins_message(url, db_hash)
+        return self.add(message, resp.LazyGetLoginsResponse if lazy else resp.GetLoginsResponse)
+
+    def get_totp(self, uuid: str) -> PendingResponse[resp.GetTotpResponse]:
+        # noinspection PyProtectedMember
+        return self.add(self._connection._get_totp_message(uuid), resp.GetTotpResponse)
+
+    def get_database_groups(self) -> PendingResponse[resp.GetDatabaseGroupsResponse]:
+        message = req.GetDatabaseGroupsMessage(session=self._connection.session)
+        return self.add(message, resp.GetDatabaseGroupsResponse)
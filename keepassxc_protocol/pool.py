@@ -0,0 +1,244 @@
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import Self
+
+from . import classes_responses as resp
+from .cache import LoginsCache, TotpCache
+from .classes import log
+from .connection_session import Associates
+from .errors import ResponseUnsuccesfulException
+from .kpx_protocol import Connection
+from .metrics import MetricsSink
+from .pipeline import DEFAULT_MAX_IN_FLIGHT
+from .reconnect import ReconnectPolicy
+from .single_flight import SingleFlight
+
+
+class ConnectionPool:
+    """Thread-safe pool of Connections sharing one set of associates.
+
+    A Connection has one socket and one nonce, so it can only be used by one thread at a time. The pool hands out
+    up to `size` connections, each with its own session, and opens them when they are first needed.
+
+    with ConnectionPool(size=8) as pool:
+        pool.load_associates_json(associates_json)
+        with pool.connection() as con:
+            response = con.get_logins("https://example.test")
+    """
+
+    def __init__(self, size: int = 4, socket_path: str | None = None, db_hash_ttl: float | None = None,
+                 logins_cache: LoginsCache | None = None, reconnect: ReconnectPolicy | None = None,
+                 health_check_interval: float = 30.0, timeout: float | None = None,
+                 metrics: MetricsSink | None = None, totp_cache: TotpCache | None = None,
+                 response_timeout: float | None = None) -> None:
+        """
+        :param size: maximum number of open connections
+        :param socket_path: see Connection
+        :param db_hash_ttl: see Connection
+        :param logins_cache: cache shared by all connections, see Connection
+        :param reconnect: see Connection
+        :param health_check_interval: a connection that has been idle for this many seconds is checked with
+            test_associate before it is handed out, and replaced if its socket is broken
+        :param timeout: seconds to wait for a free connection, forever by default
+        :param metrics: sink shared by all connections, see Connection
+        :param totp_cache: cache shared by all connections, see Connection
+        :param response_timeout: see Connection. A connection whose request timed out is discarded.
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.size = size
+        self.socket_path = socket_path
+        self.db_hash_ttl = db_hash_ttl
+        self.logins_cache = logins_cache
+        self.reconnect = reconnect
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self.metrics = metrics
+        self.totp_cache = totp_cache if totp_cache is not None else TotpCache()
+        self.response_timeout = response_timeout
+
+        self._associates = Associates()
+        self._idle: deque[tuple[Connection, float]] = deque()  # connection, when it was returned
+        self._open = 0  # idle and checked out connections
+        self._condition = threading.Condition()
+        self._closed = False
+        self._single_flight = SingleFlight()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the idle connections, checked out connections are closed when they are returned"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, deque()
+            self._open -= len(idle)
+            self._condition.notify_all()
+        for con, _ in idle:
+            con.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        """Checks out a connection for the calling thread. It is discarded instead of returned to the pool if
+        the socket fails while it is used.
+        """
+        con = self._acquire()
+        broken = False
+        try:
+            yield con
+        except (OSError, ValueError):
+            broken = True
+            raise
+        finally:
+            # noinspection PyProtectedMember
+            self._release(con, broken or len(con._inflight) > 0)
+
+    def _new_connection(self) -> Connection:
+        con = Connection(socket_path=self.socket_path, db_hash_ttl=self.db_hash_ttl, logins_cache=self.logins_cache,
+                         reconnect=self.reconnect, metrics=self.metrics, totp_cache=self.totp_cache,
+                         response_timeout=self.response_timeout)
+        con.session.associates = self._associates
+        return con
+
+    @staticmethod
+    def _is_healthy(con: Connection) -> bool:
+        try:
+            if con.session.associates.entries:
+                con.test_associate()
+            else:
+                con.get_databasehash()
+        except ResponseUnsuccesfulException:
+            # KeePassXC answered, e.g. that the database is locked
+            return True
+        except (OSError, ValueError) as e:
+            log.debug("Connection failed the health check: {!r}", e)
+            return False
+        return True
+
+    def _acquire(self) -> Connection:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    con, returned_at = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    con, returned_at = None, None
+                    break
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No free connection within {self.timeout} seconds")
+                self._condition.wait(remaining)
+
+        # Connecting and health checks happen outside of the lock
+        try:
+            if con is None:
+                return self._new_connection()
+
+            con.session.associates = self._associates
+            if time.monotonic() - returned_at >= self.health_check_interval and not self._is_healthy(con):
+                log.debug("Replacing broken connection")
+                con.close()
+                return self._new_connection()
+            return con
+        except BaseException:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, con: Connection, broken: bool) -> None:
+        with self._condition:
+            keep = not broken and not self._closed
+            if keep:
+                self._idle.append((con, time.monotonic()))
+            else:
+                self._open -= 1
+            self._condition.notify()
+        if not keep:
+            con.close()
+
+    def associate(self) -> resp.AssociateResponse:
+        """Associates with the active database, the new associate is used by every connection"""
+        with self.connection() as con:
+            return con.associate()
+
+    def load_associates_json(self, associates_json: str) -> None:
+        """Loads associates from JSON string"""
+        self._load_associates(Associates.model_validate_json(associates_json))
+
+    def load_associates(self, associates: Associates) -> None:
+        """Loads associates from Associates object"""
+        self._load_associates(associates.model_copy(deep=True))
+
+    def _load_associates(self, associates: Associates) -> None:
+        self._associates = associates
+        with self.connection() as con:
+            con.test_associate()
+
+    def dump_associate_json(self) -> str:
+        """Dumps associates to JSON string"""
+        return self._associates.model_dump_json()
+
+    def dump_associates(self) -> Associates:
+        """Dumps associates to Associates object"""
+        return self._associates.model_copy(deep=True)
+
+    def test_associate(self, trigger_unlock: bool = False) -> resp.TestAssociateResponse:
+        with self.connection() as con:
+            return con.test_associate(trigger_unlock=trigger_unlock)
+
+    @property
+    def coalesced(self) -> int:
+        """get_logins() and get_totp() calls answered with the response of an identical call in flight"""
+        return self._single_flight.coalesced
+
+    def get_logins(self, url: str, lazy: bool = False) -> resp.GetLoginsResponse:
+        """See Connection.get_logins().
+
+        Threads asking for the same URL at the same time share one request on one connection and get the same
+        response, which must not be modified. It is for the database active when the request is made.
+        """
+        def request() -> resp.GetLoginsResponse:
+            with self.connection() as con:
+                return con.get_logins(url, lazy=lazy)
+
+        return self._single_flight.do(("get-logins", Connection._normalize_url(url), lazy), request)
+
+    def get_logins_many(self, urls: Iterable[str], max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                        lazy: bool = False) -> dict[str, resp.GetLoginsResponse | ResponseUnsuccesfulException]:
+        """See Connection.get_logins_many()"""
+        with self.connection() as con:
+            return con.get_logins_many(urls, max_in_flight=max_in_flight, lazy=lazy)
+
+    def get_totp(self, uuid: str) -> resp.GetTotpResponse:
+        """See Connection.get_totp(). Threads asking for the same entry at the same time share one request."""
+        response = self.totp_cache.get(uuid)
+        if response is not None:
+            return response
+
+        def request() -> resp.GetTotpResponse:
+            with self.connection() as con:
+                return con.get_totp(uuid)
+
+        return self._single_flight.do(("get-totp", uuid), request)
+
+    def get_totp_many(self, uuids: Iterable[str], max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                      ) -> dict[str, resp.GetTotpResponse | ResponseUnsuccesfulException]:
+        """See Connection.get_totp_many()"""
+        with self.connection() as con:
+            return con.get_totp_many(uuids, max_in_flight=max_in_flight)
+
+    def get_database_groups(self) -> resp.GetDatabaseGroupsResponse:
+        with self.connection() as con:
+            return con.get_database_groups()
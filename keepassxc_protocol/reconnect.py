@@ -0,0 +1,27 @@
+import random
+from collections.abc import Iterator
+
+
+class ReconnectPolicy:
+    """How often and how fast a connection is reopened after its socket broke, e.g. because KeePassXC restarted.
+
+    The first attempt is made immediately. Before each further attempt the delay doubles, up to `max_delay`.
+    With jitter a random delay between zero and that value is used instead, so that many clients that lost their
+    connection at the same time do not all reconnect at the same moment.
+    """
+
+    def __init__(self, attempts: int = 6, initial_delay: float = 0.05, max_delay: float = 2.0,
+                 jitter: bool = True) -> None:
+        if attempts < 1:
+            raise ValueError("attempts must be at least 1")
+        self.attempts = attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delays(self) -> Iterator[float]:
+        """Seconds to wait before each attempt"""
+        yield 0.0
+        for attempt in range(self.attempts - 1):
+            delay = min(self.max_delay, self.initial_delay * 2 ** attempt)
+            yield random.uniform(0, delay) if self.jitter else delay
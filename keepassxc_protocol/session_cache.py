@@ -0,0 +1,147 @@
+import os
+import platform
+import tempfile
+import time
+from abc import ABC, abstractmethod
+
+from nacl.public import PrivateKey
+from pydantic import BaseModel, ConfigDict, ValidationError, field_serializer, field_validator
+from pydantic_core.core_schema import FieldSerializationInfo
+
+from .classes import log
+from .connection_session import Associates, ConnectionSession
+
+
+def get_session_cache_path() -> str:
+    if platform.system() == "Windows":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "keepassxc-protocol", "session.json")
+
+
+class SavedSession(BaseModel):
+    model_config = ConfigDict(
+        defer_build=True,
+        arbitrary_types_allowed=True,
+    )
+
+    private_key: PrivateKey
+    client_id: str
+    associates: Associates
+    db_hash: str | None = None  # database the associates were last verified for
+    verified_at: float | None = None  # unix time of that verification
+
+    @field_serializer('private_key')
+    def serialize_private_key(self, value: PrivateKey, _info: FieldSerializationInfo) -> str:
+        return value.encode().hex()
+
+    # noinspection PyNestedDecorators
+    @field_validator('private_key', mode="before")
+    @classmethod
+    def parse_private_key(cls, value: str) -> PrivateKey:
+        if isinstance(value, str):
+            value = PrivateKey(bytes.fromhex(value))
+        return value
+
+
+class SessionStore(ABC):
+    """Where a saved session is kept. Subclass it to keep it elsewhere than in a file, e.g. in a keyring."""
+
+    @abstractmethod
+    def load(self) -> str | None:
+        """The saved session, None if there is none"""
+
+    @abstractmethod
+    def save(self, data: str) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+
+class FileSessionStore(SessionStore):
+    """Session saved in a file only readable by the current user"""
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path or get_session_cache_path()
+
+    def load(self) -> str | None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, data: str) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # Written to a new file and renamed, so the file is never readable by others or half-written
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".session-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def clear(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class SessionCache:
+    """Keeps the client keys, client id and associates between processes.
+
+    A Connection with a session cache reuses the saved keys, and skips test-associate and get-databasehash when
+    the same associates were verified less than `verified_ttl` seconds ago. If the saved verification turns out
+    to be wrong, the request fails like it would have without the cache, the verification is dropped and the next
+    Connection does the full handshake again.
+
+    The saved associates grant access to the database, keep the store as private as the associates themselves.
+    """
+
+    def __init__(self, store: SessionStore | str | None = None, verified_ttl: float = 3600.0) -> None:
+        """
+        :param store: a SessionStore or the path of the session file, see get_session_cache_path() for the default
+        :param verified_ttl: seconds a successful test-associate is trusted for
+        """
+        self.store = store if isinstance(store, SessionStore) else FileSessionStore(store)
+        self.verified_ttl = verified_ttl
+
+    def load(self) -> SavedSession | None:
+        try:
+            data = self.store.load()
+            return None if data is None else SavedSession.model_validate_json(data)
+        except (OSError, ValidationError, ValueError) as e:
+            log.debug("Ignoring unreadable saved session: {!r}", e)
+            return None
+
+    def save(self, session: ConnectionSession, db_hash: str | None = None) -> None:
+        """Saves the session, with the associates verified for `db_hash` just now if it is given"""
+        saved = SavedSession(
+            private_key=session.private_key,
+            client_id=session.client_id,
+            associates=session.associates,
+            db_hash=db_hash,
+            verified_at=None if db_hash is None else time.time(),
+        )
+        try:
+            self.store.save(saved.model_dump_json())
+        except OSError as e:
+            log.debug("Could not save the session: {!r}", e)
+
+    def verified_db_hash(self, saved: SavedSession) -> str | None:
+        """Database hash the saved associates were verified for, if that is recent enough to be trusted"""
+        if saved.db_hash is None or saved.verified_at is None:
+            return None
+        if not 0 <= time.time() - saved.verified_at < self.verified_ttl:
+            return None
+        return saved.db_hash
+
+    def clear(self) -> None:
+        self.store.clear()
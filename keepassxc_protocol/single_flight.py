@@ -0,0 +1,50 @@
+import threading
+from collections.abc import Callable, Hashable
+
+
+class _Flight[T]:
+    __slots__ = ("done", "exception", "result")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: T | None = None
+        self.exception: BaseException | None = None
+
+
+class SingleFlight:
+    """Runs identical concurrent calls once, for threads.
+
+    The first caller with a key runs the call, callers with the same key that arrive while it runs wait for it
+    and get the same result or exception. Results are shared and must not be modified.
+    """
+
+    def __init__(self) -> None:
+        self.coalesced = 0  # calls answered with the result of an identical call in flight
+        self._flights: dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do[T](self, key: Hashable, call: Callable[[], T]) -> T:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                flight.result = call()
+            except BaseException as e:
+                flight.exception = e
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+        else:
+            flight.done.wait()
+
+        if flight.exception is not None:
+            raise flight.exception
+        return flight.result
+
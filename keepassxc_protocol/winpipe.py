@@ -1,11 +1,19 @@
 import platform
 
 if platform.system() == "Windows":
+    import pywintypes
     import win32file
 
 
 class WinNamedPipe:
-    """ Unix socket API compatible class for accessing Windows named pipes """
+    """ Unix socket API compatible class for accessing Windows named pipes.
+
+    Failures are raised as ConnectionError, an OSError like the ones of a socket, so that reconnecting and
+    the connection pool handle them the same way on every platform.
+
+    The pipe is opened for synchronous I/O, so a recv() blocks every sendall() until it returns. Connection does not
+    read it from a background thread.
+    """
 
     def __init__(self,
                  desired_access: int,
@@ -33,18 +41,22 @@ class WinNamedPipe:
                 self.flags_and_attributes,
                 self.input_nullok
             )
-        except Exception as e:
-            raise Exception(  # noqa: B904
-                f"Error: Connection could not be established to pipe {address}", e
-            )
+        except pywintypes.error as e:
+            raise ConnectionError(f"Connection could not be established to pipe {address}: {e}") from e
 
     def close(self) -> None:
         if self.handle:
             self.handle.close()
 
     def sendall(self, message: str | bytes) -> None:
-        win32file.WriteFile(self.handle, message)
+        try:
+            win32file.WriteFile(self.handle, message)
+        except pywintypes.error as e:
+            raise ConnectionError(f"Writing to the pipe failed: {e}") from e
 
-    def recv(self, buff_size: int) -> str:
-        _, data = win32file.ReadFile(self.handle, buff_size)
+    def recv(self, buff_size: int) -> bytes:
+        try:
+            _, data = win32file.ReadFile(self.handle, buff_size)
+        except pywintypes.error as e:
+            raise ConnectionError(f"Reading from the pipe failed: {e}") from e
         return data
\ No newline at end of file
@@ -0,0 +1,76 @@
+import base64
+import json
+import os
+from collections.abc import Iterator
+
+import pytest
+
+from keepassxc_protocol.fake_server import FakeKeePassXC
+
+# Set to run the tests against a running KeePassXC with tests/files/testdb.kdbx open instead of FakeKeePassXC
+REAL_KEEPASSXC = bool(os.environ.get("KPX_PROTOCOL_TEST_REAL_KEEPASSXC"))
+
+
+def testdb_server(**kwargs: object) -> FakeKeePassXC:
+    """FakeKeePassXC with the content of tests/files/testdb.kdbx"""
+    with open("./tests/files/associate_data.json", encoding="utf-8") as f:
+        associate = next(iter(json.load(f)["entries"].values()))
+
+    return FakeKeePassXC(
+        db_hash=associate["db_hash"],
+        associates={associate["id"]: base64.b64encode(bytes.fromhex(associate["key"])).decode("utf-8")},
+        logins={
+            "sdfalkcxvz.online": [{
+                "group": "main",
+                "login": "sdafasd",
+                "name": "sadfasdf",
+                "password": "vczxvxczvzxc",
+                "uuid": "4cbbe6a7efeb46458c5501e7203209e5",
+                "stringFields": [],
+                "totp": "",
+            }],
+        },
+        groups=[{
+            "name": "main",
+            "uuid": "8a2b1bb1c9cd4e73a35fbd8d1a8e4e0c",
+            "children": [{
+                "name": "group0",
+                "uuid": "0f3c4cb2d7a14f5a9d0b4f1f3f8e2a11",
+                "children": [{
+                    "name": "group01",
+                    "uuid": "6d1f3c1b0a2e4b8c9e7f5a3d2c1b0a99",
+                    "children": [{
+                        "name": "group010",
+                        "uuid": "e6f5966e767940e8b5cf6ffed315e3b6",
+                        "children": [],
+                    }],
+                }],
+            }],
+        }],
+        **kwargs,
+    )
+
+
+@pytest.fixture(scope="session")
+def socket_path() -> Iterator[str | None]:
+    """Socket the tests connect to, None for the default KeePassXC socket"""
+    if REAL_KEEPASSXC:
+        yield None
+        return
+
+    with testdb_server() as server:
+        yield server.socket_path
+
+
+@pytest.fixture
+def testdb() -> Iterator[FakeKeePassXC]:
+    """Own FakeKeePassXC with the content of tests/files/testdb.kdbx, for tests that change the server"""
+    with testdb_server() as server:
+        yield server
+
+
+@pytest.fixture(scope="session")
+def associate_data() -> str:
+    """Content of tests/files/associate_data.json, the association with tests/files/testdb.kdbx"""
+    with open("./tests/files/associate_data.json", encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import stat
+import threading
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from keepassxc_protocol import AgentClient, Associates
+from keepassxc_protocol.agent import Agent
+from keepassxc_protocol.errors import ResponseUnsuccesfulException
+from keepassxc_protocol.fake_server import FakeKeePassXC
+
+
+@pytest.fixture
+def agent(testdb: FakeKeePassXC, tmp_path: Path, associate_data: str) -> Iterator[Agent]:
+    associates = Associates.model_validate_json(associate_data)
+    agent = Agent(associates, socket_path=str(tmp_path / "agent.sock"), keepassxc_socket_path=testdb.socket_path,
+                  connections=2)
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(agent.start(), loop).result()
+    yield agent
+    asyncio.run_coroutine_threadsafe(agent.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_same_api_as_connection(agent: Agent, testdb: FakeKeePassXC) -> None:
+    with AgentClient(agent.socket_path) as con:
+        assert con.get_databasehash().hash == testdb.db_hash
+        assert con.test_associate().success == "true"
+        assert con.get_logins("sdfalkcxvz.online").entries[0].login == "sdafasd"
+        assert con.get_logins("sdfalkcxvz.online", lazy=True).entries[0].password == "vczxvxczvzxc"
+        assert con.get_database_groups().groups.groups[0].name == "main"
+
+        responses = con.get_logins_many(["sdfalkcxvz.online", "unknown.test"])
+        assert responses["sdfalkcxvz.online"].count == 1
+        assert isinstance(responses["unknown.test"], ResponseUnsuccesfulException)
+        assert responses["unknown.test"].error_code == "15"
+
+        with pytest.raises(ResponseUnsuccesfulException):
+            con.get_logins("unknown.test")
+
+
+def test_identical_requests_are_coalesced(agent: Agent, testdb: FakeKeePassXC) -> None:
+    testdb.latency = 0.05
+
+    def get_logins(_: int) -> int:
+        with AgentClient(agent.socket_path) as con:
+            return con.get_logins("https://sdfalkcxvz.online").count
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        assert list(executor.map(get_logins, range(10))) == [1] * 10
+
+    assert testdb.requests["get-logins"] == 1
+    assert agent.coalesced > 0
+    # One handshake per upstream connection, none per client
+    assert testdb.requests["change-public-keys"] == 2
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Unix permissions")
+def test_socket_permissions(agent: Agent) -> None:
+    assert stat.S_IMODE(os.stat(agent.socket_path).st_mode) == 0o600
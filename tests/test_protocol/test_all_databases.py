@@ -0,0 +1,64 @@
+import asyncio
+import base64
+
+from nacl.public import PrivateKey
+
+from keepassxc_protocol import Associates, AsyncConnection, Connection
+from keepassxc_protocol.connection_session import Associate
+from keepassxc_protocol.fake_server import FakeDatabase, FakeKeePassXC
+
+URL = "sdfalkcxvz.online"
+SHARED_HASH = "b" * 64
+LOCKED_HASH = "c" * 64
+
+
+def add_databases(server: FakeKeePassXC, con: Connection | AsyncConnection) -> None:
+    """Opens a shared database with one entry of its own and one also in testdb, and associates a closed one"""
+    key = PrivateKey.generate().public_key
+    shared = server.logins[URL][0]
+    server.other_databases[SHARED_HASH] = FakeDatabase(
+        associates={"shared": base64.b64encode(key.encode()).decode("utf-8")},
+        logins={URL: [shared, *FakeKeePassXC.make_logins(1, prefix="shared")]},
+    )
+    con.session.associates.add(SHARED_HASH, Associate(db_hash=SHARED_HASH, id="shared", key=key))
+    closed_key = PrivateKey.generate().public_key
+    con.session.associates.add(LOCKED_HASH, Associate(db_hash=LOCKED_HASH, id="closed", key=closed_key))
+
+
+def test_get_logins_all_databases(testdb: FakeKeePassXC, associate_data: str) -> None:
+    con = Connection(socket_path=testdb.socket_path)
+    con.load_associates_json(associate_data)
+    add_databases(testdb, con)
+
+    response = con.get_logins_all_databases(URL)
+    assert [(login.name, login.db_hash) for login in response.entries] == [
+        ("sadfasdf", testdb.db_hash),
+        ("shared0", SHARED_HASH),
+    ]
+    assert list(response.errors) == [LOCKED_HASH]
+    assert response.errors[LOCKED_HASH].error_code == "8"
+    assert testdb.requests["get-logins"] == 3
+
+
+def test_get_logins_all_databases_active_first(testdb: FakeKeePassXC, associate_data: str) -> None:
+    con = Connection(socket_path=testdb.socket_path)
+    add_databases(testdb, con)
+    for associate in Associates.model_validate_json(associate_data).list:
+        con.session.associates.add(associate.db_hash, associate)
+
+    # The active database is not known yet, its hash is asked in the same batch
+    response = con.get_logins_all_databases(URL)
+    assert [login.db_hash for login in response.entries] == [testdb.db_hash, SHARED_HASH]
+    assert testdb.requests["get-databasehash"] == 1
+
+
+def test_async_get_logins_all_databases(testdb: FakeKeePassXC, associate_data: str) -> None:
+    async def main() -> None:
+        async with AsyncConnection(socket_path=testdb.socket_path) as con:
+            await con.load_associates_json(associate_data)
+            add_databases(testdb, con)
+            response = await con.get_logins_all_databases(URL)
+        assert [login.db_hash for login in response.entries] == [testdb.db_hash, SHARED_HASH]
+        assert list(response.errors) == [LOCKED_HASH]
+
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+import keepassxc_protocol
+from keepassxc_protocol.async_protocol import AsyncConnectionSession
+from keepassxc_protocol.fake_server import FakeKeePassXC
+
+
+def test_get_logins(socket_path: str | None, associate_data: str) -> None:
+    async def main() -> None:
+        async with keepassxc_protocol.AsyncConnection(socket_path=socket_path) as con:
+            await con.load_associates_json(associate_data)
+            response = await con.get_logins(url="sdfalkcxvz.online")
+        entry = response.entries[0]
+        assert entry.login == "sdafasd"
+        assert entry.password == "vczxvxczvzxc"
+        assert entry.name == "sadfasdf"
+
+    asyncio.run(main())
+
+
+def test_concurrent_get_logins(socket_path: str | None, associate_data: str) -> None:
+    async def main() -> None:
+        async with keepassxc_protocol.AsyncConnection(socket_path=socket_path) as con:
+            await con.load_associates_json(associate_data)
+            responses = await asyncio.gather(*(con.get_logins(url="sdfalkcxvz.online") for _ in range(20)))
+        assert all(r.entries[0].password == "vczxvxczvzxc" for r in responses)
+
+    asyncio.run(main())
+
+
+def test_get_database_groups(socket_path: str | None) -> None:
+    async def main() -> None:
+        async with keepassxc_protocol.AsyncConnection(socket_path=socket_path) as con:
+            response = await con.get_database_groups()
+        group_main = next((g for g in response.groups.groups if g.name == "main"), None)
+        assert group_main is not None
+
+    asyncio.run(main())
+
+
+def test_identical_get_logins_are_coalesced(testdb: FakeKeePassXC, associate_data: str) -> None:
+    async def main() -> None:
+        async with keepassxc_protocol.AsyncConnection(socket_path=testdb.socket_path) as con:
+            await con.load_associates_json(associate_data)
+            con._db_hash_cache.invalidate()
+            responses = await asyncio.gather(*(con.get_logins(url="sdfalkcxvz.online") for _ in range(10)))
+        assert all(response is responses[0] for response in responses)
+
+    asyncio.run(main())
+    assert testdb.requests["get-logins"] == 1
+    assert testdb.requests["get-databasehash"] == 2  # one on loading the associates, one shared by all calls
+
+
+def test_response_of_cancelled_request_is_dropped(testdb: FakeKeePassXC, associate_data: str) -> None:
+    testdb.logins["a.test"] = FakeKeePassXC.make_logins(1, prefix="A")
+    testdb.logins["b.test"] = FakeKeePassXC.make_logins(1, prefix="B")
+
+    async def main() -> None:
+        async with keepassxc_protocol.AsyncConnection(socket_path=testdb.socket_path) as con:
+            await con.load_associates_json(associate_data)
+            testdb.latency = 0.2
+            with pytest.raises(TimeoutError):
+                await asyncio.wait_for(con.get_logins_all_databases("a.test"), 0.05)
+            assert (await con.get_logins("b.test")).entries[0].password == "B0_password"
+
+            with pytest.raises(TimeoutError):
+                await asyncio.wait_for(con.get_database_groups(), 0.05)
+            assert (await con.get_logins("b.test")).entries[0].password == "B0_password"
+
+            # Error replies carry no nonce
+            with pytest.raises(TimeoutError):
+                await asyncio.wait_for(con.get_logins_all_databases("missing.invalid"), 0.05)
+            assert (await con.get_logins("sdfalkcxvz.online")).count == 1
+            with pytest.raises(TimeoutError):
+                await asyncio.wait_for(con.get_logins("missing.invalid"), 0.05)
+            with pytest.raises(TimeoutError):
+                await asyncio.wait_for(con.get_logins("missing.invalid/other"), 0.05)
+            assert (await con.get_logins("b.test")).entries[0].password == "B0_password"
+
+    asyncio.run(main())
+
+
+def test_request_cancelled_while_sending_uses_its_nonce(testdb: FakeKeePassXC, associate_data: str,
+                                                        monkeypatch: pytest.MonkeyPatch) -> None:
+    sendall = AsyncConnectionSession.sendall
+
+    async def cancelled_in_drain(self: AsyncConnectionSession, data: bytes) -> None:
+        monkeypatch.setattr(AsyncConnectionSession, "sendall", sendall)
+        self._writer.write(data)
+        raise asyncio.CancelledError
+
+    async def main() -> None:
+        async with keepassxc_protocol.AsyncConnection(socket_path=testdb.socket_path) as con:
+            await con.load_associates_json(associate_data)
+            nonce = int.from_bytes(con.session.nonce, "big")
+            monkeypatch.setattr(AsyncConnectionSession, "sendall", cancelled_in_drain)
+            with pytest.raises(asyncio.CancelledError):
+                await con.get_database_groups()
+            assert int.from_bytes(con.session.nonce, "big") == nonce + 1
+            assert (await con.get_logins("sdfalkcxvz.online")).count == 1
+
+    asyncio.run(main())
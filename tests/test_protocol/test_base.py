@@ -1,14 +1,20 @@
+from typing import Any
+
 import pytest
 
 import keepassxc_protocol
+from keepassxc_protocol import classes
+from keepassxc_protocol.classes_requests import BaseMessage
+from keepassxc_protocol.classes_responses import LazyGetLoginsResponse
+from keepassxc_protocol.errors import ResponseUnsuccesfulException
 
 
 @pytest.fixture(scope='module')
-def con() -> keepassxc_protocol.Connection:
+def con(socket_path: str | None) -> keepassxc_protocol.Connection:
     with open("./tests/files/associate_data.json", encoding="utf-8") as f:
         associate_data = f.read()
 
-    con = keepassxc_protocol.Connection()
+    con = keepassxc_protocol.Connection(socket_path=socket_path)
     con.load_associates_json(associate_data)
     return con
 
@@ -44,3 +50,80 @@ def test_get_database_groups(con: keepassxc_protocol.Connection) -> None:
     group010 = next((g for g in group01.children if g.name == "group010"), None)
     assert group010 is not None
     assert group010.uuid == "e6f5966e767940e8b5cf6ffed315e3b6"
+
+
+def test_find_group_by_path(con: keepassxc_protocol.Connection) -> None:
+    response = con.get_database_groups()
+    group010 = response.find_by_path("main/group0/group01/group010")
+    assert group010 is not None
+    assert group010.uuid == "e6f5966e767940e8b5cf6ffed315e3b6"
+    assert response.find_by_uuid(group010.uuid) is group010
+
+
+def test_pipeline(con: keepassxc_protocol.Connection) -> None:
+    with con.pipeline() as pipe:
+        pending_hash = pipe.get_databasehash()
+        pending_logins = [pipe.get_logins(url="sdfalkcxvz.online") for _ in range(10)]
+        pending_missing = pipe.get_logins(url="missing.invalid")
+
+    assert pending_hash.result().hash == "8f1b004cbd837de560b9257b61443f9ae21ee24f4561c87b8f2bb3a6fa7627e0"
+    assert all(p.result().entries[0].password == "vczxvxczvzxc" for p in pending_logins)
+    with pytest.raises(ResponseUnsuccesfulException):
+        pending_missing.result()
+
+
+def test_db_hash_is_cached(con: keepassxc_protocol.Connection, monkeypatch: pytest.MonkeyPatch) -> None:
+    con.get_databasehash()
+
+    def get_databasehash() -> None:
+        raise AssertionError("get-databasehash should not be sent while the hash is cached")
+
+    monkeypatch.setattr(con, "get_databasehash", get_databasehash)
+    assert con.get_logins(url="sdfalkcxvz.online").entries
+    assert con.test_associate().success == "true"
+
+
+def test_logins_cache(con: keepassxc_protocol.Connection, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(con, "logins_cache", keepassxc_protocol.LoginsCache())
+    response = con.get_logins(url="sdfalkcxvz.online")
+    assert con.get_logins(url="https://sdfalkcxvz.online") is response
+    assert (con.logins_cache.hits, con.logins_cache.misses) == (1, 1)
+
+    # noinspection PyProtectedMember
+    con._on_notification({"action": "database-locked"})
+    assert len(con.logins_cache) == 0
+
+
+def test_get_logins_many(con: keepassxc_protocol.Connection) -> None:
+    urls = ["sdfalkcxvz.online", "https://sdfalkcxvz.online", "missing.invalid"]
+    responses = con.get_logins_many(urls)
+
+    assert list(responses) == urls
+    assert responses["sdfalkcxvz.online"] is responses["https://sdfalkcxvz.online"]
+    assert responses["sdfalkcxvz.online"].entries[0].password == "vczxvxczvzxc"
+    assert isinstance(responses["missing.invalid"], ResponseUnsuccesfulException)
+
+
+def test_payload_not_serialized_when_debug_disabled(con: keepassxc_protocol.Connection,
+                                                    monkeypatch: pytest.MonkeyPatch) -> None:
+    model_dump_json = BaseMessage.model_dump_json
+
+    def no_indent(self: BaseMessage, **kwargs: Any) -> str:  # noqa: ANN401
+        assert "indent" not in kwargs, "payload serialized for a disabled log"
+        return model_dump_json(self, **kwargs)
+
+    monkeypatch.setattr(BaseMessage, "model_dump_json", no_indent)
+    try:
+        keepassxc_protocol.set_debug(False)
+        assert con.get_logins(url="sdfalkcxvz.online").entries
+    finally:
+        # noinspection PyProtectedMember
+        keepassxc_protocol.set_debug(classes._debug_from_environment())
+
+
+def test_get_logins_lazy(con: keepassxc_protocol.Connection) -> None:
+    response = con.get_logins(url="sdfalkcxvz.online", lazy=True)
+    assert isinstance(response, LazyGetLoginsResponse)
+    entry = response.entries[0]
+    assert entry.login == "sdafasd"
+    assert entry.password == "vczxvxczvzxc"
@@ -0,0 +1,69 @@
+import time
+
+from keepassxc_protocol.cache import DatabaseHashCache, LoginsCache
+from keepassxc_protocol.classes_responses import GetLoginsResponse
+
+
+def test_db_hash_cache() -> None:
+    cache = DatabaseHashCache()
+    assert cache.get() is None
+    cache.set("hash")
+    assert cache.get() == "hash"
+    cache.invalidate()
+    assert cache.get() is None
+
+
+def test_db_hash_cache_ttl() -> None:
+    cache = DatabaseHashCache(ttl=0.05)
+    cache.set("hash")
+    assert cache.get() == "hash"
+    time.sleep(0.06)
+    assert cache.get() is None
+
+
+def logins_response(uuid: str) -> GetLoginsResponse:
+    return GetLoginsResponse(
+        count=1, nonce="", success="true", hash="hash", version="",
+        entries=[{"login": "login", "name": "name", "password": "password", "uuid": uuid}],
+    )
+
+
+def test_logins_cache_hit_and_miss() -> None:
+    cache = LoginsCache()
+    response = logins_response("1")
+    assert cache.get("https://a.test", "hash") is None
+    cache.set("https://a.test", "hash", response)
+    assert cache.get("https://a.test", "hash") is response
+    assert cache.get("https://a.test", "other hash") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_logins_cache_lru_eviction() -> None:
+    cache = LoginsCache(max_entries=2)
+    cache.set("https://a.test", "hash", logins_response("a"))
+    cache.set("https://b.test", "hash", logins_response("b"))
+    assert cache.get("https://a.test", "hash") is not None
+    cache.set("https://c.test", "hash", logins_response("c"))
+    assert len(cache) == 2
+    assert cache.get("https://b.test", "hash") is None
+    assert cache.get("https://a.test", "hash") is not None
+
+
+def test_logins_cache_ttl() -> None:
+    cache = LoginsCache(ttl=0.05)
+    cache.set("https://a.test", "hash", logins_response("a"))
+    time.sleep(0.06)
+    assert cache.get("https://a.test", "hash") is None
+    assert len(cache) == 0
+
+
+def test_logins_cache_invalidate_and_wipe() -> None:
+    cache = LoginsCache()
+    cache.set("https://a.test", "hash", logins_response("a"))
+    cache.set("https://b.test", "hash", logins_response("b"))
+    cache.invalidate("https://a.test")
+    assert cache.get("https://a.test", "hash") is None
+    assert cache.get("https://b.test", "hash") is not None
+    cache.wipe()
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (0, 0)
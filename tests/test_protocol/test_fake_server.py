@@ -0,0 +1,67 @@
+import json
+import socket
+import time
+
+import pytest
+
+from keepassxc_protocol import Connection
+from keepassxc_protocol.errors import ResponseUnsuccesfulException
+from keepassxc_protocol.fake_server import FakeKeePassXC
+
+
+def test_chunked_writes() -> None:
+    logins = {"example.test": FakeKeePassXC.make_logins(200)}
+    with FakeKeePassXC(logins=logins, chunk_size=1000) as server:
+        con = Connection(socket_path=server.socket_path)
+        con.associate()
+        response = con.get_logins("example.test")
+    assert response.count == len(response.entries) == 200
+    assert response.entries[199].password == "entry199_password"
+
+
+def test_latency_overlaps_pipelined_requests() -> None:
+    logins = {f"host{i}.test": FakeKeePassXC.make_logins(1) for i in range(20)}
+    with FakeKeePassXC(logins=logins, latency=0.05, one_message_per_read=False) as server:
+        con = Connection(socket_path=server.socket_path)
+        con.associate()
+
+        start = time.monotonic()
+        responses = con.get_logins_many([f"host{i}.test" for i in range(20)], max_in_flight=20)
+        elapsed = time.monotonic() - start
+
+    assert all(r.count == 1 for r in responses.values())
+    assert elapsed < 20 * 0.05 / 2
+
+
+def test_requests_in_one_read_are_not_answered() -> None:
+    # Like KeePassXC, which parses everything it has read as one JSON document
+    with FakeKeePassXC() as server, socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(server.socket_path)
+        request = json.dumps({"action": "get-databasehash", "nonce": "", "clientID": ""})
+        sock.sendall(f"{request}{request}".encode())
+        reply = json.loads(sock.recv(65536))
+    assert reply["errorCode"] == "13"
+    assert server.requests["get-databasehash"] == 0
+
+
+def test_lock_notifications() -> None:
+    with FakeKeePassXC(logins={"example.test": FakeKeePassXC.make_logins(1)}) as server:
+        con = Connection(socket_path=server.socket_path)
+        con.associate()
+
+        server.lock()
+        with pytest.raises(ResponseUnsuccesfulException) as error:
+            con.get_logins("example.test")
+        assert error.value.error_code == "1"
+
+        server.unlock()
+        assert con.get_logins("example.test").count == 1
+        # get-databasehash was asked again after the notifications emptied the cache
+        assert server.requests["get-databasehash"] >= 1
+
+
+def test_make_groups() -> None:
+    groups = FakeKeePassXC.make_groups(depth=3, width=2)
+    assert [g["name"] for g in groups] == ["group0", "group1"]
+    assert groups[1]["children"][0]["children"][1]["name"] == "group101"
+    assert groups[1]["children"][0]["children"][1]["children"] == []
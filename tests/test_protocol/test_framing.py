@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from keepassxc_protocol.framing import JSONMessageFramer
+
+MESSAGES = [
+    {"action": "get-logins", "entries": [{"name": "{not a brace}", "password": "quote \" and \\ backslash"}]},
+    {"action": "database-locked"},
+    {"action": "get-database-groups", "groups": {"groups": [{"name": "a", "children": [{"name": "b"}]}]}},
+]
+STREAM = b"".join(json.dumps(m).encode("utf-8") for m in MESSAGES)
+
+
+def drain(framer: JSONMessageFramer) -> list[dict]:
+    messages = []
+    while (message := framer.next_message()) is not None:
+        messages.append(json.loads(message))
+    return messages
+
+
+def test_several_messages_in_one_read() -> None:
+    framer = JSONMessageFramer()
+    framer.feed(STREAM)
+    assert drain(framer) == MESSAGES
+    assert len(framer) == 0
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_messages_split_across_reads(chunk_size: int) -> None:
+    framer = JSONMessageFramer()
+    messages = []
+    for i in range(0, len(STREAM), chunk_size):
+        framer.feed(STREAM[i:i + chunk_size])
+        messages.extend(drain(framer))
+    assert messages == MESSAGES
+
+
+def test_whitespace_between_messages() -> None:
+    framer = JSONMessageFramer()
+    framer.feed(b'\n {"a": 1}\r\n  {"b": "}"}\n')
+    assert drain(framer) == [{"a": 1}, {"b": "}"}]
+
+
+def test_unexpected_data() -> None:
+    framer = JSONMessageFramer()
+    framer.feed(b'garbage{"a": 1}')
+    with pytest.raises(ValueError):
+        framer.next_message()
+
+
+def test_max_message_size() -> None:
+    framer = JSONMessageFramer(max_message_size=16)
+    framer.feed(b'{"a": "' + b"x" * 32)
+    with pytest.raises(ValueError):
+        framer.next_message()
+
+
+def test_long_string_fed_in_chunks() -> None:
+    message = json.dumps({"message": "a" * 100_000 + '\\"{}' + "b" * 100_000, "nonce": "x"}).encode()
+    framer = JSONMessageFramer()
+    for i in range(0, len(message), 7):
+        framer.feed(message[i:i + 7])
+        result = framer.next_message()
+        assert result is None or i + 7 >= len(message)
+    assert result == message
+    assert len(framer) == 0
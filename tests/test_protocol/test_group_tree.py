@@ -0,0 +1,53 @@
+import asyncio
+import copy
+
+from keepassxc_protocol import AsyncConnection, Connection, GroupTree
+from keepassxc_protocol.fake_server import FakeKeePassXC
+
+
+def test_refresh_database_groups(testdb: FakeKeePassXC) -> None:
+    testdb.groups = FakeKeePassXC.make_groups(depth=3, width=2)
+    con = Connection(socket_path=testdb.socket_path)
+    tree = GroupTree()
+
+    diff = con.refresh_database_groups(tree)
+    assert len(diff.added) == 2 + 4 + 8
+    first = tree.response
+
+    # Unchanged
+    assert not con.refresh_database_groups(tree)
+    assert tree.response.groups is first.groups
+
+    groups = copy.deepcopy(testdb.groups)
+    group0, group1 = groups
+    group0["children"][0]["name"] = "renamed"
+    removed = group0["children"][1]["children"].pop()
+    group1["children"][0]["children"].append({"name": "new", "uuid": "f" * 32, "children": []})
+    moved = group1["children"][1]["children"].pop(0)
+    group0["children"][1]["children"].append(moved)
+    testdb.groups = groups
+
+    diff = con.refresh_database_groups(tree)
+    assert [(old.name, new.name) for old, new in diff.renamed] == [("group00", "renamed")]
+    assert [group.uuid for group in diff.removed] == [removed["uuid"]]
+    assert [group.name for group in diff.added] == ["new"]
+    assert [new.uuid for _, new in diff.moved] == [moved["uuid"]]
+
+    response = tree.response
+    assert response.find_by_path("group0/renamed/group000") is not None
+    assert response.find_by_path("group1/group10/new") is not None
+    assert response.find_by_path(f"group0/group01/{moved['name']}") is not None
+    # Unchanged subtrees keep their objects
+    assert response.find_by_path("group0/renamed/group000") is first.find_by_path("group0/group00/group000")
+    assert response.find_by_uuid(moved["uuid"]) is first.find_by_uuid(moved["uuid"])
+
+
+def test_async_refresh_database_groups(testdb: FakeKeePassXC) -> None:
+    async def main() -> None:
+        async with AsyncConnection(socket_path=testdb.socket_path) as con:
+            tree = GroupTree()
+            diff = await con.refresh_database_groups(tree)
+            assert [group.name for group in diff.added] == ["main", "group0", "group01", "group010"]
+            assert not await con.refresh_database_groups(tree)
+
+    asyncio.run(main())
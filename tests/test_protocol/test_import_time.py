@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+# Generous, the self time of the package modules is a few tens of milliseconds on a laptop
+PACKAGE_IMPORT_BUDGET_US = 200_000
+
+
+def import_times(statement: str) -> dict[str, tuple[int, int]]:
+    """Self and cumulative import time in microseconds of every module imported by the statement"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line.removeprefix("import time:").split("|")
+        times[module.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def test_package_import_is_lazy() -> None:
+    modules = import_times("import keepassxc_protocol")
+    assert not {"pydantic", "nacl", "loguru", "asyncio"} & set(modules)
+
+
+def test_connection_import() -> None:
+    modules = import_times("from keepassxc_protocol import Connection")
+    assert "keepassxc_protocol.kpx_protocol" in modules
+    # loguru is only imported once debug logging is enabled, asyncio only by AsyncConnection and the agent
+    assert not {"loguru", "asyncio", "keepassxc_protocol.async_protocol"} & set(modules)
+
+    package_us = sum(self_us for module, (self_us, _) in modules.items() if module.startswith("keepassxc_protocol"))
+    assert package_us < PACKAGE_IMPORT_BUDGET_US
@@ -0,0 +1,37 @@
+import pytest
+
+from keepassxc_protocol import classes
+
+
+@pytest.mark.parametrize(("name", "value", "expected"), [
+    ("KPX_PROTOCOL__DEBUG", "true", True),
+    ("KPX_PROTOCOL__DEBUG", "false", False),
+    ("KPX_PROTOCOL_DEBUG", "1", True),
+    ("KPX_PROTOCOL_DEBUG", "TRUE", True),
+    ("KPX_PROTOCOL_DEBUG", "", False),
+])
+def test_debug_from_environment(monkeypatch: pytest.MonkeyPatch, name: str, value: str, expected: bool) -> None:
+    monkeypatch.delenv("KPX_PROTOCOL__DEBUG", raising=False)
+    monkeypatch.delenv("KPX_PROTOCOL_DEBUG", raising=False)
+    monkeypatch.setenv(name, value)
+    # noinspection PyProtectedMember
+    assert classes._debug_from_environment() is expected
+
+
+
+def test_loguru_imported_for_debug_logging() -> None:
+    from loguru import logger
+
+    messages: list[str] = []
+    sink = logger.add(messages.append, format="{message}")
+    try:
+        classes.set_debug(True)
+        classes.log.debug("enabled {}", 1)
+        classes.log.opt(lazy=True).debug("lazy {}", lambda: 2)
+        classes.set_debug(False)
+        classes.log.debug("disabled")
+        classes.log.opt(lazy=True).debug("disabled")
+    finally:
+        logger.remove(sink)
+        classes.set_debug(classes._debug_from_environment())
+    assert [message.strip() for message in messages] == ["enabled 1", "lazy 2"]
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from keepassxc_protocol import AsyncConnection, Connection, HistogramCollector, MetricsSink, ReconnectPolicy
+from keepassxc_protocol.errors import ResponseUnsuccesfulException
+from keepassxc_protocol.fake_server import FakeKeePassXC
+from keepassxc_protocol.metrics import Histogram
+
+PHASES = {"encode", "send", "wait", "decrypt", "validate", "total"}
+
+
+def test_histogram_percentiles() -> None:
+    histogram = Histogram()
+    for i in range(1, 101):
+        histogram.add(i / 1000)
+    assert histogram.count == 100
+    assert histogram.percentile(0.5) == pytest.approx(0.05, rel=0.1)
+    assert histogram.percentile(0.99) == pytest.approx(0.099, rel=0.1)
+    assert histogram.percentile(1.0) == histogram.max == 0.1
+    assert histogram.mean == pytest.approx(0.0505)
+    assert Histogram().percentile(0.5) == 0.0
+
+
+def test_request_metrics(testdb: FakeKeePassXC, associate_data: str) -> None:
+    collector = HistogramCollector()
+    con = Connection(socket_path=testdb.socket_path, metrics=collector)
+    con.load_associates_json(associate_data)
+    con.get_logins("sdfalkcxvz.online")
+    con.get_logins_many(["sdfalkcxvz.online", "https://sdfalkcxvz.online/login"])
+    with pytest.raises(ResponseUnsuccesfulException):
+        con.get_logins("unknown.test")
+
+    summary = collector.summary()
+    assert set(summary) == {"change-public-keys", "get-databasehash", "test-associate", "get-logins"}
+    logins = summary["get-logins"]
+    assert logins["count"] == 4
+    assert logins["errors"] == {"ResponseUnsuccesfulException": 1}
+    assert logins["bytes_sent"] > 0
+    assert logins["bytes_received"] > 0
+    assert set(logins["phases"]) == PHASES
+    assert 0 < collector.percentile("get-logins", "total", 0.5) <= logins["phases"]["total"]["max"]
+
+
+def test_retries_are_recorded(testdb: FakeKeePassXC, associate_data: str) -> None:
+    collector = HistogramCollector()
+    con = Connection(socket_path=testdb.socket_path, reconnect=ReconnectPolicy(), metrics=collector)
+    con.load_associates_json(associate_data)
+
+    testdb.disconnect_all()
+    con.get_logins("sdfalkcxvz.online")
+    stats = collector.actions["get-logins"]
+    assert stats.count == 2  # the failed attempt and the retry
+    assert stats.retries == 1
+    assert stats.errors == {"ConnectionError": 1}
+
+
+def test_async_request_metrics(testdb: FakeKeePassXC, associate_data: str) -> None:
+    collector = HistogramCollector()
+
+    async def main() -> None:
+        async with AsyncConnection(socket_path=testdb.socket_path, metrics=collector) as con:
+            await con.load_associates_json(associate_data)
+            await asyncio.gather(*(con.get_logins(f"sdfalkcxvz.online/{i}") for i in range(5)))
+
+    asyncio.run(main())
+    stats = collector.actions["get-logins"]
+    assert stats.count == 5
+    assert set(stats.phases) == PHASES
+
+
+def test_metrics_sink_is_abstract() -> None:
+    with pytest.raises(TypeError):
+        MetricsSink()
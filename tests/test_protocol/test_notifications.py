@@ -0,0 +1,198 @@
+import asyncio
+import base64
+import queue
+import time
+from typing import Any
+
+import pytest
+from nacl.exceptions import CryptoError
+
+from keepassxc_protocol import AsyncConnection, Connection, LoginsCache, ReconnectPolicy, kpx_protocol
+from keepassxc_protocol.errors import ResponseUnsuccesfulException
+from keepassxc_protocol.fake_server import FakeKeePassXC
+
+
+def test_subscribe_between_requests(testdb: FakeKeePassXC, associate_data: str) -> None:
+    con = Connection(socket_path=testdb.socket_path)
+    con.load_associates_json(associate_data)
+    received: queue.Queue[str] = queue.Queue()
+    con.subscribe(received.put)
+
+    testdb.lock()
+    testdb.unlock()
+    # Delivered without any request being made
+    assert received.get(timeout=1) == "database-locked"
+    assert received.get(timeout=1) == "database-unlocked"
+
+    # The cached hash was dropped, requests still get their own responses
+    assert con.get_logins("sdfalkcxvz.online").count == 1
+    assert testdb.requests["get-databasehash"] == 2
+    responses = con.get_logins_many(["sdfalkcxvz.online", "https://sdfalkcxvz.online/login"])
+    assert all(response.count == 1 for response in responses.values())
+    con.close()
+
+
+def wait_until_empty(cache: LoginsCache) -> None:
+    deadline = time.monotonic() + 1
+    while len(cache) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_cache_emptied_without_subscribers(testdb: FakeKeePassXC, associate_data: str) -> None:
+    cache = LoginsCache()
+    con = Connection(socket_path=testdb.socket_path, logins_cache=cache)
+    con.load_associates_json(associate_data)
+    con.get_logins("sdfalkcxvz.online")
+
+    testdb.lock()
+    wait_until_empty(cache)
+    with pytest.raises(ResponseUnsuccesfulException):
+        con.get_logins("sdfalkcxvz.online")
+    assert cache.hits == 0
+    con.close()
+
+
+def test_unsubscribe(testdb: FakeKeePassXC) -> None:
+    con = Connection(socket_path=testdb.socket_path)
+    first: queue.Queue[str] = queue.Queue()
+    second: queue.Queue[str] = queue.Queue()
+    unsubscribe = con.subscribe(first.put)
+    con.subscribe(second.put)
+    unsubscribe()
+
+    testdb.lock()
+    assert second.get(timeout=1) == "database-locked"
+    assert first.empty()
+    con.close()
+
+
+def test_subscribed_connection_reconnects(testdb: FakeKeePassXC, associate_data: str) -> None:
+    con = Connection(socket_path=testdb.socket_path, reconnect=ReconnectPolicy())
+    con.load_associates_json(associate_data)
+    received: queue.Queue[str] = queue.Queue()
+    con.subscribe(received.put)
+
+    testdb.disconnect_all()
+    assert con.get_logins("sdfalkcxvz.online").count == 1
+
+    testdb.lock()
+    assert received.get(timeout=1) == "database-locked"
+    con.close()
+
+
+def test_async_notifications(testdb: FakeKeePassXC, associate_data: str) -> None:
+    async def main() -> None:
+        async with AsyncConnection(socket_path=testdb.socket_path) as con:
+            await con.load_associates_json(associate_data)
+            notifications = con.notifications()
+            waiting = asyncio.ensure_future(anext(notifications))
+            await asyncio.sleep(0)  # subscribed once the generator runs
+
+            testdb.lock()
+            assert await asyncio.wait_for(waiting, 1) == "database-locked"
+            testdb.unlock()
+            assert await asyncio.wait_for(anext(notifications), 1) == "database-unlocked"
+
+            response = await con.get_logins("sdfalkcxvz.online")
+            assert response.count == 1
+            await notifications.aclose()
+
+    asyncio.run(main())
+
+
+def test_async_cache_emptied_without_subscribers(testdb: FakeKeePassXC, associate_data: str) -> None:
+    cache = LoginsCache()
+
+    async def main() -> None:
+        async with AsyncConnection(socket_path=testdb.socket_path, logins_cache=cache) as con:
+            await con.load_associates_json(associate_data)
+            await con.get_logins("sdfalkcxvz.online")
+
+            testdb.lock()
+            for _ in range(100):
+                if not len(cache):
+                    break
+                await asyncio.sleep(0.01)
+            with pytest.raises(ResponseUnsuccesfulException):
+                await con.get_logins("sdfalkcxvz.online")
+        assert cache.hits == 0
+
+    asyncio.run(main())
+
+
+def test_async_subscribed_connection_reconnects(testdb: FakeKeePassXC, associate_data: str) -> None:
+    async def main() -> None:
+        async with AsyncConnection(socket_path=testdb.socket_path, reconnect=ReconnectPolicy()) as con:
+            await con.load_associates_json(associate_data)
+            received: list[str] = []
+            con.subscribe(received.append)
+
+            testdb.disconnect_all()
+            await asyncio.sleep(0.05)
+            assert (await con.get_logins("sdfalkcxvz.online")).count == 1
+
+            testdb.lock()
+            await asyncio.sleep(0.05)
+            assert received == ["database-locked"]
+
+    asyncio.run(main())
+
+
+def test_undecryptable_response_fails_the_request(testdb: FakeKeePassXC, monkeypatch: pytest.MonkeyPatch) -> None:
+    con = Connection(socket_path=testdb.socket_path)
+    con.subscribe(lambda action: None)
+    handle = testdb.handle
+
+    def garbled(client: object, request: dict[str, Any]) -> dict[str, Any] | None:
+        reply = handle(client, request)
+        if reply is not None and "message" in reply:
+            reply["message"] = base64.b64encode(b"\0" * 64).decode("utf-8")
+        return reply
+
+    monkeypatch.setattr(testdb, "handle", garbled)
+    with pytest.raises(CryptoError):
+        con.get_database_groups()
+
+    monkeypatch.setattr(testdb, "handle", handle)
+    assert con.get_database_groups().groups.groups[0].name == "main"
+    con.close()
+
+
+def test_async_subscribe_during_request(testdb: FakeKeePassXC, associate_data: str) -> None:
+    async def main() -> None:
+        async with AsyncConnection(socket_path=testdb.socket_path) as con:
+            await con.load_associates_json(associate_data)
+            testdb.latency = 0.05
+            request = asyncio.ensure_future(con.get_logins("sdfalkcxvz.online"))
+            await asyncio.sleep(0.01)  # waiting for the response
+            received: list[str] = []
+            con.subscribe(received.append)
+
+            assert (await request).count == 1
+            assert (await asyncio.wait_for(con.get_logins("sdfalkcxvz.online/other"), 1)).count == 1
+            testdb.lock()
+            await asyncio.sleep(0.05)
+            assert received == ["database-locked"]
+
+    asyncio.run(main())
+
+
+def test_no_reader_thread_without_support(testdb: FakeKeePassXC, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Like on Windows, where a thread reading the pipe would block the requests writing to it
+    monkeypatch.setattr(kpx_protocol, "_READER_THREAD_SUPPORTED", False)
+    with pytest.raises(ValueError):
+        Connection(socket_path=testdb.socket_path, response_timeout=1)
+
+    con = Connection(socket_path=testdb.socket_path)
+    received: list[str] = []
+    con.subscribe(received.append)
+    testdb.lock()
+    testdb.unlock()
+    time.sleep(0.05)
+    assert received == []
+
+    # Read with the next response
+    con.get_database_groups()
+    assert received == ["database-locked", "database-unlocked"]
+    assert con._reader_thread is None
+    con.close()
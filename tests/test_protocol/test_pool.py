@@ -0,0 +1,77 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from keepassxc_protocol import ConnectionPool
+from keepassxc_protocol.fake_server import FakeKeePassXC
+
+
+def test_threads_share_associates(testdb: FakeKeePassXC, associate_data: str) -> None:
+    testdb.latency = 0.01
+    with ConnectionPool(size=8, socket_path=testdb.socket_path) as pool:
+        pool.load_associates_json(associate_data)
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            responses = list(executor.map(lambda i: pool.get_logins(f"sdfalkcxvz.online/{i}"), range(64)))
+        elapsed = time.monotonic() - start
+
+        assert all(r.entries[0].login == "sdafasd" for r in responses)
+        assert testdb.requests["get-logins"] == 64
+        assert testdb.client_count <= 8
+        # 64 calls of 10 ms over 8 connections
+        assert elapsed < 64 * 0.01 / 2
+
+
+def test_identical_calls_are_coalesced(testdb: FakeKeePassXC, associate_data: str) -> None:
+    testdb.latency = 0.1
+    with ConnectionPool(size=8, socket_path=testdb.socket_path) as pool:
+        pool.load_associates_json(associate_data)
+        requests_before = testdb.requests["get-logins"]
+        barrier = threading.Barrier(16)
+
+        def get_logins(url: str) -> object:
+            barrier.wait()
+            return pool.get_logins(url)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            urls = ["sdfalkcxvz.online", "https://sdfalkcxvz.online"] * 8
+            responses = list(executor.map(get_logins, urls))
+
+        assert testdb.requests["get-logins"] - requests_before == 1
+        assert all(response is responses[0] for response in responses)
+        assert pool.coalesced == 15
+
+
+def test_broken_connection_is_replaced(testdb: FakeKeePassXC, associate_data: str) -> None:
+    with ConnectionPool(size=1, socket_path=testdb.socket_path, health_check_interval=0) as pool:
+        pool.load_associates_json(associate_data)
+        with pool.connection() as con:
+            first = con
+
+        testdb.disconnect_all()
+        with pool.connection() as con:
+            assert con is not first
+            assert con.get_logins("sdfalkcxvz.online").count == 1
+
+
+def test_connection_failing_in_use_is_discarded(testdb: FakeKeePassXC, associate_data: str) -> None:
+    with ConnectionPool(size=1, socket_path=testdb.socket_path, health_check_interval=60) as pool:
+        pool.load_associates_json(associate_data)
+        testdb.disconnect_all()
+
+        with pytest.raises(OSError), pool.connection() as con:
+            first = con
+            con.get_database_groups()
+
+        with pool.connection() as con:
+            assert con is not first
+            con.get_database_groups()
+
+
+def test_timeout(testdb: FakeKeePassXC) -> None:
+    with ConnectionPool(size=1, socket_path=testdb.socket_path, timeout=0.05) as pool:
+        with pool.connection(), pytest.raises(TimeoutError), pool.connection():
+            pass
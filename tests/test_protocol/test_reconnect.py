@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from keepassxc_protocol import AsyncConnection, Connection, ReconnectPolicy
+from keepassxc_protocol.fake_server import FakeKeePassXC
+
+
+def test_policy_delays() -> None:
+    policy = ReconnectPolicy(attempts=5, initial_delay=0.1, max_delay=0.3, jitter=False)
+    assert list(policy.delays()) == [0.0, 0.1, 0.2, 0.3, 0.3]
+
+    policy.jitter = True
+    assert all(0 <= delay <= 0.3 for delay in policy.delays())
+
+
+def test_reconnect_keeps_associates(testdb: FakeKeePassXC, associate_data: str) -> None:
+    con = Connection(socket_path=testdb.socket_path, reconnect=ReconnectPolicy())
+    con.load_associates_json(associate_data)
+    public_key = con.session.public_key_utf8
+
+    testdb.disconnect_all()
+    assert con.get_logins("sdfalkcxvz.online").count == 1
+
+    # Only the public keys are exchanged again
+    assert testdb.requests["change-public-keys"] == 2
+    assert testdb.requests["test-associate"] == 1
+    assert con.session.public_key_utf8 == public_key
+
+
+def test_reconnect_waits_for_restart(testdb: FakeKeePassXC, associate_data: str) -> None:
+    con = Connection(socket_path=testdb.socket_path,
+                     reconnect=ReconnectPolicy(attempts=10, initial_delay=0.01, max_delay=0.1))
+    con.load_associates_json(associate_data)
+
+    testdb.stop()
+    threading.Timer(0.1, testdb.start).start()
+    assert con.get_database_groups().groups.groups[0].name == "main"
+
+
+def test_reconnect_gives_up(testdb: FakeKeePassXC) -> None:
+    con = Connection(socket_path=testdb.socket_path, reconnect=ReconnectPolicy(attempts=3, initial_delay=0.01))
+    testdb.stop()
+    with pytest.raises(ConnectionError):
+        con.get_database_groups()
+
+
+def test_pipelined_requests_are_sent_again(testdb: FakeKeePassXC, associate_data: str) -> None:
+    con = Connection(socket_path=testdb.socket_path, reconnect=ReconnectPolicy())
+    con.load_associates_json(associate_data)
+
+    testdb.disconnect_all()
+    responses = con.get_logins_many(["sdfalkcxvz.online", "https://sdfalkcxvz.online/login"])
+    assert all(response.count == 1 for response in responses.values())
+
+
+def test_async_reconnect(testdb: FakeKeePassXC) -> None:
+    async def main() -> None:
+        async with AsyncConnection(socket_path=testdb.socket_path, reconnect=ReconnectPolicy()) as con:
+            await con.get_databasehash()
+            testdb.disconnect_all()
+            responses = await asyncio.gather(*(con.get_databasehash() for _ in range(5)))
+            assert all(response.hash == testdb.db_hash for response in responses)
+
+    asyncio.run(main())
+    assert testdb.requests["change-public-keys"] == 2
+
+
+def test_response_timeout_fails_inflight_requests(testdb: FakeKeePassXC, associate_data: str) -> None:
+    con = Connection(socket_path=testdb.socket_path, reconnect=ReconnectPolicy(), response_timeout=0.1)
+    con.load_associates_json(associate_data)
+
+    testdb.one_message_per_read = False
+    testdb.latency = 0.3
+    with pytest.raises(TimeoutError):
+        con.get_logins_many(["sdfalkcxvz.online", "https://sdfalkcxvz.online/login"], max_in_flight=2)
+    assert len(con._inflight) == 0
+    assert testdb.requests["change-public-keys"] == 1  # not treated as a broken connection
+
+    # The late responses are dropped
+    testdb.latency = 0.0
+    time.sleep(0.4)
+    assert con.get_logins("sdfalkcxvz.online").count == 1
+    con.close()
+
+
+def test_late_error_reply_is_dropped(testdb: FakeKeePassXC, associate_data: str) -> None:
+    con = Connection(socket_path=testdb.socket_path, response_timeout=0.2)
+    con.load_associates_json(associate_data)
+
+    testdb.latency = 0.3
+    with pytest.raises(TimeoutError):
+        con.get_logins("missing.invalid")
+    testdb.latency = 0.0
+    # Answered after the error reply without a nonce, which must not be taken for its response
+    assert con.get_logins("sdfalkcxvz.online").count == 1
+    con.close()
@@ -0,0 +1,142 @@
+import base64
+import json
+
+import nacl.utils
+import pytest
+from nacl.public import Box, PrivateKey
+from pydantic import ValidationError
+
+from keepassxc_protocol import classes_requests as req
+from keepassxc_protocol.async_protocol import AsyncConnectionSession
+from keepassxc_protocol.connection_session import Associate, Associates
+
+SERVER_KEY = PrivateKey.generate()
+
+
+@pytest.fixture
+def session() -> AsyncConnectionSession:
+    private_key = PrivateKey.generate()
+    associates = Associates()
+    for i in range(3):
+        db_hash = f"{i}" * 64
+        associates.add(db_hash, Associate(db_hash=db_hash, id=f"id{i}", key=PrivateKey.generate().public_key))
+    return AsyncConnectionSession(
+        private_key=private_key,
+        nonce=nacl.utils.random(24),
+        client_id=base64.b64encode(nacl.utils.random(24)).decode("utf-8"),
+        box=Box(private_key, SERVER_KEY.public_key),
+        associates=associates,
+    )
+
+
+def messages(session: AsyncConnectionSession) -> list[req.BaseMessage]:
+    return [
+        req.GetDatabasehashMessage(session=session),
+        req.AssociateMessage(session=session, id_public_key=PrivateKey.generate().public_key),
+        req.TestAssociateMessage(session=session, id="id", key="key"),
+        req.GetLoginsMessage(session=session, url="https://example.test", associates=session.associates,
+                             db_hash="1" * 64),
+        req.GetDatabaseGroupsMessage(session=session),
+    ]
+
+
+def test_message_payload_matches_model_dump(session: AsyncConnectionSession) -> None:
+    for message in messages(session):
+        assert message.to_payload() == json.loads(message.to_payload_json()) == json.loads(message.model_dump_json())
+
+
+def test_get_logins_payload_json(session: AsyncConnectionSession) -> None:
+    message = req.GetLoginsMessage(session=session, url='https://example.test/?q="a\\b"',
+                                   associates=session.associates, db_hash="1" * 64)
+    assert json.loads(message.to_payload_json()) == json.loads(message.model_dump_json())
+    message.use_keys([{"id": "id0", "key": "key"}])
+    assert json.loads(message.to_payload_json())["keys"] == [{"id": "id0", "key": "key"}]
+
+
+def test_request_payload_matches_model_dump(session: AsyncConnectionSession) -> None:
+    request = req.ChangePublicKeysRequest(session=session, trigger_unlock=True)
+    assert request.to_payload() == json.loads(request.model_dump_json())
+
+
+def test_encrypted_request_payload_matches_model_dump(session: AsyncConnectionSession) -> None:
+    server_box = Box(SERVER_KEY, session.public_key)
+
+    def decrypt(payload: dict) -> dict:
+        nonce = base64.b64decode(payload.pop("nonce"))
+        return json.loads(server_box.decrypt(base64.b64decode(payload.pop("message")), nonce))
+
+    for message in messages(session):
+        fast = json.loads(req.EncryptedRequest.build_bytes(session, message))
+        model = json.loads(req.EncryptedRequest(session=session, unencrypted_message=message).model_dump_json())
+        assert decrypt(fast) == decrypt(model) == message.to_payload()
+        assert fast == model
+
+
+def test_keys_payload_is_built_once(session: AsyncConnectionSession) -> None:
+    associates = session.associates
+    keys = associates.keys_payload("1" * 64)
+    assert [key["id"] for key in keys] == ["id1", "id0", "id2"]
+    assert associates.keys_payload("1" * 64) is keys
+    assert associates.get_by_hash("1" * 64) is associates.get_by_hash("1" * 64)
+
+    associates.add("3" * 64, Associate(db_hash="3" * 64, id="id3", key=PrivateKey.generate().public_key))
+    assert [key["id"] for key in associates.keys_payload("1" * 64)] == ["id1", "id0", "id2", "id3"]
+    associates.delete_by_hash("0" * 64)
+    assert [key["id"] for key in associates.keys_payload("1" * 64)] == ["id1", "id2", "id3"]
+
+
+def test_keys_payload_follows_entries(session: AsyncConnectionSession) -> None:
+    associates = session.associates
+    associates.keys_payload("1" * 64)
+
+    associates.entries["3" * 64] = Associate(db_hash="3" * 64, id="id3", key=PrivateKey.generate().public_key)
+    assert [key["id"] for key in associates.keys_payload("1" * 64)] == ["id1", "id0", "id2", "id3"]
+    associates.entries["0" * 64] = Associate(db_hash="0" * 64, id="new0", key=PrivateKey.generate().public_key)
+    assert [key["id"] for key in associates.keys_payload("1" * 64)] == ["id1", "new0", "id2", "id3"]
+    associates.entries = {"1" * 64: associates.get_by_hash("1" * 64)}
+    assert [key["id"] for key in associates.keys_payload("1" * 64)] == ["id1"]
+    assert json.loads(associates.keys_payload_json("1" * 64)) == associates.keys_payload("1" * 64)
+
+
+def test_associate_is_frozen(session: AsyncConnectionSession) -> None:
+    associate = session.associates.get_by_hash("0" * 64)
+    with pytest.raises(ValidationError):
+        associate.id = "other"
+    assert Associates.model_validate_json(session.associates.model_dump_json()) == session.associates
+
+
+def test_nonce_counter(session: AsyncConnectionSession) -> None:
+    nonce = session.nonce
+    session.increase_nonce()
+    expected = (int.from_bytes(nonce, "big") + 1).to_bytes(24, "big")
+    assert session.nonce == session.core.nonce == expected
+    assert session.nonce_utf8 == base64.b64encode(expected).decode("utf-8")
+
+    session.nonce = b"\xff" * 24
+    session.increase_nonce()
+    assert session.nonce == b"\x00" * 24
+    with pytest.raises(ValueError):
+        session.nonce = b"short"
+
+
+def test_session_facade(session: AsyncConnectionSession) -> None:
+    session.box = None
+    session.client_id = "client"
+    assert session.core.box is None
+    assert session.core.client_id == "client"
+    with pytest.raises(ValidationError):
+        session.private_key = "not a key"
+
+
+@pytest.mark.parametrize("deep", [False, True])
+def test_session_copy_has_own_core(session: AsyncConnectionSession, deep: bool) -> None:
+    copied = session.model_copy(deep=deep)
+    assert copied.core is not session.core
+    assert copied.nonce == session.nonce
+    assert copied.box is session.box
+    assert copied.client_id == session.client_id
+
+    copied.increase_nonce()
+    copied.client_id = "copy"
+    assert copied.nonce != session.nonce
+    assert session.client_id != "copy"
@@ -0,0 +1,95 @@
+import pytest
+from pydantic import ValidationError
+
+from keepassxc_protocol.classes_responses import (
+    GetDatabaseGroupsResponse,
+    GetLoginsResponse,
+    Groups,
+    LazyGetLoginsResponse,
+    LazyLogins,
+    Login,
+)
+from keepassxc_protocol.fake_server import FakeKeePassXC
+
+RESPONSE = {
+    "count": "3",
+    "nonce": "nonce",
+    "success": "true",
+    "hash": "hash",
+    "version": "2.7.10",
+    "entries": [
+        {"login": f"login{i}", "name": f"name{i}", "password": f"password{i}", "uuid": f"{i}"} for i in range(2)
+    ] + [{"login": "missing name and password"}],
+}
+
+
+def test_lazy_logins_are_validated_on_access() -> None:
+    response = LazyGetLoginsResponse.model_validate(RESPONSE)
+    assert isinstance(response, GetLoginsResponse)
+    assert isinstance(response.entries, LazyLogins)
+    assert response.count == len(response.entries) == 3
+
+    entry = response.entries[1]
+    assert isinstance(entry, Login)
+    assert entry.password == "password1"
+    assert response.entries[1] is entry
+    assert [e.uuid for e in response.entries[:2]] == ["0", "1"]
+
+    with pytest.raises(ValidationError):
+        _ = response.entries[2]
+
+
+def test_lazy_response_envelope_is_validated() -> None:
+    with pytest.raises(ValidationError):
+        LazyGetLoginsResponse.model_validate({**RESPONSE, "success": "false"})
+
+
+def test_lazy_response_dump_matches_eager() -> None:
+    data = {**RESPONSE, "entries": RESPONSE["entries"][:2]}
+    lazy = LazyGetLoginsResponse.model_validate(data)
+    assert lazy.model_dump() == GetLoginsResponse.model_validate(data).model_dump()
+
+
+def test_group_index() -> None:
+    response = GetDatabaseGroupsResponse.model_validate({
+        "nonce": "nonce",
+        "success": "true",
+        "version": "2.7.10",
+        "groups": {"groups": FakeKeePassXC.make_groups(depth=3, width=2)},
+    })
+
+    group = response.find_by_path("group0/group01/group010")
+    assert group is not None
+    assert response.find_by_path("/group0/group01/group010/") is group
+    assert response.find_by_uuid(group.uuid) is group
+    assert response.find_by_path("group0/missing") is None
+
+    index = response.groups.index
+    assert index.path(group) == "group0/group01/group010"
+    assert index.parent(group) is response.find_by_path("group0/group01")
+    assert index.parent(response.find_by_path("group1")) is None
+
+    flat = response.flatten()
+    assert len(flat) == len(index) == 2 + 4 + 8
+    assert [g.name for g in flat[:4]] == ["group0", "group00", "group000", "group001"]
+
+
+def test_deep_group_tree() -> None:
+    # Nested models deeper than about 250 levels exceed pydantic's recursion guard
+    depth = 2000
+    root: dict = {"name": "group0", "uuid": "0", "children": []}
+    parent = root
+    for i in range(1, depth):
+        child = {"name": f"group{i}", "uuid": str(i), "children": []}
+        parent["children"].append(child)
+        parent = child
+
+    groups = Groups.model_validate({"groups": [root]})
+    assert len(groups.index) == depth
+    deepest = groups.index.find_by_uuid(str(depth - 1))
+    assert groups.index.path(deepest).count("/") == depth - 1
+
+
+def test_malformed_nested_group() -> None:
+    with pytest.raises(ValidationError):
+        Groups.model_validate({"groups": [{"name": "a", "uuid": "1", "children": [{"name": "b"}]}]})
@@ -0,0 +1,85 @@
+import os
+import stat
+import time
+from pathlib import Path
+
+import pytest
+
+from keepassxc_protocol import Connection, SessionCache
+from keepassxc_protocol.errors import ResponseUnsuccesfulException
+from keepassxc_protocol.fake_server import FakeKeePassXC
+from keepassxc_protocol.session_cache import SessionStore
+
+
+def test_second_process_skips_verification(testdb: FakeKeePassXC, tmp_path: Path, associate_data: str) -> None:
+    cache = SessionCache(str(tmp_path / "session.json"))
+    first = Connection(socket_path=testdb.socket_path, session_cache=cache)
+    first.load_associates_json(associate_data)
+    assert testdb.requests["test-associate"] == 1
+    assert testdb.requests["get-databasehash"] == 1
+
+    second = Connection(socket_path=testdb.socket_path, session_cache=cache)
+    second.load_associates_json(associate_data)
+    assert second.get_logins("sdfalkcxvz.online").count == 1
+
+    assert testdb.requests["test-associate"] == 1
+    assert testdb.requests["get-databasehash"] == 1
+    assert second.session.client_id == first.session.client_id
+    assert second.session.public_key_utf8 == first.session.public_key_utf8
+
+
+def test_associates_restored_without_loading(testdb: FakeKeePassXC, tmp_path: Path, associate_data: str) -> None:
+    cache = SessionCache(str(tmp_path / "session.json"))
+    Connection(socket_path=testdb.socket_path, session_cache=cache).load_associates_json(associate_data)
+
+    con = Connection(socket_path=testdb.socket_path, session_cache=cache)
+    assert con.get_logins("sdfalkcxvz.online").count == 1
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Unix permissions")
+def test_file_permissions(testdb: FakeKeePassXC, tmp_path: Path) -> None:
+    path = tmp_path / "cache" / "session.json"
+    Connection(socket_path=testdb.socket_path, session_cache=SessionCache(str(path))).associate()
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+    assert stat.S_IMODE(path.parent.stat().st_mode) == 0o700
+
+
+def test_expired_verification(testdb: FakeKeePassXC, tmp_path: Path, associate_data: str) -> None:
+    cache = SessionCache(str(tmp_path / "session.json"), verified_ttl=0.01)
+    Connection(socket_path=testdb.socket_path, session_cache=cache).load_associates_json(associate_data)
+    time.sleep(0.02)
+
+    Connection(socket_path=testdb.socket_path, session_cache=cache).load_associates_json(associate_data)
+    assert testdb.requests["test-associate"] == 2
+
+
+def test_unreadable_file(testdb: FakeKeePassXC, tmp_path: Path, associate_data: str) -> None:
+    path = tmp_path / "session.json"
+    path.write_text("{not json")
+    con = Connection(socket_path=testdb.socket_path, session_cache=SessionCache(str(path)))
+    con.load_associates_json(associate_data)
+    assert testdb.requests["test-associate"] == 1
+
+
+def test_revoked_associate_falls_back(testdb: FakeKeePassXC, tmp_path: Path, associate_data: str) -> None:
+    cache = SessionCache(str(tmp_path / "session.json"))
+    Connection(socket_path=testdb.socket_path, session_cache=cache).load_associates_json(associate_data)
+    testdb.associates.clear()
+
+    con = Connection(socket_path=testdb.socket_path, session_cache=cache)
+    con.load_associates_json(associate_data)
+    with pytest.raises(ResponseUnsuccesfulException):
+        con.get_logins("sdfalkcxvz.online")
+
+    # The next process verifies again
+    with pytest.raises(ResponseUnsuccesfulException):
+        Connection(socket_path=testdb.socket_path, session_cache=cache).load_associates_json(associate_data)
+
+
+def test_session_store_is_abstract() -> None:
+    class IncompleteStore(SessionStore):
+        def load(self) -> str | None:
+            return None
+
+    with pytest.raises(TypeError):
+        IncompleteStore()
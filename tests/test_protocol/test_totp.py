@@ -0,0 +1,141 @@
+import asyncio
+import queue
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from keepassxc_protocol import AsyncConnection, Connection, ConnectionPool, TotpCache
+from keepassxc_protocol import cache as cache_module
+from keepassxc_protocol import classes_responses as resp
+from keepassxc_protocol.fake_server import FakeKeePassXC
+
+
+def add_totp_entries(server: FakeKeePassXC, count: int) -> list[str]:
+    entries = FakeKeePassXC.make_logins(count, prefix="totp")
+    for i, entry in enumerate(entries):
+        entry["totp"] = f"{i:06d}"
+    server.logins["totp.test"] = entries
+    return [entry["uuid"] for entry in entries]
+
+
+def hourly_cache() -> TotpCache:
+    """Keeps the tests that count requests from crossing the end of a step"""
+    return TotpCache(period=3600)
+
+
+def totp_response(code: str) -> resp.GetTotpResponse:
+    return resp.GetTotpResponse(totp=code, version="2.7.10", success="true", nonce="")
+
+
+def test_get_totp_is_cached(testdb: FakeKeePassXC, associate_data: str) -> None:
+    uuids = add_totp_entries(testdb, 2)
+    con = Connection(socket_path=testdb.socket_path, totp_cache=hourly_cache())
+    con.load_associates_json(associate_data)
+
+    assert con.get_totp(uuids[1]).totp == "000001"
+    assert con.get_totp(uuids[1]).totp == "000001"
+    assert testdb.requests["get-totp"] == 1
+
+
+def test_get_totp_many(testdb: FakeKeePassXC, associate_data: str) -> None:
+    uuids = add_totp_entries(testdb, 100)
+    con = Connection(socket_path=testdb.socket_path, totp_cache=hourly_cache())
+    con.load_associates_json(associate_data)
+    con.get_totp(uuids[0])
+
+    testdb.one_message_per_read = False
+    responses = con.get_totp_many([*uuids, uuids[5], "unknown"], max_in_flight=8)
+    assert list(responses) == [*uuids, "unknown"]
+    assert [response.totp for response in responses.values()] == [f"{i:06d}" for i in range(100)] + [""]
+    assert testdb.requests["get-totp"] == 101  # the first code was cached
+
+    # Empty codes are not cached
+    con.get_totp_many([*uuids[:10], "unknown"])
+    assert testdb.requests["get-totp"] == 102
+
+
+def test_get_totp_many_failure(testdb: FakeKeePassXC) -> None:
+    uuids = add_totp_entries(testdb, 2)
+    con = Connection(socket_path=testdb.socket_path)
+    testdb.locked = True
+
+    responses = con.get_totp_many(uuids)
+    assert all(response.error_code == "1" for response in responses.values())
+
+
+def test_totp_cache_is_emptied_on_notification(testdb: FakeKeePassXC) -> None:
+    uuids = add_totp_entries(testdb, 1)
+    con = Connection(socket_path=testdb.socket_path, totp_cache=hourly_cache())
+    received: queue.Queue[str] = queue.Queue()
+    con.subscribe(received.put)
+    con.get_totp(uuids[0])
+
+    testdb.lock()
+    testdb.unlock()
+    assert received.get(timeout=1) == "database-locked"
+    assert received.get(timeout=1) == "database-unlocked"
+    con.get_totp(uuids[0])
+    assert testdb.requests["get-totp"] == 2
+    con.close()
+
+
+def test_only_a_given_totp_cache_starts_the_reader(testdb: FakeKeePassXC) -> None:
+    uuids = add_totp_entries(testdb, 2)
+    con = Connection(socket_path=testdb.socket_path)
+    con.get_totp(uuids[0])
+    con.get_totp_many(uuids)
+    assert con._reader_thread is None
+    con.close()
+
+    with Connection(socket_path=testdb.socket_path, totp_cache=hourly_cache()) as con:
+        con.get_totp(uuids[0])
+        reader = con._reader_thread
+        assert reader is not None
+    reader.join(1)
+    assert not reader.is_alive()
+
+
+def test_totp_cache_expires_with_the_time_step(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 999_990.0  # start of a 30 second step
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(time=lambda: now, monotonic=time.monotonic))
+    cache = TotpCache()
+
+    cache.set("a", totp_response("111111"), requested_at=now + 10)
+    assert cache.get("a").totp == "111111"
+    now += 29.9
+    assert cache.get("a").totp == "111111"
+    now += 0.1
+    assert cache.get("a") is None
+
+    # Requested in the previous step, the code may be from either
+    cache.set("a", totp_response("222222"), requested_at=now - 0.1)
+    assert cache.get("a") is None
+
+    cache.set("a", totp_response("333333"), requested_at=now)
+    now += 30
+    cache.set("b", totp_response("444444"), requested_at=now)
+    assert len(cache) == 1
+
+
+def test_async_get_totp_many(testdb: FakeKeePassXC) -> None:
+    uuids = add_totp_entries(testdb, 20)
+
+    async def main() -> None:
+        async with AsyncConnection(socket_path=testdb.socket_path, totp_cache=hourly_cache()) as con:
+            responses = await con.get_totp_many(uuids + uuids)
+            assert [response.totp for response in responses.values()] == [f"{i:06d}" for i in range(20)]
+            await asyncio.gather(*(con.get_totp(uuids[0]) for _ in range(5)))
+
+    asyncio.run(main())
+    assert testdb.requests["get-totp"] == 20
+
+
+def test_pool_shares_totp_cache(testdb: FakeKeePassXC) -> None:
+    uuids = add_totp_entries(testdb, 4)
+    with ConnectionPool(size=2, socket_path=testdb.socket_path, totp_cache=hourly_cache()) as pool:
+        assert pool.get_totp_many(uuids)[uuids[3]].totp == "000003"
+        with pool.connection() as con:
+            assert con.get_totp(uuids[2]).totp == "000002"
+        assert pool.get_totp(uuids[1]).totp == "000001"
+    assert testdb.requests["get-totp"] == 4
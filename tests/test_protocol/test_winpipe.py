@@ -0,0 +1,26 @@
+from types import SimpleNamespace
+
+import pytest
+
+from keepassxc_protocol import winpipe
+
+
+class PipeError(Exception):
+    """Stands in for pywintypes.error"""
+
+
+def fail(*args: object) -> None:
+    raise PipeError(109, "ReadFile", "The pipe has been ended.")
+
+
+def test_pipe_errors_are_os_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(winpipe, "pywintypes", SimpleNamespace(error=PipeError), raising=False)
+    monkeypatch.setattr(winpipe, "win32file", SimpleNamespace(CreateFile=fail, ReadFile=fail, WriteFile=fail),
+                        raising=False)
+    pipe = winpipe.WinNamedPipe(0, 0)
+
+    for call in (lambda: pipe.connect("org.keepassxc.KeePassXC.BrowserServer"), lambda: pipe.sendall(b"{}"),
+                 lambda: pipe.recv(65536)):
+        with pytest.raises(ConnectionError) as info:
+            call()
+        assert isinstance(info.value.__cause__, PipeError)